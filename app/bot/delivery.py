@@ -0,0 +1,178 @@
+# app/bot/delivery.py
+"""
+Отправка сообщений ботом в рамках лимитов Bot API.
+
+Общий лимит — token bucket (TELEGRAM_RATE сообщений/с, всплеск TELEGRAM_BURST),
+в один чат — не чаще TELEGRAM_CHAT_INTERVAL (в группу — TELEGRAM_GROUP_INTERVAL).
+Лимит бота один на всех, а bucket — в памяти процесса, поэтому он делится на число
+рассылающих процессов TELEGRAM_SENDERS (по умолчанию WEB_CONCURRENCY — из него
+uvicorn/gunicorn берут число воркеров). Несколько инстансов — задайте общее число явно.
+Отправка не ждёт занятого чата и не глотает ошибки: вызывающий код получает
+DeliveryResult и сам решает, когда повторить (retry_after, backoff) или выключить.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Hashable
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNotFound,
+    TelegramRetryAfter,
+)
+
+log = logging.getLogger(__name__)
+
+# Лимит бота целиком; процессу достаётся 1/TELEGRAM_SENDERS
+TELEGRAM_RATE = float(os.getenv("TELEGRAM_RATE", "30"))
+TELEGRAM_BURST = int(os.getenv("TELEGRAM_BURST", "30"))
+TELEGRAM_SENDERS = max(1, int(os.getenv("TELEGRAM_SENDERS", os.getenv("WEB_CONCURRENCY", "1"))))
+# ~1 сообщение/с в личный чат, 20/мин в группу
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", "1.0"))
+TELEGRAM_GROUP_INTERVAL = float(os.getenv("TELEGRAM_GROUP_INTERVAL", "3.0"))
+# Одновременных запросов sendMessage
+TELEGRAM_SEND_CONCURRENCY = int(os.getenv("TELEGRAM_SEND_CONCURRENCY", "30"))
+# Backoff сетевых/серверных ошибок: base * 2^attempt (±20%), не больше max, сек
+DELIVERY_RETRY_BASE = float(os.getenv("DELIVERY_RETRY_BASE", "5"))
+DELIVERY_RETRY_MAX = float(os.getenv("DELIVERY_RETRY_MAX", "600"))
+
+SENT, RETRY, ERROR, DROP = "sent", "retry", "error", "drop"
+
+
+@dataclass(frozen=True)
+class DeliveryResult:
+    # sent; retry — лимит (ждём delay, попытка не тратится); error — сбой, повтор через
+    # backoff delay; drop — повторять бессмысленно (бот заблокирован, чата нет)
+    status: str
+    delay: float = 0.0
+    error: str | None = None
+
+
+def backoff(attempt: int) -> float:
+    """Пауза перед повтором после attempt-й неудачной попытки (с 1)."""
+    delay = min(DELIVERY_RETRY_MAX, DELIVERY_RETRY_BASE * 2 ** max(0, attempt - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше burst в запасе; ожидающие обслуживаются по очереди."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = max(rate, 0.001)
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                wait = (1 - self._tokens) / self.rate
+                self.waited += wait
+                await asyncio.sleep(wait)
+                self._refill()
+            self._tokens -= 1
+
+
+class ChatSlots:
+    """Когда в чат можно писать следующий раз (монотонные секунды)."""
+
+    def __init__(self, chat_interval: float, group_interval: float) -> None:
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+        self._next: dict[Hashable, float] = {}
+
+    def reserve(self, chat_id: int) -> float:
+        """0 — слот занят за нами; иначе сколько секунд до свободного слота."""
+        now = time.monotonic()
+        free_at = self._next.get(chat_id, 0.0)
+        if free_at > now:
+            return free_at - now
+        self._next[chat_id] = now + (self.group_interval if chat_id < 0 else self.chat_interval)
+        if len(self._next) > 10_000:
+            self._next = {k: v for k, v in self._next.items() if v > now}
+        return 0.0
+
+    def block(self, chat_id: int, seconds: float) -> None:
+        self._next[chat_id] = max(self._next.get(chat_id, 0.0), time.monotonic() + seconds)
+
+
+class Sender:
+    def __init__(
+        self,
+        bot: Bot,
+        *,
+        rate: float = TELEGRAM_RATE / TELEGRAM_SENDERS,
+        burst: int = max(1, TELEGRAM_BURST // TELEGRAM_SENDERS),
+        chat_interval: float = TELEGRAM_CHAT_INTERVAL,
+        group_interval: float = TELEGRAM_GROUP_INTERVAL,
+        concurrency: int = TELEGRAM_SEND_CONCURRENCY,
+    ) -> None:
+        self.bot = bot
+        self.bucket = TokenBucket(rate, burst)
+        self.chats = ChatSlots(chat_interval, group_interval)
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+
+        # метрики
+        self.sent = 0
+        self.throttled = 0
+        self.retry_after = 0
+        self.errors = 0
+        self.dropped = 0
+
+    async def send(self, chat_id: int, text: str, *, attempt: int = 1) -> DeliveryResult:
+        """Одно сообщение; attempt — номер попытки (для backoff при ошибке)."""
+        wait = self.chats.reserve(chat_id)
+        if wait > 0:
+            # чат занят — не держим очередь, повторим, когда освободится
+            self.throttled += 1
+            return DeliveryResult(RETRY, wait)
+        async with self._sem:
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text)
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                self.chats.block(chat_id, e.retry_after)
+                return DeliveryResult(RETRY, float(e.retry_after), "retry_after")
+            except (TelegramForbiddenError, TelegramNotFound) as e:
+                self.dropped += 1
+                return DeliveryResult(DROP, error=e.message)
+            except TelegramBadRequest as e:
+                # chat not found / текст не принимается — повтор не поможет
+                self.dropped += 1
+                return DeliveryResult(DROP, error=e.message)
+            except Exception as e:  # noqa: BLE001 — сеть, 5xx, таймаут
+                self.errors += 1
+                log.warning("sendMessage to %s failed (attempt %s): %s", chat_id, attempt, e)
+                return DeliveryResult(ERROR, backoff(attempt), type(e).__name__)
+        self.sent += 1
+        return DeliveryResult(SENT)
+
+    async def send_many(self, messages: list[tuple[int, str, int]]) -> list[DeliveryResult]:
+        """[(chat_id, text, attempt)] параллельно; результаты в том же порядке."""
+        return await asyncio.gather(*(self.send(chat_id, text, attempt=a) for chat_id, text, a in messages))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "sent": self.sent,
+            "throttled": self.throttled,
+            "retry_after": self.retry_after,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "bucket_wait_s": round(self.bucket.waited, 1),
+        }
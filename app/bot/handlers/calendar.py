@@ -4,8 +4,8 @@ from __future__ import annotations
 from aiogram import Router, F
 from aiogram.types import Message
 from sqlalchemy import select, desc
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.database import AsyncSessionLocal
 from app.db.models import User  # импортируем только то, что точно есть
 
 router = Router(name=__name__)
@@ -20,39 +20,29 @@ except Exception:
 
 
 @router.message(F.text.in_({"📅 Календарь", "Календарь"}))
-async def calendar_last(message: Message) -> None:
+async def calendar_last(message: Message, session: AsyncSession, user: User) -> None:
     """Показывает последние события пользователя (или семьи), если таблица событий есть."""
     if EventModel is None:
         await message.answer("Календарь пока недоступен: нет таблицы событий (CareLog).")
         return
 
-    tg_id = message.from_user.id
-
-    async with AsyncSessionLocal() as session:
-        user = await session.scalar(select(User).where(User.telegram_id == tg_id))
-        if not user:
-            user = User(telegram_id=tg_id)
-            session.add(user)
-            await session.commit()
-            await session.refresh(user)
-
-        # Под ваши поля: попробуем 1) по family_id, если он есть, 2) по user_id, иначе ничего.
-        q = None
-        if hasattr(EventModel, "family_id") and getattr(user, "family_id", None):
-            q = select(EventModel).where(
-                EventModel.family_id == user.family_id
-            ).order_by(desc(getattr(EventModel, "created_at", "id")))
-        elif hasattr(EventModel, "user_id"):
-            q = select(EventModel).where(
-                EventModel.user_id == user.id
-            ).order_by(desc(getattr(EventModel, "created_at", "id")))
-
-        if q is None:
-            await message.answer("Календарь: не удалось сопоставить поля модели событий (нужен family_id или user_id).")
-            return
+    # Под ваши поля: попробуем 1) по family_id, если он есть, 2) по user_id, иначе ничего.
+    q = None
+    if hasattr(EventModel, "family_id") and getattr(user, "family_id", None):
+        q = select(EventModel).where(
+            EventModel.family_id == user.family_id
+        ).order_by(desc(getattr(EventModel, "created_at", "id")))
+    elif hasattr(EventModel, "user_id"):
+        q = select(EventModel).where(
+            EventModel.user_id == user.id
+        ).order_by(desc(getattr(EventModel, "created_at", "id")))
+
+    if q is None:
+        await message.answer("Календарь: не удалось сопоставить поля модели событий (нужен family_id или user_id).")
+        return
 
-        result = await session.execute(q.limit(10))
-        events = result.scalars().all()
+    result = await session.execute(q.limit(10))
+    events = result.scalars().all()
 
     if not events:
         await message.answer("Событий пока нет. Добавьте запись, и она появится в календаре.")
@@ -7,27 +7,13 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-# Вариант 1: используем ваш контекст-менеджер get_session()
-from app.db.database import get_session
 from app.db.models import User, Baby  # замените Baby на вашу модель Child, если нужно
 
 router = Router(name=__name__)
 
 
-async def _ensure_user(tg_id: int) -> User:
-    async with get_session() as session:
-        user = await session.scalar(select(User).where(User.telegram_id == tg_id))
-        if user:
-            return user
-
-        user = User(telegram_id=tg_id)
-        session.add(user)
-        await session.commit()
-        await session.refresh(user)
-        return user
-
-
 def _children_menu_kb(has_kids: bool) -> InlineKeyboardBuilder:
     kb = InlineKeyboardBuilder()
     kb.button(text="➕ Добавить ребёнка", callback_data="child:add")
@@ -39,14 +25,11 @@ def _children_menu_kb(has_kids: bool) -> InlineKeyboardBuilder:
 
 
 @router.message(F.text.in_({"👶 Профиль ребёнка", "Профиль ребёнка"}))
-async def children_entry(message: Message, state: FSMContext) -> None:
-    user = await _ensure_user(message.from_user.id)
-
-    async with get_session() as session:
-        result = await session.execute(
-            select(Baby).where(Baby.user_id == user.id).order_by(Baby.id.desc())
-        )
-        babies = result.scalars().all()
+async def children_entry(message: Message, state: FSMContext, session: AsyncSession, user: User) -> None:
+    result = await session.execute(
+        select(Baby).where(Baby.user_id == user.id).order_by(Baby.id.desc())
+    )
+    babies = result.scalars().all()
 
     if babies:
         lines = ["Ваши дети:"]
@@ -5,8 +5,8 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.database import get_session
 from app.db.models import User, Family, FamilyMember
+from app.services import identity
 
 router = Router(name="family")
 
@@ -26,21 +26,6 @@ def family_menu_kb(has_family: bool) -> InlineKeyboardMarkup:
         ])
 
 
-async def _get_or_create_user(session: AsyncSession, tg: types.User) -> User:
-    res = await session.execute(select(User).where(User.telegram_id == tg.id))
-    user = res.scalar_one_or_none()
-    if not user:
-        user = User(
-            telegram_id=tg.id,
-            username=tg.username,
-            first_name=tg.first_name,
-            last_name=tg.last_name,
-        )
-        session.add(user)
-        await session.flush()
-    return user
-
-
 async def _get_user_family(session: AsyncSession, user_id: int) -> Family | None:
     q = (
         select(Family)
@@ -60,30 +45,27 @@ def _default_family_title(u: User) -> str:
 # ---------- entry ----------
 
 @router.message(F.text.in_({"👨‍👩‍👧 Семья", "Семья"}))
-async def family_menu(message: types.Message):
-    # важно: берём сессию через async for
-    async for session in get_session():
-        user = await _get_or_create_user(session, message.from_user)
-        fam = await _get_user_family(session, user.id)
-
-        if fam:
-            # посчитаем участников
-            mem_q = await session.execute(
-                select(FamilyMember).where(FamilyMember.family_id == fam.id)
-            )
-            members = mem_q.scalars().all()
-            text = (
-                f"🏠 Ваша семья: <b>{fam.title}</b>\n"
-                f"Участников: <b>{len(members)}</b>\n\n"
-                "Выберите действие:"
-            )
-            kb = family_menu_kb(has_family=True)
-        else:
-            text = (
-                "У вас пока нет семьи.\n\n"
-                "Создайте семью или присоединитесь по коду приглашения:"
-            )
-            kb = family_menu_kb(has_family=False)
+async def family_menu(message: types.Message, session: AsyncSession, user: User):
+    fam = await _get_user_family(session, user.id)
+
+    if fam:
+        # посчитаем участников
+        mem_q = await session.execute(
+            select(FamilyMember).where(FamilyMember.family_id == fam.id)
+        )
+        members = mem_q.scalars().all()
+        text = (
+            f"🏠 Ваша семья: <b>{fam.title}</b>\n"
+            f"Участников: <b>{len(members)}</b>\n\n"
+            "Выберите действие:"
+        )
+        kb = family_menu_kb(has_family=True)
+    else:
+        text = (
+            "У вас пока нет семьи.\n\n"
+            "Создайте семью или присоединитесь по коду приглашения:"
+        )
+        kb = family_menu_kb(has_family=False)
 
     await message.answer(text, reply_markup=kb)
 
@@ -91,45 +73,42 @@ async def family_menu(message: types.Message):
 # ---------- callbacks ----------
 
 @router.callback_query(F.data == "fam_create")
-async def fam_create(cb: types.CallbackQuery):
-    async for session in get_session():
-        user = await _get_or_create_user(session, cb.from_user)
-        # если уже есть семья — просто обновим меню
-        fam = await _get_user_family(session, user.id)
-        if fam:
-            await cb.answer("Семья уже создана")
-            await family_menu(cb.message)
-            return
-
-        # создаём семью с обязательным title
-        fam = Family(title=_default_family_title(user))
-        session.add(fam)
-        await session.flush()
-
-        session.add(FamilyMember(family_id=fam.id, user_id=user.id, role="owner"))
-        await session.commit()
+async def fam_create(cb: types.CallbackQuery, session: AsyncSession, user: User):
+    # если уже есть семья — просто обновим меню
+    fam = await _get_user_family(session, user.id)
+    if fam:
+        await cb.answer("Семья уже создана")
+        await family_menu(cb.message, session, user)
+        return
+
+    # создаём семью с обязательным title
+    fam = Family(title=_default_family_title(user))
+    session.add(fam)
+    await session.flush()
+
+    session.add(FamilyMember(family_id=fam.id, user_id=user.id, role="owner"))
+    await session.commit()
+    await identity.invalidate_family(user.id, cb.from_user.id)
 
     await cb.answer("Семья создана")
-    await family_menu(cb.message)
+    await family_menu(cb.message, session, user)
 
 
 @router.callback_query(F.data == "fam_members")
-async def fam_members(cb: types.CallbackQuery):
-    async for session in get_session():
-        user = await _get_or_create_user(session, cb.from_user)
-        fam = await _get_user_family(session, user.id)
-        if not fam:
-            await cb.answer()
-            await cb.message.answer("Сначала создайте семью или вступите в существующую.")
-            return
-
-        mem_q = await session.execute(
-            select(FamilyMember, User)
-            .join(User, User.id == FamilyMember.user_id)
-            .where(FamilyMember.family_id == fam.id)
-            .order_by(FamilyMember.id.asc())
-        )
-        rows = mem_q.all()
+async def fam_members(cb: types.CallbackQuery, session: AsyncSession, user: User):
+    fam = await _get_user_family(session, user.id)
+    if not fam:
+        await cb.answer()
+        await cb.message.answer("Сначала создайте семью или вступите в существующую.")
+        return
+
+    mem_q = await session.execute(
+        select(FamilyMember, User)
+        .join(User, User.id == FamilyMember.user_id)
+        .where(FamilyMember.family_id == fam.id)
+        .order_by(FamilyMember.id.asc())
+    )
+    rows = mem_q.all()
 
     lines = [f"👥 <b>Участники семьи «{fam.title}»</b>:"]
     for m, u in rows:
@@ -142,17 +121,15 @@ async def fam_members(cb: types.CallbackQuery):
 
 
 @router.callback_query(F.data == "fam_invite")
-async def fam_invite(cb: types.CallbackQuery):
-    async for session in get_session():
-        user = await _get_or_create_user(session, cb.from_user)
-        fam = await _get_user_family(session, user.id)
-        if not fam:
-            await cb.answer()
-            await cb.message.answer("Сначала создайте семью.")
-            return
-
-        # простой пригласительный код = id семьи (для MVP)
-        code = str(fam.id)
+async def fam_invite(cb: types.CallbackQuery, session: AsyncSession, user: User):
+    fam = await _get_user_family(session, user.id)
+    if not fam:
+        await cb.answer()
+        await cb.message.answer("Сначала создайте семью.")
+        return
+
+    # простой пригласительный код = id семьи (для MVP)
+    code = str(fam.id)
 
     await cb.answer()
     await cb.message.answer(
@@ -172,59 +149,57 @@ async def fam_join_prompt(cb: types.CallbackQuery):
 
 
 @router.message(F.text.regexp(r"^\d{1,12}$"))
-async def fam_join_apply(message: types.Message):
+async def fam_join_apply(message: types.Message, session: AsyncSession, user: User):
     code = int(message.text.strip())
-    async for session in get_session():
-        user = await _get_or_create_user(session, message.from_user)
-
-        # есть ли такая семья?
-        res = await session.execute(select(Family).where(Family.id == code))
-        fam = res.scalar_one_or_none()
-        if not fam:
-            await message.answer("❌ Семья с таким кодом не найдена.")
-            return
-
-        # уже участник?
-        res = await session.execute(
-            select(FamilyMember).where(
-                FamilyMember.family_id == fam.id,
-                FamilyMember.user_id == user.id,
-            )
+
+    # есть ли такая семья?
+    res = await session.execute(select(Family).where(Family.id == code))
+    fam = res.scalar_one_or_none()
+    if not fam:
+        await message.answer("❌ Семья с таким кодом не найдена.")
+        return
+
+    # уже участник?
+    res = await session.execute(
+        select(FamilyMember).where(
+            FamilyMember.family_id == fam.id,
+            FamilyMember.user_id == user.id,
         )
-        exists = res.scalar_one_or_none()
-        if exists:
-            await message.answer("Вы уже участник этой семьи.")
-            return
+    )
+    exists = res.scalar_one_or_none()
+    if exists:
+        await message.answer("Вы уже участник этой семьи.")
+        return
 
-        session.add(FamilyMember(family_id=fam.id, user_id=user.id, role="member"))
-        await session.commit()
+    session.add(FamilyMember(family_id=fam.id, user_id=user.id, role="member"))
+    await session.commit()
+    await identity.invalidate_family(user.id, message.from_user.id)
 
     await message.answer(f"✅ Вы присоединились к семье: <b>{fam.title}</b>")
     # покажем меню семьи
-    await family_menu(message)
+    await family_menu(message, session, user)
 
 
 @router.callback_query(F.data == "fam_leave")
-async def fam_leave(cb: types.CallbackQuery):
-    async for session in get_session():
-        user = await _get_or_create_user(session, cb.from_user)
-        fam = await _get_user_family(session, user.id)
-        if not fam:
-            await cb.answer()
-            await cb.message.answer("Вы не состоите в семье.")
-            return
-
-        # удаляем членство
-        res = await session.execute(
-            select(FamilyMember).where(
-                FamilyMember.family_id == fam.id,
-                FamilyMember.user_id == user.id,
-            )
+async def fam_leave(cb: types.CallbackQuery, session: AsyncSession, user: User):
+    fam = await _get_user_family(session, user.id)
+    if not fam:
+        await cb.answer()
+        await cb.message.answer("Вы не состоите в семье.")
+        return
+
+    # удаляем членство
+    res = await session.execute(
+        select(FamilyMember).where(
+            FamilyMember.family_id == fam.id,
+            FamilyMember.user_id == user.id,
         )
-        m = res.scalar_one_or_none()
-        if m:
-            await session.delete(m)
-            await session.commit()
+    )
+    m = res.scalar_one_or_none()
+    if m:
+        await session.delete(m)
+        await session.commit()
+        await identity.invalidate_family(user.id, cb.from_user.id)
 
     await cb.answer("Вы вышли из семьи")
-    await family_menu(cb.message)
+    await family_menu(cb.message, session, user)
@@ -1,20 +1,26 @@
 from __future__ import annotations
 
-from datetime import datetime, date
-
 from aiogram import Router, F, types
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from sqlalchemy import select, func
+from sqlalchemy import Select, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.database import get_session
-from app.db.models import User, Baby, FeedingRecord, UserSettings
-from app.services.carelog import log_event
+from app.db.models import User, Baby, FeedingRecord
+from app.services import rollups
+from app.services.carelog import CareUnitOfWork
+from app.utils.tz import local_today, to_local
 
 router = Router(name="feeding_db")
 
 # ---------- Вспомогательные ----------
 
+def feed_stats_kb() -> InlineKeyboardMarkup:
+    # Графики строит app/bot/handlers/stats.py
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="📈 График за 7 дней", callback_data="stats_feed_7d"),
+        InlineKeyboardButton(text="📊 Сводка", callback_data="stats_dashboard"),
+    ]])
+
 def amount_ml_kb(prefix: str) -> InlineKeyboardMarkup:
     # Кнопки объёмов для смеси/воды
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -44,51 +50,28 @@ def amount_g_kb(prefix: str) -> InlineKeyboardMarkup:
         ],
     ])
 
-async def _get_or_create_user(session: AsyncSession, tg: types.User) -> User:
-    q = await session.execute(select(User).where(User.telegram_id == tg.id))
-    user = q.scalar_one_or_none()
-    if not user:
-        user = User(
-            telegram_id=tg.id,
-            username=tg.username,
-            first_name=tg.first_name,
-            last_name=tg.last_name
-        )
-        session.add(user)
-        await session.flush()
-    return user
-
-async def _get_active_baby(session: AsyncSession, user_id: int) -> Baby | None:
-    # сначала пробуем активного
-    qs = await session.execute(select(UserSettings).where(UserSettings.user_id == user_id))
-    settings = qs.scalar_one_or_none()
-    if settings and settings.active_baby_id:
-        qb = await session.execute(select(Baby).where(Baby.id == settings.active_baby_id, Baby.user_id == user_id))
-        baby = qb.scalar_one_or_none()
-        if baby:
-            return baby
-    # иначе — первый по списку
-    qb = await session.execute(select(Baby).where(Baby.user_id == user_id).order_by(Baby.id.asc()).limit(1))
-    return qb.scalar_one_or_none()
+def last_feedings_query(baby_id: int, limit: int = 5) -> Select:
+    """Последние кормления (индекс ix_feeding_records_baby_fed_at; проверка — migrations --explain)."""
+    return (
+        select(FeedingRecord)
+        .where(FeedingRecord.baby_id == baby_id)
+        .order_by(FeedingRecord.fed_at.desc())
+        .limit(limit)
+    )
 
 # ---------- Хендлеры сообщений ----------
 
 @router.message(F.text == "Грудное молоко")
-async def feeding_breast(message: types.Message):
+async def feeding_breast(message: types.Message, session: AsyncSession, user: User, baby: Baby | None, tz: str):
     """Фиксируем событие грудного вскармливания (без объёма)."""
-    async for session in get_session():
-        user = await _get_or_create_user(session, message.from_user)
-        baby = await _get_active_baby(session, user.id)
-        if not baby:
-            await message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
-            return
-
-        rec = FeedingRecord(baby_id=baby.id, feeding_type="breast")
-        session.add(rec)
-        await session.commit()
+    if not baby:
+        await message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
+        return
 
-        # Лог в семейный календарь
-        await log_event(session, actor_user_id=user.id, event_type="feeding", details="грудное молоко", baby_id=baby.id)
+    # Запись + лог в семейный календарь — одним commit
+    async with CareUnitOfWork(session, actor_user_id=user.id, tz=tz) as uow:
+        uow.add(FeedingRecord(baby_id=baby.id, feeding_type="breast"))
+        await uow.event("feeding", "грудное молоко", baby_id=baby.id)
 
     await message.answer("🤱 Записано грудное вскармливание.")
 
@@ -108,48 +91,21 @@ async def feeding_solid(message: types.Message):
     await message.answer("🥣 Выберите количество прикорма (г):", reply_markup=kb)
 
 @router.message(F.text == "Статистика кормления")
-async def feeding_stats(message: types.Message):
+async def feeding_stats(message: types.Message, session: AsyncSession, baby: Baby | None, tz: str):
     """Покажем последние 5 записей + итоги за сегодня."""
-    async for session in get_session():
-        user = await _get_or_create_user(session, message.from_user)
-        baby = await _get_active_baby(session, user.id)
-        if not baby:
-            await message.answer("Нет данных. Сначала создайте профиль ребёнка и добавьте кормления.")
-            return
-
-        # последние 5
-        q_last = await session.execute(
-            select(FeedingRecord)
-            .where(FeedingRecord.baby_id == baby.id)
-            .order_by(FeedingRecord.fed_at.desc())
-            .limit(5)
-        )
-        items = q_last.scalars().all()
-
-        # агрегаты за сегодня (для простоты — по UTC-дате)
-        today = date.today()
-        day_start = datetime.combine(today, datetime.min.time())
-        day_end = datetime.combine(today, datetime.max.time())
-
-        q_sum_ml = await session.execute(
-            select(func.coalesce(func.sum(FeedingRecord.amount_ml), 0))
-            .where(
-                FeedingRecord.baby_id == baby.id,
-                FeedingRecord.fed_at >= day_start,
-                FeedingRecord.fed_at <= day_end,
-            )
-        )
-        total_ml = int(q_sum_ml.scalar_one() or 0)
-
-        q_sum_g = await session.execute(
-            select(func.coalesce(func.sum(FeedingRecord.amount_g), 0))
-            .where(
-                FeedingRecord.baby_id == baby.id,
-                FeedingRecord.fed_at >= day_start,
-                FeedingRecord.fed_at <= day_end,
-            )
-        )
-        total_g = int(q_sum_g.scalar_one() or 0)
+    if not baby:
+        await message.answer("Нет данных. Сначала создайте профиль ребёнка и добавьте кормления.")
+        return
+
+    # последние 5
+    q_last = await session.execute(last_feedings_query(baby.id))
+    items = q_last.scalars().all()
+
+    # итоги за сегодня (локальные сутки пользователя) — из суточных итогов, одна строка
+    today = local_today(tz)
+    roll = (await rollups.daily(session, baby.id, today, today)).get(today)
+    total_ml = roll.ml if roll else 0
+    total_g = roll.g if roll else 0
 
     if not items:
         await message.answer("Записей кормления ещё нет.")
@@ -159,7 +115,7 @@ async def feeding_stats(message: types.Message):
 
     lines = ["📝 Последние кормления:"]
     for r in items:
-        t = r.fed_at.strftime("%d.%m %H:%M")
+        t = to_local(r.fed_at, tz).strftime("%d.%m %H:%M")
         tpe = type_map.get(r.feeding_type, r.feeding_type)
         vol = ""
         if r.amount_ml:
@@ -171,66 +127,57 @@ async def feeding_stats(message: types.Message):
         lines.append(f"• {t} | {tpe}{vol}")
 
     lines.append(f"\nИтого за сегодня: {total_ml} мл напитков + {total_g} г прикорма")
-    await message.answer("\n".join(lines))
+    await message.answer("\n".join(lines), reply_markup=feed_stats_kb())
 
 # ---------- Коллбэки выбора объёма ----------
 
 @router.callback_query(F.data.startswith("formula_ml_"))
-async def cb_formula_amount(callback: types.CallbackQuery):
+async def cb_formula_amount(
+    callback: types.CallbackQuery, session: AsyncSession, user: User, baby: Baby | None, tz: str,
+):
     amount = int(callback.data.split("_")[-1])  # 30/60/...
-    async for session in get_session():
-        user = await _get_or_create_user(session, callback.from_user)
-        baby = await _get_active_baby(session, user.id)
-        if not baby:
-            await callback.answer()
-            await callback.message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
-            return
-
-        rec = FeedingRecord(baby_id=baby.id, feeding_type="formula", amount_ml=amount)
-        session.add(rec)
-        await session.commit()
+    if not baby:
+        await callback.answer()
+        await callback.message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
+        return
 
-        await log_event(session, actor_user_id=user.id, event_type="feeding", details=f"смесь {amount} мл", baby_id=baby.id)
+    async with CareUnitOfWork(session, actor_user_id=user.id, tz=tz) as uow:
+        uow.add(FeedingRecord(baby_id=baby.id, feeding_type="formula", amount_ml=amount))
+        await uow.event("feeding", f"смесь {amount} мл", baby_id=baby.id)
 
     await callback.answer()
     await callback.message.answer(f"🍼 Смесь: {amount} мл — записано.")
 
 @router.callback_query(F.data.startswith("water_ml_"))
-async def cb_water_amount(callback: types.CallbackQuery):
+async def cb_water_amount(
+    callback: types.CallbackQuery, session: AsyncSession, user: User, baby: Baby | None, tz: str,
+):
     amount = int(callback.data.split("_")[-1])
-    async for session in get_session():
-        user = await _get_or_create_user(session, callback.from_user)
-        baby = await _get_active_baby(session, user.id)
-        if not baby:
-            await callback.answer()
-            await callback.message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
-            return
-
-        rec = FeedingRecord(baby_id=baby.id, feeding_type="water", amount_ml=amount)
-        session.add(rec)
-        await session.commit()
+    if not baby:
+        await callback.answer()
+        await callback.message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
+        return
 
-        await log_event(session, actor_user_id=user.id, event_type="feeding", details=f"вода {amount} мл", baby_id=baby.id)
+    async with CareUnitOfWork(session, actor_user_id=user.id, tz=tz) as uow:
+        uow.add(FeedingRecord(baby_id=baby.id, feeding_type="water", amount_ml=amount))
+        await uow.event("feeding", f"вода {amount} мл", baby_id=baby.id)
 
     await callback.answer()
     await callback.message.answer(f"💧 Вода: {amount} мл — записано.")
 
 @router.callback_query(F.data.startswith("solid_g_"))
-async def cb_solid_amount(callback: types.CallbackQuery):
+async def cb_solid_amount(
+    callback: types.CallbackQuery, session: AsyncSession, user: User, baby: Baby | None, tz: str,
+):
     amount = int(callback.data.split("_")[-1])
-    async for session in get_session():
-        user = await _get_or_create_user(session, callback.from_user)
-        baby = await _get_active_baby(session, user.id)
-        if not baby:
-            await callback.answer()
-            await callback.message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
-            return
-
-        rec = FeedingRecord(baby_id=baby.id, feeding_type="solid", amount_g=amount)
-        session.add(rec)
-        await session.commit()
-
-        await log_event(session, actor_user_id=user.id, event_type="feeding", details=f"прикорм {amount} г", baby_id=baby.id)
+    if not baby:
+        await callback.answer()
+        await callback.message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
+        return
+
+    async with CareUnitOfWork(session, actor_user_id=user.id, tz=tz) as uow:
+        uow.add(FeedingRecord(baby_id=baby.id, feeding_type="solid", amount_g=amount))
+        await uow.event("feeding", f"прикорм {amount} г", baby_id=baby.id)
 
     await callback.answer()
     await callback.message.answer(f"🥣 Прикорм: {amount} г — записано.")
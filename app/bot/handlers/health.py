@@ -4,14 +4,13 @@ from aiogram import Router, F, types
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from datetime import datetime, date
 
-from sqlalchemy import select, func
+from sqlalchemy import Select, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.database import get_session
-from app.db.models import User, Baby, HealthRecord
-from app.db.models import User, Baby, UserSettings  # + нужные модели раздела
+from app.db.models import Baby, HealthRecord
+from app.services import aggregates
+from app.utils.tz import local_today, to_local
 
 router = Router(name="health_db")
 
@@ -25,24 +24,6 @@ def temp_kb() -> InlineKeyboardMarkup:
     def row(vals): return [InlineKeyboardButton(text=f"{v:.1f}°C", callback_data=f"temp_{v}") for v in vals]
     return InlineKeyboardMarkup(inline_keyboard=[row(row1), row(row2), row(row3)])
 
-async def _get_or_create_user(session: AsyncSession, tg: types.User):
-    q = await session.execute(select(User).where(User.telegram_id == tg.id))
-    user = q.scalar_one_or_none()
-    if not user:
-        user = User(
-            telegram_id=tg.id,
-            username=tg.username,
-            first_name=tg.first_name,
-            last_name=tg.last_name
-        )
-        session.add(user)
-        await session.flush()
-    return user
-
-async def _get_primary_baby(session: AsyncSession, user_id: int):
-    q = await session.execute(select(Baby).where(Baby.user_id == user_id).limit(1))
-    return q.scalar_one_or_none()
-
 # ---------- STATES ----------
 
 class MedicineStates(StatesGroup):
@@ -63,24 +44,21 @@ async def health_temperature(message: types.Message):
     await message.answer("🌡 Выберите температуру (нажмите кнопку):", reply_markup=kb)
 
 @router.callback_query(F.data.startswith("temp_"))
-async def cb_temperature(callback: types.CallbackQuery):
+async def cb_temperature(callback: types.CallbackQuery, session: AsyncSession, baby: Baby | None):
     value = float(callback.data.split("_")[1])
 
-    async for session in get_session():
-        user = await _get_or_create_user(session, callback.from_user)
-        baby = await _get_active_baby(session, user.id)
-        if not baby:
-            await callback.answer()
-            await callback.message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
-            return
-
-        rec = HealthRecord(
-            baby_id=baby.id,
-            record_type="temperature",
-            temperature_c=value
-        )
-        session.add(rec)
-        await session.commit()
+    if not baby:
+        await callback.answer()
+        await callback.message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
+        return
+
+    rec = HealthRecord(
+        baby_id=baby.id,
+        record_type="temperature",
+        temperature_c=value
+    )
+    session.add(rec)
+    await session.commit()
 
     await callback.answer()
     await callback.message.answer(f"🌡 Температура сохранена: <b>{value:.1f}°C</b>.")
@@ -97,7 +75,7 @@ async def health_medicine(message: types.Message, state: FSMContext):
     await state.set_state(MedicineStates.waiting_text)
 
 @router.message(MedicineStates.waiting_text, F.text)
-async def medicine_save(message: types.Message, state: FSMContext):
+async def medicine_save(message: types.Message, state: FSMContext, session: AsyncSession, baby: Baby | None):
     text = message.text.strip()
     name, dose = text, None
 
@@ -107,21 +85,18 @@ async def medicine_save(message: types.Message, state: FSMContext):
         dose = int(parts[-1])
         name = " ".join(parts[:-1]).strip() or "Лекарство"
 
-    async for session in get_session():
-        user = await _get_or_create_user(session, message.from_user)
-        baby = await _get_active_baby(session, user.id)
-        if not baby:
-            await message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
-            return
-
-        rec = HealthRecord(
-            baby_id=baby.id,
-            record_type="medicine",
-            medicine_name=name,
-            dose_mg=dose
-        )
-        session.add(rec)
-        await session.commit()
+    if not baby:
+        await message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
+        return
+
+    rec = HealthRecord(
+        baby_id=baby.id,
+        record_type="medicine",
+        medicine_name=name,
+        dose_mg=dose
+    )
+    session.add(rec)
+    await session.commit()
 
     await state.clear()
     suf = f", {dose} мг" if dose else ""
@@ -136,22 +111,19 @@ async def health_visit(message: types.Message, state: FSMContext):
     await state.set_state(VisitStates.waiting_note)
 
 @router.message(VisitStates.waiting_note, F.text)
-async def visit_save_note(message: types.Message, state: FSMContext):
+async def visit_save_note(message: types.Message, state: FSMContext, session: AsyncSession, baby: Baby | None):
     note = message.text.strip()
-    async for session in get_session():
-        user = await _get_or_create_user(session, message.from_user)
-        baby = await _get_active_baby(session, user.id)
-        if not baby:
-            await message.answer("❗️ Сначала создайте профиль ребёнка.")
-            return
-
-        rec = HealthRecord(
-            baby_id=baby.id,
-            record_type="doctor_visit",
-            visit_note=note
-        )
-        session.add(rec)
-        await session.commit()
+    if not baby:
+        await message.answer("❗️ Сначала создайте профиль ребёнка.")
+        return
+
+    rec = HealthRecord(
+        baby_id=baby.id,
+        record_type="doctor_visit",
+        visit_note=note
+    )
+    session.add(rec)
+    await session.commit()
 
     await state.clear()
     await message.answer(f"🏥 Визит сохранён. Заметка: <b>{note}</b>")
@@ -174,7 +146,7 @@ async def growth_weight(message: types.Message, state: FSMContext):
     await state.set_state(GrowthStates.waiting_height)
 
 @router.message(GrowthStates.waiting_height, F.text)
-async def growth_height(message: types.Message, state: FSMContext):
+async def growth_height(message: types.Message, state: FSMContext, session: AsyncSession, baby: Baby | None):
     txt = message.text.strip()
     if not txt.isdigit():
         await message.answer("Введите число в сантиметрах, например: 67")
@@ -183,56 +155,47 @@ async def growth_height(message: types.Message, state: FSMContext):
     data = await state.get_data()
     weight_g = int(data.get("weight_g", 0))
 
-    async for session in get_session():
-        user = await _get_or_create_user(session, message.from_user)
-        baby = await _get_active_baby(session, user.id)
-        if not baby:
-            await message.answer("❗️ Сначала создайте профиль ребёнка.")
-            return
-
-        rec = HealthRecord(
-            baby_id=baby.id,
-            record_type="growth",
-            weight_g=weight_g,
-            height_cm=height_cm
-        )
-        session.add(rec)
-        await session.commit()
+    if not baby:
+        await message.answer("❗️ Сначала создайте профиль ребёнка.")
+        return
+
+    rec = HealthRecord(
+        baby_id=baby.id,
+        record_type="growth",
+        weight_g=weight_g,
+        height_cm=height_cm
+    )
+    session.add(rec)
+    await session.commit()
 
     await state.clear()
     await message.answer(f"✅ Рост/вес сохранены: <b>{weight_g} г</b>, <b>{height_cm} см</b>.")
 
 # ---------- STATS ----------
 
+def last_health_query(baby_id: int, limit: int = 8) -> Select:
+    """Последние записи здоровья (индекс ix_health_records_baby_created; проверка — migrations --explain)."""
+    return (
+        select(HealthRecord)
+        .where(HealthRecord.baby_id == baby_id)
+        .order_by(HealthRecord.created_at.desc())
+        .limit(limit)
+    )
+
+
 @router.message(F.text == "Статистика здоровья")
-async def health_stats(message: types.Message):
-    async for session in get_session():
-        user = await _get_or_create_user(session, message.from_user)
-        baby = await _get_active_baby(session, user.id)
-        if not baby:
-            await message.answer("Нет данных. Сначала создайте профиль ребёнка.")
-            return
-
-        q = await session.execute(
-            select(HealthRecord)
-            .where(HealthRecord.baby_id == baby.id)
-            .order_by(HealthRecord.created_at.desc())
-            .limit(8)
-        )
-        items = q.scalars().all()
-
-        # Средняя температура за сегодня
-        today = date.today()
-        q_avg_temp = await session.execute(
-            select(func.avg(HealthRecord.temperature_c))
-            .where(
-                HealthRecord.baby_id == baby.id,
-                HealthRecord.record_type == "temperature",
-                HealthRecord.created_at >= datetime.combine(today, datetime.min.time()),
-                HealthRecord.created_at <= datetime.combine(today, datetime.max.time()),
-            )
-        )
-        avg_temp = q_avg_temp.scalar_one_or_none()
+async def health_stats(message: types.Message, session: AsyncSession, baby: Baby | None, tz: str):
+    if not baby:
+        await message.answer("Нет данных. Сначала создайте профиль ребёнка.")
+        return
+
+    q = await session.execute(last_health_query(baby.id))
+    items = q.scalars().all()
+
+    # Средняя температура за сегодня (агрегаты дня — одним запросом)
+    today = local_today(tz)
+    day = (await aggregates.health_by_day(session, baby_id=baby.id, tz=tz, start=today, end=today)).get((baby.id, today))
+    avg_temp = day["temp_avg"] if day else None
 
     if not items:
         await message.answer("Записей здоровья ещё нет.")
@@ -240,7 +203,7 @@ async def health_stats(message: types.Message):
 
     lines = ["🩺 Последние записи здоровья:"]
     for r in items:
-        t = r.created_at.strftime("%d.%m %H:%M")
+        t = to_local(r.created_at, tz).strftime("%d.%m %H:%M")
         if r.record_type == "temperature":
             lines.append(f"• {t} | Температура: {r.temperature_c:.1f}°C")
         elif r.record_type == "medicine":
@@ -258,15 +221,3 @@ async def health_stats(message: types.Message):
         lines.append(f"\nСредняя температура за сегодня: {avg_temp:.2f}°C")
 
     await message.answer("\n".join(lines))
-async def _get_active_baby(session: AsyncSession, user_id: int) -> Baby | None:
-    # сначала пробуем активного
-    qs = await session.execute(select(UserSettings).where(UserSettings.user_id == user_id))
-    settings = qs.scalar_one_or_none()
-    if settings and settings.active_baby_id:
-        qb = await session.execute(select(Baby).where(Baby.id == settings.active_baby_id, Baby.user_id == user_id))
-        baby = qb.scalar_one_or_none()
-        if baby:
-            return baby
-    # иначе — первый по списку
-    qb = await session.execute(select(Baby).where(Baby.user_id == user_id).order_by(Baby.id.asc()).limit(1))
-    return qb.scalar_one_or_none()
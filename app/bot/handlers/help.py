@@ -8,6 +8,7 @@ async def cmd_help(message: types.Message):
     await message.answer(
         "Помощь:\n"
         "/start — главное меню\n"
-        "/help — эта подсказка\n\n"
+        "/help — эта подсказка\n"
+        "/timezone — часовой пояс (для «сегодня» и статистики по дням)\n\n"
         "Нажимай кнопки на клавиатуре, чтобы перейти в разделы."
     )
@@ -8,7 +8,10 @@ from aiogram.types import (
     InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo,
 )
 
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from app.bot.keyboards.common import main_menu_kb
+from app.db.models import User
 from app.bot.handlers.family import family_menu
 from app.bot.handlers.calendar import calendar_last
 from app.bot.handlers.children import children_entry  # <-- используем entry
@@ -51,8 +54,8 @@ async def section_feeding(message: types.Message):
 
 # --- Профиль ребёнка ---
 @router.message(F.text.in_({BTN_CHILD, "Профиль ребёнка"}))
-async def open_children_via_button(message: types.Message, state: FSMContext):  # <-- принимаем state
-    await children_entry(message, state)  # <-- передаём state дальше
+async def open_children_via_button(message: types.Message, state: FSMContext, session: AsyncSession, user: User):
+    await children_entry(message, state, session, user)
 
 # --- Раздел «Здоровье» (если используешь) ---
 @router.message(F.text.in_({"Здоровье"}))
@@ -69,13 +72,13 @@ async def section_health(message: types.Message):
 
 # --- Календарь (семейный журнал) ---
 @router.message(F.text.in_({BTN_CALENDAR, "Календарь"}))
-async def open_calendar_via_button(message: types.Message):
-    await calendar_last(message)
+async def open_calendar_via_button(message: types.Message, session: AsyncSession, user: User):
+    await calendar_last(message, session, user)
 
 # --- Семья (создать/присоединиться) ---
 @router.message(F.text.in_({BTN_FAMILY, "Семья"}))
-async def open_family_via_button(message: types.Message):
-    await family_menu(message)
+async def open_family_via_button(message: types.Message, session: AsyncSession, user: User):
+    await family_menu(message, session, user)
 
 # --- Настройки ---
 @router.message(F.text.in_({BTN_SETTINGS, "Настройки"}))
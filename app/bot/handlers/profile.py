@@ -9,8 +9,9 @@ from datetime import datetime
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.database import get_session
 from app.db.models import User, Baby, UserSettings
+from app.services import identity
+from app.services.users import upsert_settings
 
 router = Router(name="profile_multi")
 
@@ -26,29 +27,6 @@ class EditBirthStates(StatesGroup):
     waiting_birth_date = State()
 
 # ---------- helpers ----------
-async def _get_or_create_user(session: AsyncSession, tg: types.User) -> User:
-    q = await session.execute(select(User).where(User.telegram_id == tg.id))
-    user = q.scalar_one_or_none()
-    if not user:
-        user = User(
-            telegram_id=tg.id,
-            username=tg.username,
-            first_name=tg.first_name,
-            last_name=tg.last_name
-        )
-        session.add(user)
-        await session.flush()
-    return user
-
-async def _get_or_create_settings(session: AsyncSession, user_id: int) -> UserSettings:
-    q = await session.execute(select(UserSettings).where(UserSettings.user_id == user_id))
-    s = q.scalar_one_or_none()
-    if not s:
-        s = UserSettings(user_id=user_id, active_baby_id=None)
-        session.add(s)
-        await session.flush()
-    return s
-
 async def _list_babies(session: AsyncSession, user_id: int) -> list[Baby]:
     q = await session.execute(select(Baby).where(Baby.user_id == user_id).order_by(Baby.id.asc()))
     return q.scalars().all()
@@ -71,11 +49,11 @@ def _babies_inline_list(babies: list[Baby], prefix: str, show_active_id: int | N
 
 # ---------- entry ----------
 @router.message(F.text == "Профиль ребёнка")
-async def profile_start(message: types.Message, state: FSMContext):
-    async for session in get_session():
-        user = await _get_or_create_user(session, message.from_user)
-        settings = await _get_or_create_settings(session, user.id)
-        babies = await _list_babies(session, user.id)
+async def profile_start(
+    message: types.Message, state: FSMContext, session: AsyncSession, user: User, user_settings: UserSettings | None,
+):
+    settings = user_settings or await upsert_settings(session, user.id)
+    babies = await _list_babies(session, user.id)
 
     if not babies:
         await message.answer("👶 Похоже, у вас ещё нет профилей детей.\nНажмите «➕ Добавить ребёнка».", reply_markup=None)
@@ -111,7 +89,9 @@ async def baby_add_name(message: types.Message, state: FSMContext):
     await state.set_state(AddBabyStates.waiting_birth_date)
 
 @router.message(AddBabyStates.waiting_birth_date, F.text)
-async def baby_add_birth_date(message: types.Message, state: FSMContext):
+async def baby_add_birth_date(
+    message: types.Message, state: FSMContext, session: AsyncSession, user: User, user_settings: UserSettings | None,
+):
     s = message.text.strip()
     try:
         dt = datetime.strptime(s, "%d.%m.%Y").date()
@@ -122,58 +102,58 @@ async def baby_add_birth_date(message: types.Message, state: FSMContext):
     data = await state.get_data()
     name = data["name"]
 
-    async for session in get_session():
-        user = await _get_or_create_user(session, message.from_user)
-        baby = Baby(user_id=user.id, name=name, birth_date=dt)
-        session.add(baby)
-        await session.flush()
-        # если активный не выбран — сделаем только что созданного активным
-        settings = await _get_or_create_settings(session, user.id)
-        if settings.active_baby_id is None:
-            settings.active_baby_id = baby.id
-        await session.commit()
+    baby = Baby(user_id=user.id, name=name, birth_date=dt)
+    session.add(baby)
+    await session.flush()
+    # если активный не выбран — сделаем только что созданного активным
+    settings = user_settings or await upsert_settings(session, user.id)
+    if settings.active_baby_id is None:
+        settings.active_baby_id = baby.id
+    await session.commit()
+    await identity.invalidate_user(message.from_user.id)
 
     await state.clear()
     await message.answer(f"✅ Ребёнок «{name}» добавлен и выбран активным (если активного не было).")
 
 # ---------- switch active ----------
 @router.callback_query(F.data == "baby_switch")
-async def baby_switch_list(callback: types.CallbackQuery):
-    async for session in get_session():
-        user = await _get_or_create_user(session, callback.from_user)
-        settings = await _get_or_create_settings(session, user.id)
-        babies = await _list_babies(session, user.id)
+async def baby_switch_list(
+    callback: types.CallbackQuery, session: AsyncSession, user: User, user_settings: UserSettings | None,
+):
+    settings = user_settings or await upsert_settings(session, user.id)
+    babies = await _list_babies(session, user.id)
 
     await callback.answer()
     await callback.message.answer("Выберите активного ребёнка:",
                                   reply_markup=_babies_inline_list(babies, "baby_switch_choose", settings.active_baby_id))
 
 @router.callback_query(F.data.startswith("baby_switch_choose_"))
-async def baby_switch_apply(callback: types.CallbackQuery):
+async def baby_switch_apply(
+    callback: types.CallbackQuery, session: AsyncSession, user: User, user_settings: UserSettings | None,
+):
     baby_id = int(callback.data.split("_")[-1])
-    async for session in get_session():
-        user = await _get_or_create_user(session, callback.from_user)
-        settings = await _get_or_create_settings(session, user.id)
-        # проверим, что ребёнок принадлежит пользователю
-        q = await session.execute(select(Baby).where(Baby.id == baby_id, Baby.user_id == user.id))
-        baby = q.scalar_one_or_none()
-        if not baby:
-            await callback.answer()
-            await callback.message.answer("Ребёнок не найден.")
-            return
-        settings.active_baby_id = baby.id
-        await session.commit()
+    settings = user_settings or await upsert_settings(session, user.id)
+    # проверим, что ребёнок принадлежит пользователю
+    q = await session.execute(select(Baby).where(Baby.id == baby_id, Baby.user_id == user.id))
+    baby = q.scalar_one_or_none()
+    if not baby:
+        await callback.answer()
+        await callback.message.answer("Ребёнок не найден.")
+        return
+    settings.active_baby_id = baby.id
+    await session.commit()
+    await identity.invalidate_user(callback.from_user.id)
 
     await callback.answer()
     await callback.message.answer(f"⭐ Активный ребёнок переключён на: <b>{baby.name}</b>.")
 
 # ---------- rename ----------
 @router.callback_query(F.data == "baby_rename")
-async def baby_rename_list(callback: types.CallbackQuery):
-    async for session in get_session():
-        user = await _get_or_create_user(session, callback.from_user)
-        settings = await _get_or_create_settings(session, user.id)
-        babies = await _list_babies(session, user.id)
+async def baby_rename_list(
+    callback: types.CallbackQuery, session: AsyncSession, user: User, user_settings: UserSettings | None,
+):
+    settings = user_settings or await upsert_settings(session, user.id)
+    babies = await _list_babies(session, user.id)
 
     await callback.answer()
     await callback.message.answer("Выберите ребёнка для переименования:",
@@ -188,7 +168,7 @@ async def baby_rename_start(callback: types.CallbackQuery, state: FSMContext):
     await state.set_state(RenameBabyStates.waiting_name)
 
 @router.message(RenameBabyStates.waiting_name, F.text)
-async def baby_rename_save(message: types.Message, state: FSMContext):
+async def baby_rename_save(message: types.Message, state: FSMContext, session: AsyncSession, user: User):
     name = message.text.strip()
     if not name:
         await message.answer("Имя не должно быть пустым. Введите имя:")
@@ -196,26 +176,25 @@ async def baby_rename_save(message: types.Message, state: FSMContext):
     data = await state.get_data()
     baby_id = int(data["baby_id"])
 
-    async for session in get_session():
-        user = await _get_or_create_user(session, message.from_user)
-        q = await session.execute(select(Baby).where(Baby.id == baby_id, Baby.user_id == user.id))
-        baby = q.scalar_one_or_none()
-        if not baby:
-            await message.answer("Ребёнок не найден.")
-            return
-        baby.name = name
-        await session.commit()
+    q = await session.execute(select(Baby).where(Baby.id == baby_id, Baby.user_id == user.id))
+    baby = q.scalar_one_or_none()
+    if not baby:
+        await message.answer("Ребёнок не найден.")
+        return
+    baby.name = name
+    await session.commit()
+    await identity.invalidate_user(message.from_user.id)
 
     await state.clear()
     await message.answer(f"✅ Имя обновлено: <b>{name}</b>.")
 
 # ---------- edit birth date ----------
 @router.callback_query(F.data == "baby_edit_date")
-async def baby_edit_date_list(callback: types.CallbackQuery):
-    async for session in get_session():
-        user = await _get_or_create_user(session, callback.from_user)
-        settings = await _get_or_create_settings(session, user.id)
-        babies = await _list_babies(session, user.id)
+async def baby_edit_date_list(
+    callback: types.CallbackQuery, session: AsyncSession, user: User, user_settings: UserSettings | None,
+):
+    settings = user_settings or await upsert_settings(session, user.id)
+    babies = await _list_babies(session, user.id)
 
     await callback.answer()
     await callback.message.answer("Выберите ребёнка для изменения даты рождения:",
@@ -230,7 +209,7 @@ async def baby_edit_date_start(callback: types.CallbackQuery, state: FSMContext)
     await state.set_state(EditBirthStates.waiting_birth_date)
 
 @router.message(EditBirthStates.waiting_birth_date, F.text)
-async def baby_edit_date_save(message: types.Message, state: FSMContext):
+async def baby_edit_date_save(message: types.Message, state: FSMContext, session: AsyncSession, user: User):
     s = message.text.strip()
     try:
         dt = datetime.strptime(s, "%d.%m.%Y").date()
@@ -240,53 +219,53 @@ async def baby_edit_date_save(message: types.Message, state: FSMContext):
     data = await state.get_data()
     baby_id = int(data["baby_id"])
 
-    async for session in get_session():
-        user = await _get_or_create_user(session, message.from_user)
-        q = await session.execute(select(Baby).where(Baby.id == baby_id, Baby.user_id == user.id))
-        baby = q.scalar_one_or_none()
-        if not baby:
-            await message.answer("Ребёнок не найден.")
-            return
-        baby.birth_date = dt
-        await session.commit()
+    q = await session.execute(select(Baby).where(Baby.id == baby_id, Baby.user_id == user.id))
+    baby = q.scalar_one_or_none()
+    if not baby:
+        await message.answer("Ребёнок не найден.")
+        return
+    baby.birth_date = dt
+    await session.commit()
+    await identity.invalidate_user(message.from_user.id)
 
     await state.clear()
     await message.answer(f"✅ Дата рождения обновлена: <b>{dt.strftime('%d.%m.%Y')}</b>.")
 
 # ---------- delete ----------
 @router.callback_query(F.data == "baby_delete")
-async def baby_delete_list(callback: types.CallbackQuery):
-    async for session in get_session():
-        user = await _get_or_create_user(session, callback.from_user)
-        settings = await _get_or_create_settings(session, user.id)
-        babies = await _list_babies(session, user.id)
+async def baby_delete_list(
+    callback: types.CallbackQuery, session: AsyncSession, user: User, user_settings: UserSettings | None,
+):
+    settings = user_settings or await upsert_settings(session, user.id)
+    babies = await _list_babies(session, user.id)
 
     await callback.answer()
     await callback.message.answer("Выберите ребёнка для удаления:",
                                   reply_markup=_babies_inline_list(babies, "baby_delete_choose", settings.active_baby_id))
 
 @router.callback_query(F.data.startswith("baby_delete_choose_"))
-async def baby_delete_apply(callback: types.CallbackQuery):
+async def baby_delete_apply(
+    callback: types.CallbackQuery, session: AsyncSession, user: User, user_settings: UserSettings | None,
+):
     baby_id = int(callback.data.split("_")[-1])
-    async for session in get_session():
-        user = await _get_or_create_user(session, callback.from_user)
-        settings = await _get_or_create_settings(session, user.id)
-
-        # найдём ребёнка
-        q = await session.execute(select(Baby).where(Baby.id == baby_id, Baby.user_id == user.id))
-        baby = q.scalar_one_or_none()
-        if not baby:
-            await callback.answer()
-            await callback.message.answer("Ребёнок не найден.")
-            return
-
-        # если удаляем активного — сбрасываем активного
-        if settings.active_baby_id == baby.id:
-            settings.active_baby_id = None
-
-        # удалим запись
-        await session.execute(delete(Baby).where(Baby.id == baby.id))
-        await session.commit()
+    settings = user_settings or await upsert_settings(session, user.id)
+
+    # найдём ребёнка
+    q = await session.execute(select(Baby).where(Baby.id == baby_id, Baby.user_id == user.id))
+    baby = q.scalar_one_or_none()
+    if not baby:
+        await callback.answer()
+        await callback.message.answer("Ребёнок не найден.")
+        return
+
+    # если удаляем активного — сбрасываем активного
+    if settings.active_baby_id == baby.id:
+        settings.active_baby_id = None
+
+    # удалим запись
+    await session.execute(delete(Baby).where(Baby.id == baby.id))
+    await session.commit()
+    await identity.invalidate_user(callback.from_user.id)
 
     await callback.answer()
     await callback.message.answer("🗑 Профиль ребёнка удалён.")
@@ -1,59 +1,56 @@
 # app/bot/handlers/reminders.py
 from __future__ import annotations
 
+from typing import Optional
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.database import AsyncSessionLocal
-from app.db.models import User  # предполагается, что модель уже есть
+from app.db.models import Baby, User
+from app.services import reminder_rules
+from app.services.reminder_rules import KINDS
 
 router = Router(name=__name__)
 
-# ===== ВСПОМОГАТЕЛЬНОЕ =====
-
-async def _ensure_user(tg_id: int) -> User:
-    """Гарантируем, что пользователь есть в БД."""
-    async with AsyncSessionLocal() as session:  # не используем get_session()
-        u = await session.scalar(select(User).where(User.telegram_id == tg_id))
-        if u:
-            return u
-        u = User(telegram_id=tg_id)
-        session.add(u)
-        await session.commit()
-        await session.refresh(u)
-        return u
+_ICONS = {"feed": "⏰", "diaper": "🧷", "sleep": "😴", "walk": "🚶", "bath": "🛁"}
 
+# ===== ВСПОМОГАТЕЛЬНОЕ =====
 
-def _settings_kb() -> InlineKeyboardBuilder:
+def _settings_kb(enabled: set[str]) -> InlineKeyboardBuilder:
     kb = InlineKeyboardBuilder()
-    # Вернули прежние кнопки напоминаний — коллбеки пока заглушки.
-    kb.button(text="⏰ Кормление", callback_data="remind:feed")
-    kb.button(text="🧷 Подгузник", callback_data="remind:diaper")
-    kb.button(text="😴 Сон", callback_data="remind:sleep")
-    kb.button(text="🚶 Прогулка", callback_data="remind:walk")
-    kb.button(text="🛁 Купание", callback_data="remind:bath")
+    for kind, spec in KINDS.items():
+        mark = "✅" if kind in enabled else "▫️"
+        kb.button(text=f"{mark} {_ICONS[kind]} {spec.title}", callback_data=f"remind:{kind}")
     kb.button(text="⬅️ Назад", callback_data="settings:back")
-    kb.adjust(2, 2, 1)
+    kb.adjust(2, 2, 1, 1)
     return kb
 
 
+def _settings_text() -> str:
+    after = reminder_rules.fmt_minutes
+    return (
+        "Настройки напоминаний:\n"
+        f"— Кормление: через {after(KINDS['feed'].minutes)} после последнего кормления.\n"
+        f"— Сон: если бодрствует дольше {after(KINDS['sleep'].minutes)}.\n"
+        "— Подгузник, прогулка, купание: повтор каждые "
+        f"{after(KINDS['diaper'].minutes)} / {after(KINDS['walk'].minutes)} / {after(KINDS['bath'].minutes)}.\n"
+        "Нажмите, чтобы включить или выключить."
+    )
+
+
 # ===== ХЕНДЛЕРЫ =====
 
 @router.message(F.text.in_({"⚙️ Настройки", "Настройки"}))
-async def settings_menu(message: Message) -> None:
+async def settings_menu(message: Message, session: AsyncSession, user: User, baby: Optional[Baby]) -> None:
     """Открыть меню настроек."""
-    await _ensure_user(message.from_user.id)
-    kb = _settings_kb()
-    await message.answer(
-        "Настройки напоминаний:\n"
-        "— Включите/выключите нужные категории.\n"
-        "Пока без тонких интервалов; добавим позже.",
-        reply_markup=kb.as_markup(),
-    )
+    if not baby:
+        await message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
+        return
+    enabled = await reminder_rules.enabled(session, user.id, baby.id)
+    await message.answer(_settings_text(), reply_markup=_settings_kb(enabled).as_markup())
 
 
 @router.callback_query(F.data == "settings:back")
@@ -63,39 +60,16 @@ async def cb_menu_back(callback: CallbackQuery) -> None:
     await callback.answer()
 
 
-# Ниже простые заглушки на переключатели.
-# Когда будете хранить флаги в БД — добавьте таблицу/поля у User и commit.
-
-async def _toggle_stub(session: AsyncSession, user: User, field: str) -> bool:
-    """Заглушка: всегда возвращает True (включено)."""
-    # Пример для реальной логики:
-    # current = getattr(user, field, False)
-    # setattr(user, field, not current)
-    # await session.commit()
-    return True
-
-async def _toggle_and_notify(callback: CallbackQuery, field: str, title: str) -> None:
-    async with AsyncSessionLocal() as session:
-        user = await _ensure_user(callback.from_user.id)
-        enabled = await _toggle_stub(session, user, field)
-    await callback.answer(f"{title}: {'включено' if enabled else 'выключено'}", show_alert=False)
-
-@router.callback_query(F.data == "remind:feed")
-async def remind_feed(callback: CallbackQuery) -> None:
-    await _toggle_and_notify(callback, "remind_feed", "Кормление")
-
-@router.callback_query(F.data == "remind:diaper")
-async def remind_diaper(callback: CallbackQuery) -> None:
-    await _toggle_and_notify(callback, "remind_diaper", "Подгузник")
-
-@router.callback_query(F.data == "remind:sleep")
-async def remind_sleep(callback: CallbackQuery) -> None:
-    await _toggle_and_notify(callback, "remind_sleep", "Сон")
-
-@router.callback_query(F.data == "remind:walk")
-async def remind_walk(callback: CallbackQuery) -> None:
-    await _toggle_and_notify(callback, "remind_walk", "Прогулка")
-
-@router.callback_query(F.data == "remind:bath")
-async def remind_bath(callback: CallbackQuery) -> None:
-    await _toggle_and_notify(callback, "remind_bath", "Купание")
+@router.callback_query(F.data.in_({f"remind:{kind}" for kind in KINDS}))
+async def remind_toggle(callback: CallbackQuery, session: AsyncSession, user: User, baby: Optional[Baby]) -> None:
+    """Включить/выключить правило напоминаний для активного ребёнка."""
+    if not baby:
+        await callback.answer("Сначала создайте профиль ребёнка.", show_alert=True)
+        return
+    kind = callback.data.split(":", 1)[1]
+    on = await reminder_rules.toggle(
+        session, user_id=user.id, baby=baby, chat_id=callback.message.chat.id, kind=kind
+    )
+    enabled = await reminder_rules.enabled(session, user.id, baby.id)
+    await callback.message.edit_reply_markup(reply_markup=_settings_kb(enabled).as_markup())
+    await callback.answer(f"{KINDS[kind].title}: {'включено' if on else 'выключено'}", show_alert=False)
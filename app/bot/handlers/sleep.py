@@ -1,16 +1,15 @@
 from __future__ import annotations
 
-from datetime import datetime
 from typing import Optional
 
 from aiogram import Router, F, types
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from sqlalchemy import select
+from sqlalchemy import Select, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.database import get_session
-from app.db.models import User, Baby, SleepRecord, UserSettings
-from app.services.carelog import log_event
+from app.db.models import User, Baby, SleepRecord
+from app.services.carelog import CareUnitOfWork
+from app.utils.tz import utcnow
 
 router = Router(name="sleep_db")
 
@@ -25,98 +24,66 @@ def sleep_inline_quality_kb() -> InlineKeyboardMarkup:
         ]
     ])
 
-async def _get_or_create_user(session: AsyncSession, tg: types.User) -> User:
-    q = await session.execute(select(User).where(User.telegram_id == tg.id))
-    user = q.scalar_one_or_none()
-    if not user:
-        user = User(
-            telegram_id=tg.id,
-            username=tg.username,
-            first_name=tg.first_name,
-            last_name=tg.last_name
-        )
-        session.add(user)
-        await session.flush()
-    return user
-
-async def _get_active_baby(session: AsyncSession, user_id: int) -> Optional[Baby]:
-    # сначала пробуем активного
-    qs = await session.execute(select(UserSettings).where(UserSettings.user_id == user_id))
-    settings = qs.scalar_one_or_none()
-    if settings and settings.active_baby_id:
-        qb = await session.execute(select(Baby).where(Baby.id == settings.active_baby_id, Baby.user_id == user_id))
-        baby = qb.scalar_one_or_none()
-        if baby:
-            return baby
-    # иначе — первый по списку
-    qb = await session.execute(select(Baby).where(Baby.user_id == user_id).order_by(Baby.id.asc()).limit(1))
-    return qb.scalar_one_or_none()
-
-async def _get_open_sleep(session: AsyncSession, baby_id: int) -> Optional[SleepRecord]:
-    q = await session.execute(
+def open_sleep_query(baby_id: int) -> Select:
+    """Незакрытый сон ребёнка (индекс ix_sleep_records_baby_start; проверка — migrations --explain)."""
+    return (
         select(SleepRecord)
         .where(SleepRecord.baby_id == baby_id, SleepRecord.sleep_end.is_(None))
         .order_by(SleepRecord.sleep_start.desc())
         .limit(1)
     )
+
+async def _get_open_sleep(session: AsyncSession, baby_id: int) -> Optional[SleepRecord]:
+    q = await session.execute(open_sleep_query(baby_id))
     return q.scalar_one_or_none()
 
 # --- ХЕНДЛЕРЫ ---
 
 @router.message(F.text == "Начал спать")
-async def sleep_start(message: types.Message):
-    async for session in get_session():
-        user = await _get_or_create_user(session, message.from_user)
-        baby = await _get_active_baby(session, user.id)
-
-        if not baby:
-            await message.answer(
-                "❗️ Сначала создайте профиль ребёнка: «Профиль ребёнка» → введите имя и дату рождения."
-            )
-            return
-
-        # Если уже есть незакрытая запись сна — не создаём вторую
-        open_rec = await _get_open_sleep(session, baby.id)
-        if open_rec:
-            await message.answer("У вас уже зафиксировано начало сна. Нажмите «Проснулся», когда ребёнок проснётся.")
-            return
-
-        rec = SleepRecord(baby_id=baby.id, sleep_start=datetime.now())
-        session.add(rec)
-        await session.commit()
-
-        # Лог в семейный календарь
-        await log_event(session, actor_user_id=user.id, event_type="sleep_start", details="старт сна", baby_id=baby.id)
+async def sleep_start(message: types.Message, session: AsyncSession, user: User, baby: Optional[Baby], tz: str):
+    if not baby:
+        await message.answer(
+            "❗️ Сначала создайте профиль ребёнка: «Профиль ребёнка» → введите имя и дату рождения."
+        )
+        return
+
+    # Если уже есть незакрытая запись сна — не создаём вторую
+    open_rec = await _get_open_sleep(session, baby.id)
+    if open_rec:
+        await message.answer("У вас уже зафиксировано начало сна. Нажмите «Проснулся», когда ребёнок проснётся.")
+        return
+
+    # Запись + лог в семейный календарь — одним commit
+    async with CareUnitOfWork(session, actor_user_id=user.id, tz=tz) as uow:
+        uow.add(SleepRecord(baby_id=baby.id, sleep_start=utcnow()))
+        await uow.event("sleep_start", "старт сна", baby_id=baby.id)
 
     await message.answer("🛌 Засыпание зафиксировано. Когда проснётся — нажмите «Проснулся».")
 
 @router.message(F.text == "Проснулся")
-async def sleep_end(message: types.Message):
-    async for session in get_session():
-        user = await _get_or_create_user(session, message.from_user)
-        baby = await _get_active_baby(session, user.id)
-
-        if not baby:
-            await message.answer(
-                "❗️ Сначала создайте профиль ребёнка: «Профиль ребёнка» → введите имя и дату рождения."
-            )
-            return
+async def sleep_end(message: types.Message, session: AsyncSession, user: User, baby: Optional[Baby], tz: str):
+    if not baby:
+        await message.answer(
+            "❗️ Сначала создайте профиль ребёнка: «Профиль ребёнка» → введите имя и дату рождения."
+        )
+        return
 
-        rec = await _get_open_sleep(session, baby.id)
-        if not rec:
-            await message.answer("❌ Нет записи о начале сна. Сначала нажмите «Начал спать».")
-            return
+    rec = await _get_open_sleep(session, baby.id)
+    if not rec:
+        await message.answer("❌ Нет записи о начале сна. Сначала нажмите «Начал спать».")
+        return
 
-        rec.sleep_end = datetime.now()
-        rec.duration_minutes = int((rec.sleep_end - rec.sleep_start).total_seconds() // 60)
-        await session.commit()
+    rec.sleep_end = utcnow()
+    rec.duration_minutes = int((rec.sleep_end - rec.sleep_start).total_seconds() // 60)
+    minutes = rec.duration_minutes or 0
 
-        minutes = rec.duration_minutes or 0
-        # Лог в семейный календарь
-        await log_event(session, actor_user_id=user.id, event_type="sleep_end", details=f"сон {minutes} мин", baby_id=baby.id)
+    # Запись + лог в семейный календарь — одним commit
+    async with CareUnitOfWork(session, actor_user_id=user.id, tz=tz) as uow:
+        uow.add(rec)
+        await uow.event("sleep_end", f"сон {minutes} мин", baby_id=baby.id)
 
-        hours = minutes // 60
-        mins = minutes % 60
+    hours = minutes // 60
+    mins = minutes % 60
 
     await message.answer(
         f"✅ Пробуждение!\nДлительность: {hours}ч {mins}м\n\nОцените качество сна:",
@@ -124,32 +91,29 @@ async def sleep_end(message: types.Message):
     )
 
 @router.callback_query(F.data.startswith("quality_"))
-async def sleep_quality(callback: types.CallbackQuery):
+async def sleep_quality(callback: types.CallbackQuery, session: AsyncSession, baby: Optional[Baby]):
     quality = callback.data.replace("quality_", "")  # good|ok|bad
 
-    async for session in get_session():
-        user = await _get_or_create_user(session, callback.from_user)
-        baby = await _get_active_baby(session, user.id)
-        if not baby:
-            await callback.answer()
-            await callback.message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
-            return
-
-        # Берём последнюю закрытую запись без качества
-        q = await session.execute(
-            select(SleepRecord)
-            .where(SleepRecord.baby_id == baby.id, SleepRecord.sleep_end.is_not(None))
-            .order_by(SleepRecord.sleep_end.desc())
-            .limit(1)
-        )
-        rec = q.scalar_one_or_none()
-        if not rec:
-            await callback.answer()
-            await callback.message.answer("❌ Нет завершённой записи сна для установки качества.")
-            return
-
-        rec.quality = quality
-        await session.commit()
+    if not baby:
+        await callback.answer()
+        await callback.message.answer("❗️ Сначала создайте профиль ребёнка в разделе «Профиль ребёнка».")
+        return
+
+    # Берём последнюю закрытую запись без качества
+    q = await session.execute(
+        select(SleepRecord)
+        .where(SleepRecord.baby_id == baby.id, SleepRecord.sleep_end.is_not(None))
+        .order_by(SleepRecord.sleep_end.desc())
+        .limit(1)
+    )
+    rec = q.scalar_one_or_none()
+    if not rec:
+        await callback.answer()
+        await callback.message.answer("❌ Нет завершённой записи сна для установки качества.")
+        return
+
+    rec.quality = quality
+    await session.commit()
 
     mapping = {"good": "Отлично 😴", "ok": "Нормально 🙂", "bad": "Беспокойно 😕"}
     human = mapping.get(quality, quality)
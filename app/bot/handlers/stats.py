@@ -1,182 +1,293 @@
 from __future__ import annotations
-from datetime import datetime, timedelta, date
+import asyncio
+from datetime import date
+from typing import Any, Callable
 
 from aiogram import Router, F, types
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
-from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.database import get_session
-from app.db.models import User, Baby, SleepRecord, FeedingRecord
-from app.utils.charts import bar_chart_png
-from app.db.models import User, Baby, UserSettings  # + нужные модели раздела
+from app.db.models import Baby
+from app.services import aggregates, chart_data
+from app.utils.lazy import lazy_import
+from app.utils.tz import local_today, to_local
+from app.utils import chart_cache
+from app.utils.chart_cache import chart_key
+from app.utils.charts import heatmap_png, panels_png, series_chart_png
 
 router = Router(name="stats")
 
+# numpy и аналитика грузятся при первом запросе статистики (или фоновым прогревом)
+sleep_analytics = lazy_import("app.services.sleep_analytics")
+heatmap = lazy_import("app.services.heatmap")
+
 # --- helpers ---
 
-async def _get_or_create_user(session: AsyncSession, tg: types.User) -> User:
-    q = await session.execute(select(User).where(User.telegram_id == tg.id))
-    user = q.scalar_one_or_none()
-    if not user:
-        user = User(
-            telegram_id=tg.id,
-            username=tg.username,
-            first_name=tg.first_name,
-            last_name=tg.last_name
+def _last_7_days(tz: str) -> list[date]:
+    return aggregates.day_range(local_today(tz), 7)  # 7 локальных дней: от -6 до 0
+
+def _fmt_day(d: date) -> str:
+    return d.strftime("%d.%m")
+
+async def _send_chart(
+    message: types.Message,
+    fn: Callable[..., Any],
+    *,
+    filename: str,
+    caption: str | None = None,
+    **kwargs: Any,
+) -> bool:
+    """
+    Фото графика fn(**kwargs). Такой же график уже отправляли — уходит по file_id,
+    без построения и загрузки; иначе PNG из кэша или из пула построения.
+    """
+    key = chart_key(fn, (), kwargs)
+    file_id = chart_cache.cache.file_id(key)
+    if file_id:
+        try:
+            await message.answer_photo(file_id, caption=caption)
+            return True
+        except TelegramBadRequest:
+            chart_cache.cache.forget_file_id(key)  # file_id больше не принимается — загрузим заново
+    try:
+        png = await chart_cache.cache.fetch(key, fn, (), kwargs)
+    except TimeoutError:
+        await message.answer("⏳ График строится слишком долго — попробуйте ещё раз через минуту.")
+        return False
+    sent = await message.answer_photo(types.BufferedInputFile(png, filename=filename), caption=caption)
+    if sent.photo:
+        chart_cache.cache.remember_file_id(key, sent.photo[-1].file_id)
+    return True
+
+async def _send_album(
+    message: types.Message,
+    charts: list[tuple[Callable[..., Any], str, dict[str, Any]]],
+    *,
+    caption: str | None = None,
+) -> bool:
+    """
+    Несколько графиков [(fn, имя файла, kwargs)] одним media group: одно сообщение
+    и один запрос к Bot API вместо N. Уже отправлявшиеся уходят по file_id,
+    остальные строятся параллельно.
+    """
+    cache = chart_cache.cache
+    keys = [chart_key(fn, (), kwargs) for fn, _, kwargs in charts]
+    file_ids = [cache.file_id(k) for k in keys]
+    try:
+        pngs = iter(await asyncio.gather(*(
+            cache.fetch(k, fn, (), kwargs)
+            for k, file_id, (fn, _, kwargs) in zip(keys, file_ids, charts) if not file_id
+        )))
+    except TimeoutError:
+        await message.answer("⏳ Графики строятся слишком долго — попробуйте ещё раз через минуту.")
+        return False
+    media = [
+        types.InputMediaPhoto(
+            media=file_id or types.BufferedInputFile(next(pngs), filename=filename),
+            caption=caption if i == 0 else None,
         )
-        session.add(user)
-        await session.flush()
-    return user
+        for i, (file_id, (_, filename, _)) in enumerate(zip(file_ids, charts))
+    ]
+    try:
+        sent = await message.answer_media_group(media)
+    except TelegramBadRequest:
+        if not any(file_ids):
+            raise
+        for k, file_id in zip(keys, file_ids):
+            if file_id:
+                cache.forget_file_id(k)  # повторим с загрузкой байтов
+        return await _send_album(message, charts, caption=caption)
+    for k, m in zip(keys, sent):
+        if m.photo:
+            cache.remember_file_id(k, m.photo[-1].file_id)
+    return True
 
-async def _get_primary_baby(session: AsyncSession, user_id: int) -> Baby | None:
-    q = await session.execute(select(Baby).where(Baby.user_id == user_id).limit(1))
-    return q.scalar_one_or_none()
+def _sleep_series(day_minutes: list[int], night_minutes: list[int]) -> list[dict[str, Any]]:
+    """Ночь и день стопкой, в часах."""
+    return [
+        {"label": "ночь", "values": [round(m / 60, 2) for m in night_minutes], "stack": True},
+        {"label": "день", "values": [round(m / 60, 2) for m in day_minutes], "stack": True},
+    ]
 
-def _last_7_days() -> list[date]:
-    today = date.today()
-    days = [today - timedelta(days=i) for i in range(6, -1, -1)]  # 7 дней: от -6 до 0
-    return days
+def _feed_series(ml: list[int], g: list[int]) -> list[dict[str, Any]]:
+    """мл и г рядом, на двух осях — у них разный масштаб."""
+    return [
+        {"label": "жидкость, мл", "values": ml},
+        {"label": "прикорм, г", "values": g, "axis": "right"},
+    ]
 
-def _fmt_day(d: date) -> str:
-    return d.strftime("%d.%m")
+def _hm(minutes: float) -> str:
+    h, m = divmod(int(round(minutes)), 60)
+    return f"{h} ч {m:02d} мин" if h else f"{m} мин"
+
+def _sleep_ranges_kb() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text=f"{d} дн.", callback_data=f"sleep_stats_{d}")
+            for d in sleep_analytics.RANGES
+        ],
+        [InlineKeyboardButton(text="🗓 Режим дня (4 недели)", callback_data="sleep_heatmap")],
+        [InlineKeyboardButton(text="📊 Сводка: сон, кормление, рост", callback_data="stats_dashboard")],
+    ])
+
+def _sleep_summary(stats: sleep_analytics.SleepStats) -> str:
+    n = len(stats.days)
+    if not stats.tracked_days:
+        return f"😴 Сон за {n} дн.: записей нет."
+    lines = [
+        f"😴 Сон за {n} дн. — в среднем за сутки (дней с записями: {stats.tracked_days})",
+        f"• Всего: {_hm(stats.avg(stats.total))}",
+        f"• Ночью: {_hm(stats.avg(stats.night))}, днём: {_hm(stats.avg(stats.day))}",
+        f"• Дневных снов: {stats.avg(stats.naps):.1f}",
+    ]
+    if stats.longest_start:
+        lines.append(f"• Самый длинный сон: {_hm(stats.longest)} ({stats.longest_start:%d.%m %H:%M})")
+    if stats.wake_avg is not None:
+        lines.append(f"• Бодрствование между снами: {_hm(stats.wake_avg)}, максимум {_hm(stats.wake_max)}")
+    return "\n".join(lines)
 
 # --- callbacks ---
 
-@router.callback_query(F.data == "stats_sleep_7d")
-async def stats_sleep_7d(callback: types.CallbackQuery):
-    days = _last_7_days()
-    totals_minutes = {d: 0 for d in days}
-
-    async for session in get_session():
-        user = await _get_or_create_user(session, callback.from_user)
-        baby = await _get_active_baby(session, user.id)
-        if not baby:
-            await callback.answer()
-            await callback.message.answer("Нет данных: создайте профиль ребёнка и добавьте записи сна.")
-            return
-
-        # Для SQLite сгруппируем по дате sleep_start
-        q = await session.execute(
-            select(
-                func.date(SleepRecord.sleep_start).label("d"),
-                func.coalesce(func.sum(SleepRecord.duration_minutes), 0)
-            )
-            .where(
-                SleepRecord.baby_id == baby.id,
-                SleepRecord.sleep_start >= datetime.combine(days[0], datetime.min.time()),
-                SleepRecord.sleep_start <= datetime.combine(days[-1], datetime.max.time()),
-                SleepRecord.duration_minutes.is_not(None),
-            )
-            .group_by(func.date(SleepRecord.sleep_start))
-        )
-        rows = q.all()
+@router.message(F.text == "Статистика сна")
+async def sleep_stats_menu(message: types.Message, session: AsyncSession, baby: Baby | None, tz: str):
+    """Сводка сна за неделю + кнопки других диапазонов."""
+    if not baby:
+        await message.answer("Нет данных: создайте профиль ребёнка и добавьте записи сна.")
+        return
+    stats = await sleep_analytics.sleep_stats(session, baby.id, tz, days=7)
+    await message.answer(_sleep_summary(stats), reply_markup=_sleep_ranges_kb())
 
-    # Заполним словарь
-    for d_str, total in rows:
-        # d_str типа 'YYYY-MM-DD'
-        d_obj = date.fromisoformat(d_str)
-        if d_obj in totals_minutes:
-            totals_minutes[d_obj] = int(total or 0)
+@router.callback_query(F.data.startswith("sleep_stats_"))
+async def sleep_stats_range(callback: types.CallbackQuery, session: AsyncSession, baby: Baby | None, tz: str):
+    days = int(callback.data.rsplit("_", 1)[-1])
+    if days not in sleep_analytics.RANGES:
+        await callback.answer()
+        return
+    await _send_sleep_stats(callback, session, baby, tz, days)
 
-    x = [_fmt_day(d) for d in days]
-    vals_hours = [round(t / 60.0, 2) for t in [totals_minutes[d] for d in days]]  # в часы
+@router.callback_query(F.data == "stats_sleep_7d")
+async def stats_sleep_7d(callback: types.CallbackQuery, session: AsyncSession, baby: Baby | None, tz: str):
+    await _send_sleep_stats(callback, session, baby, tz, 7)
+
+async def _send_sleep_stats(
+    callback: types.CallbackQuery, session: AsyncSession, baby: Baby | None, tz: str, days: int,
+):
+    if not baby:
+        await callback.answer()
+        await callback.message.answer("Нет данных: создайте профиль ребёнка и добавьте записи сна.")
+        return
 
-    png = bar_chart_png(
-        title="Сон за 7 дней (часы)",
-        x_labels=x,
-        values=vals_hours,
+    # Сон делится по локальной полуночи: ночной сон попадает в оба дня
+    stats = await sleep_analytics.sleep_stats(session, baby.id, tz, days=days)
+    await callback.answer()
+    await _send_chart(
+        callback.message,
+        series_chart_png,
+        filename=f"sleep_{days}d.png",
+        caption=_sleep_summary(stats),
+        title=f"Сон за {days} дн. (часы)",
+        x_labels=[_fmt_day(d) for d in stats.days],
+        series=_sleep_series(stats.day.tolist(), stats.night.tolist()),
         ylabel="часы",
     )
+
+@router.callback_query(F.data == "sleep_heatmap")
+async def sleep_heatmap(callback: types.CallbackQuery, session: AsyncSession, baby: Baby | None, tz: str):
+    """Когда ребёнок спит и ест: дни × 15-минутные слоты."""
+    if not baby:
+        await callback.answer()
+        await callback.message.answer("Нет данных: создайте профиль ребёнка и добавьте записи сна.")
+        return
+
+    hm = await heatmap.build(session, baby.id, tz)
+    labels = [_fmt_day(d) for d in hm.days]
+    # суммы по дням — из той же матрицы слотов, без второго запроса
+    per_slot = 60 // heatmap.SLOT_MINUTES
+    day_part = hm.sleep[:, sleep_analytics.NIGHT_END * per_slot:sleep_analytics.NIGHT_START * per_slot].sum(axis=1)
+    night_part = hm.sleep.sum(axis=1) - day_part
+
     await callback.answer()
-    await callback.message.answer_photo(types.BufferedInputFile(png.read(), filename="sleep_7d.png"))
+    await _send_album(
+        callback.message,
+        [
+            (heatmap_png, "sleep_heatmap.png", dict(
+                title=f"Режим дня за {len(hm.days)} дн.",
+                y_labels=labels,
+                cells=(hm.sleep / heatmap.SLOT_MINUTES).tolist(),
+                points=[(int(d), int(s)) for d, s in zip(*hm.feeds.nonzero())],
+                points_label="кормление",
+            )),
+            (series_chart_png, "sleep_day_night.png", dict(
+                title=f"Сон днём и ночью за {len(hm.days)} дн. (часы)",
+                x_labels=labels,
+                series=_sleep_series(day_part.tolist(), night_part.tolist()),
+                ylabel="часы",
+            )),
+        ],
+        caption="Синим — сон (чем темнее, тем дольше в этом 15-минутном слоте), точки — кормления.",
+    )
 
 @router.callback_query(F.data == "stats_feed_7d")
-async def stats_feed_7d(callback: types.CallbackQuery):
-    days = _last_7_days()
-    totals_ml = {d: 0 for d in days}
-    totals_g = {d: 0 for d in days}
-
-    async for session in get_session():
-        user = await _get_or_create_user(session, callback.from_user)
-        baby = await _get_active_baby(session, user.id)
-        if not baby:
-            await callback.answer()
-            await callback.message.answer("Нет данных: создайте профиль ребёнка и добавьте кормления.")
-            return
-
-        # Жидкости (ml): formula + water
-        q_ml = await session.execute(
-            select(
-                func.date(FeedingRecord.fed_at).label("d"),
-                func.coalesce(func.sum(FeedingRecord.amount_ml), 0)
-            )
-            .where(
-                FeedingRecord.baby_id == baby.id,
-                FeedingRecord.fed_at >= datetime.combine(days[0], datetime.min.time()),
-                FeedingRecord.fed_at <= datetime.combine(days[-1], datetime.max.time()),
-                FeedingRecord.amount_ml.is_not(None),
-            )
-            .group_by(func.date(FeedingRecord.fed_at))
-        )
-        rows_ml = q_ml.all()
-
-        # Прикорм (g)
-        q_g = await session.execute(
-            select(
-                func.date(FeedingRecord.fed_at).label("d"),
-                func.coalesce(func.sum(FeedingRecord.amount_g), 0)
-            )
-            .where(
-                FeedingRecord.baby_id == baby.id,
-                FeedingRecord.fed_at >= datetime.combine(days[0], datetime.min.time()),
-                FeedingRecord.fed_at <= datetime.combine(days[-1], datetime.max.time()),
-                FeedingRecord.amount_g.is_not(None),
-            )
-            .group_by(func.date(FeedingRecord.fed_at))
-        )
-        rows_g = q_g.all()
-
-    for d_str, total in rows_ml:
-        d_obj = date.fromisoformat(d_str)
-        if d_obj in totals_ml:
-            totals_ml[d_obj] = int(total or 0)
+async def stats_feed_7d(callback: types.CallbackQuery, session: AsyncSession, baby: Baby | None, tz: str):
+    if not baby:
+        await callback.answer()
+        await callback.message.answer("Нет данных: создайте профиль ребёнка и добавьте кормления.")
+        return
 
-    for d_str, total in rows_g:
-        d_obj = date.fromisoformat(d_str)
-        if d_obj in totals_g:
-            totals_g[d_obj] = int(total or 0)
+    days = _last_7_days(tz)
+    ml, g = await chart_data.feed_by_day(session, baby.id, days)
 
-    x = [_fmt_day(d) for d in days]
-    vals_ml = [totals_ml[d] for d in days]
-    vals_g = [totals_g[d] for d in days]
-
-    # Два отдельных графика: сначала мл, потом г (два сообщения)
-    png_ml = bar_chart_png(
-        title="Кормление (жидкость) за 7 дней, мл",
-        x_labels=x,
-        values=vals_ml,
+    # мл и г на одном графике (две оси): один рендер и одна отправка
+    await callback.answer()
+    await _send_chart(
+        callback.message,
+        series_chart_png,
+        filename="feed_7d.png",
+        title="Кормление за 7 дней",
+        x_labels=[_fmt_day(d) for d in days],
+        series=_feed_series(ml, g),
         ylabel="мл",
+        y2label="г",
     )
-    png_g = bar_chart_png(
-        title="Кормление (прикорм) за 7 дней, г",
-        x_labels=x,
-        values=vals_g,
-        ylabel="г",
-    )
 
+@router.callback_query(F.data == "stats_dashboard")
+async def stats_dashboard(callback: types.CallbackQuery, session: AsyncSession, baby: Baby | None, tz: str):
+    """Сон, кормление и рост за неделю — одной картинкой."""
+    if not baby:
+        await callback.answer()
+        await callback.message.answer("Нет данных: создайте профиль ребёнка.")
+        return
+
+    days = _last_7_days(tz)
+    sleep = await sleep_analytics.sleep_stats(session, baby.id, tz, days=7)
+    ml, g = await chart_data.feed_by_day(session, baby.id, days)
+    growth = await chart_data.growth(session, baby.id)
+
+    x = [_fmt_day(d) for d in days]
+    panels = [
+        {"title": "Сон, часы", "x_labels": x, "series": _sleep_series(sleep.day.tolist(), sleep.night.tolist()),
+         "ylabel": "часы"},
+        {"title": "Кормление", "x_labels": x, "series": _feed_series(ml, g), "ylabel": "мл", "y2label": "г"},
+        {
+            "title": "Рост и вес",
+            "x_labels": [_fmt_day(to_local(r.created_at, tz).date()) for r in growth],
+            "series": [
+                {"label": "вес, кг", "values": [r.weight_g / 1000 if r.weight_g else None for r in growth],
+                 "kind": "line"},
+                {"label": "рост, см", "values": [r.height_cm for r in growth], "kind": "line", "axis": "right"},
+            ],
+            "ylabel": "кг",
+            "y2label": "см",
+        },
+    ]
     await callback.answer()
-    await callback.message.answer_photo(types.BufferedInputFile(png_ml.read(), filename="feed_ml_7d.png"))
-    await callback.message.answer_photo(types.BufferedInputFile(png_g.read(), filename="feed_g_7d.png"))
-async def _get_active_baby(session: AsyncSession, user_id: int) -> Baby | None:
-    # сначала пробуем активного
-    qs = await session.execute(select(UserSettings).where(UserSettings.user_id == user_id))
-    settings = qs.scalar_one_or_none()
-    if settings and settings.active_baby_id:
-        qb = await session.execute(select(Baby).where(Baby.id == settings.active_baby_id, Baby.user_id == user_id))
-        baby = qb.scalar_one_or_none()
-        if baby:
-            return baby
-    # иначе — первый по списку
-    qb = await session.execute(select(Baby).where(Baby.user_id == user_id).order_by(Baby.id.asc()).limit(1))
-    return qb.scalar_one_or_none()
+    await _send_chart(
+        callback.message,
+        panels_png,
+        filename="dashboard.png",
+        caption=_sleep_summary(sleep),
+        title=f"{baby.name}: сводка за 7 дней",
+        panels=panels,
+    )
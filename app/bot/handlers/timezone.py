@@ -0,0 +1,53 @@
+# app/bot/handlers/timezone.py
+from __future__ import annotations
+
+from datetime import datetime
+from html import escape
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Baby, User, UserSettings
+from app.services import identity, rollups
+from app.services.users import upsert_settings
+from app.utils.tz import label, parse_timezone, zone
+
+router = Router(name="timezone")
+
+_USAGE = "Чтобы изменить: /timezone Europe/Moscow или /timezone +3"
+
+
+@router.message(Command("timezone"))
+async def cmd_timezone(
+    message: types.Message,
+    command: CommandObject,
+    session: AsyncSession,
+    user: User,
+    user_settings: UserSettings | None,
+    tz: str,
+):
+    """Показать или сменить часовой пояс: от него зависят «сегодня» и суточная статистика."""
+    arg = (command.args or "").strip()
+    if not arg:
+        now = datetime.now(zone(tz)).strftime("%H:%M")
+        await message.answer(f"🕒 Ваш часовой пояс: <b>{label(tz)}</b> (сейчас {now}).\n{_USAGE}")
+        return
+
+    name = parse_timezone(arg)
+    if name is None:
+        await message.answer(f"Не знаю такой часовой пояс: {escape(arg)}\n{_USAGE}")
+        return
+
+    settings = user_settings or await upsert_settings(session, user.id)
+    settings.timezone = name
+    # daily_rollups хранят локальные сутки — пересчитываем детей пользователя в новом поясе
+    baby_ids = list(await session.scalars(select(Baby.id).where(Baby.user_id == user.id)))
+    if baby_ids:
+        await rollups.rebuild(session, baby_ids, tz=name)
+    await session.commit()
+    await identity.invalidate_user(message.from_user.id)
+
+    now = datetime.now(zone(name)).strftime("%H:%M")
+    await message.answer(f"✅ Часовой пояс: <b>{label(name)}</b> (сейчас {now}).")
@@ -12,10 +12,14 @@ from app.bot.handlers.webapp import router as webapp_router
 from app.bot.config import get_config
 from app.utils.logging import setup_logging
 from app.db.database import init_db
+from app.bot.middlewares.context import RequestContextMiddleware
+from app.services import identity
+from app.utils import chart_pool
 
 # Routers
 from app.bot.handlers.start import router as start_router
 from app.bot.handlers.help import router as help_router
+from app.bot.handlers.timezone import router as timezone_router
 from app.bot.handlers.menu import router as menu_router
 from app.bot.handlers.profile import router as profile_router
 from app.bot.handlers.sleep import router as sleep_router
@@ -39,8 +43,12 @@ async def _on_shutdown(bot: Bot):
 def build_dispatcher() -> Dispatcher:
     dp = Dispatcher(storage=MemoryStorage())
 
+    # Сессия БД + пользователь/настройки/активный ребёнок для хендлеров
+    dp.update.outer_middleware(RequestContextMiddleware())
+
     dp.include_router(start_router)
     dp.include_router(help_router)
+    dp.include_router(timezone_router)
 
     # Важно: reminders раньше menu
     dp.include_router(reminders_router)
@@ -60,6 +68,8 @@ async def run_polling():
 
     # Инициализация БД
     await init_db()
+    identity.start_listener()
+    chart_pool.pool.start()
 
     bot = Bot(
         token=cfg.bot.token,
@@ -86,6 +96,7 @@ async def run_polling():
         except Exception:
             pass
         await bot.session.close()
+        chart_pool.pool.stop()
 
 
 def main():
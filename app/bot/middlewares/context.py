@@ -0,0 +1,76 @@
+# app/bot/middlewares/context.py
+from __future__ import annotations
+
+import logging
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.db.database import count_queries, get_session
+from app.services import identity
+from app.services.users import is_stale, load_user_context, upsert_user
+from app.utils.tz import zone
+
+log = logging.getLogger(__name__)
+
+# метрики: сколько SQL-запросов уходит на один апдейт
+stats: dict[str, int] = {"updates": 0, "queries": 0, "max_queries": 0}
+
+
+def query_stats() -> dict[str, Any]:
+    updates = stats["updates"]
+    return {
+        **stats,
+        "avg_queries": round(stats["queries"] / updates, 2) if updates else 0.0,
+    }
+
+
+class RequestContextMiddleware(BaseMiddleware):
+    """
+    Outer-middleware апдейта: открывает сессию БД на время обработки и
+    одним запросом загружает пользователя, его настройки и активного ребёнка.
+    Повторные апдейты того же пользователя берут их из identity-кэша без SELECT.
+
+    В хендлеры попадают (если объявлены в сигнатуре):
+    session, user, user_settings, baby, family_id, tz (часовой пояс пользователя).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        tg_user = data.get("event_from_user")
+
+        with count_queries() as counter:
+            try:
+                async with get_session() as session:
+                    data["session"] = session
+                    user = settings = baby = family_id = None
+                    if tg_user is not None:
+                        snapshot = identity.users.get(tg_user.id)
+                        if snapshot is not None:
+                            user, settings, baby = snapshot.attach(session)
+                            family_id = snapshot.family_id
+                        else:
+                            user, settings, baby, family_id = await load_user_context(session, tg_user)
+                            if user is None or is_stale(user, tg_user):
+                                user = await upsert_user(session, tg_user)
+                                await session.commit()
+                            identity.remember(
+                                tg_user.id, identity.IdentitySnapshot.capture(user, settings, baby, family_id)
+                            )
+                    data["user"] = user
+                    data["user_settings"] = settings
+                    data["baby"] = baby
+                    data["family_id"] = family_id
+                    data["tz"] = zone(settings.timezone if settings is not None else None).key
+                    return await handler(event, data)
+            finally:
+                stats["updates"] += 1
+                stats["queries"] += counter[0]
+                if counter[0] > stats["max_queries"]:
+                    stats["max_queries"] = counter[0]
+                log.debug("Update processed with %s DB queries", counter[0])
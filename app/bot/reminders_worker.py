@@ -1,54 +1,440 @@
+# app/bot/reminders_worker.py
+"""
+Планировщик напоминаний.
+
+Ближайшие next_run (окно REMINDER_WINDOW_SECONDS вперёд) загружаются из БД в
+min-heap, и воркер спит ровно до первого из них. Создание, перенос и удаление
+напоминаний будят его через app.services.reminders (в процессе — напрямую, между
+процессами — PostgreSQL LISTEN/NOTIFY), поэтому опрашивать таблицу не нужно:
+без срабатываний — один запрос окна раз в REMINDER_WINDOW_SECONDS.
+
+Наступившие отправляются партиями (REMINDER_BATCH) параллельно через
+app.bot.delivery с общим лимитом и лимитом на чат. retry_after и занятый чат —
+повтор в срок без траты попытки; сеть/5xx — backoff, после REMINDER_MAX_ATTEMPTS
+повторяющееся пропускает этот раз, одноразовое выключается. Сразу выключаются
+только напоминания в чаты, где бот заблокирован или которых нет.
+
+Воркеров может быть сколько угодно (uvicorn --workers, несколько инстансов, плюс
+polling из app/bot/main.py): партию напоминаний воркер берёт в аренду
+(locked_until/locked_by) одним UPDATE ... RETURNING, на PostgreSQL — с
+FOR UPDATE SKIP LOCKED. Упавший воркер задерживает свои строки не дольше
+REMINDER_LEASE_SECONDS. Лимит TELEGRAM_RATE делится между процессами
+(TELEGRAM_SENDERS, см. app.bot.delivery), так что вместе они его не превышают.
+Поэтому партия не больше, чем процесс успевает отправить за половину аренды,
+а пока она отправляется, аренда продлевается — иначе медленную партию
+(лимит на процесс, занятые чаты, зависший запрос) взял бы второй воркер и
+разослал бы те же напоминания ещё раз.
+
+Повторяющиеся идут по исходной сетке: следующий срок — прежний next_run плюс
+интервал, а не «сейчас плюс интервал», так что опоздания отправки не копятся.
+Если пропущен целый интервал и больше (воркеры стояли), REMINDER_CATCH_UP решает,
+слать ли одно сообщение с числом пропущенных (coalesce) или молча перейти к
+ближайшему будущему сроку (skip). Итог партии записывается одним UPDATE.
+"""
 from __future__ import annotations
 
 import asyncio
+import heapq
+import logging
+import os
+import socket
 from datetime import datetime, timedelta
+from typing import Any
 
 from aiogram import Bot
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Select, case, or_, select, update
 
+from app.bot import delivery
 from app.db.database import get_session
-from app.db.models import Reminder, User
+from app.db.models import Reminder
+from app.services import reminders
+from app.utils.tz import utcnow
+
+log = logging.getLogger(__name__)
+
+# На сколько вперёд грузить сроки из БД и сколько напоминаний держать в памяти за раз
+REMINDER_WINDOW_SECONDS = float(os.getenv("REMINDER_WINDOW_SECONDS", "900"))
+REMINDER_WINDOW_LIMIT = int(os.getenv("REMINDER_WINDOW_LIMIT", "1000"))
+# Пауза после ошибки БД, сек
+REMINDER_RETRY_SECONDS = float(os.getenv("REMINDER_RETRY_SECONDS", "5"))
+# Сколько напоминаний отправлять одной партией (параллельно, в рамках лимитов app.bot.delivery);
+# не больше, чем отправляется за половину аренды при лимите этого процесса
+REMINDER_BATCH = int(os.getenv("REMINDER_BATCH", "500"))
+# Аренда партии: столько секунд строки принадлежат воркеру; пока партия отправляется, продлевается
+REMINDER_LEASE_SECONDS = float(os.getenv("REMINDER_LEASE_SECONDS", "120"))
+# Повторяющееся напоминание опоздало на целый интервал и больше (сервис лежал):
+# coalesce — одно сообщение с числом пропущенных, skip — пропущенное не досылать.
+# В обоих случаях следующий срок — по исходному расписанию.
+REMINDER_CATCH_UP = os.getenv("REMINDER_CATCH_UP", "coalesce").strip().lower()
+# Попыток при сетевых/серверных ошибках, прежде чем пропустить (повторяющееся) или выключить
+REMINDER_MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", "5"))
+
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"[:64]
+
+
+def claimable_query(now: datetime, limit: int) -> Select:
+    """Наступившие и свободные от аренды id (индекс ix_reminders_active_next_run)."""
+    free = or_(Reminder.locked_until.is_(None), Reminder.locked_until <= now)
+    return (
+        select(Reminder.id)
+        .where(Reminder.is_active, Reminder.next_run <= now, free)
+        .order_by(Reminder.next_run)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
 
-CHECK_INTERVAL_SECONDS = 30  # как часто проверять, сек
+class ReminderScheduler:
+    """
+    Heap (next_run, id) + словарь актуальных сроков: запись в heap, чей срок
+    разошёлся со словарём (перенесли/удалили), при извлечении пропускается.
+    Всё, что активно и наступает раньше horizon, уже в памяти; новое окно
+    грузится, когда время доходит до horizon.
+    """
 
-async def _process_due_reminders(bot: Bot):
-    now = datetime.now()
+    def __init__(
+        self,
+        bot: Bot,
+        *,
+        window: float = 900.0,
+        limit: int = 1000,
+        batch: int = 500,
+        max_attempts: int = 5,
+        lease: float = 120.0,
+        catch_up: str = "coalesce",
+        worker_id: str | None = None,
+        sender: delivery.Sender | None = None,
+    ) -> None:
+        self.sender = sender or delivery.Sender(bot)
+        self.lease = timedelta(seconds=lease)
+        self.catch_up = catch_up if catch_up in ("coalesce", "skip") else "coalesce"
+        self.worker_id = worker_id or WORKER_ID
+        self.window = timedelta(seconds=window)
+        self.limit = max(1, limit)
+        # партия должна уйти за половину аренды даже при лимите на процесс (TELEGRAM_RATE / TELEGRAM_SENDERS)
+        self.batch = max(1, min(batch, int(lease * self.sender.bucket.rate / 2)))
+        self.max_attempts = max(1, max_attempts)
+        self._heap: list[tuple[datetime, int]] = []
+        self._due: dict[int, datetime] = {}
+        self._attempts: dict[int, int] = {}  # id → неудачных попыток подряд
+        self._claimed: dict[int, datetime] = {}  # id → первая аренда срока, который ещё повторяется
+        self._horizon: datetime | None = None
+        self._more = False
+        self._wake = asyncio.Event()
 
-    async for session in get_session():
-        # Берём активные напоминания, срок которых настал
-        q = await session.execute(
-            select(Reminder).where(
-                Reminder.is_active.is_(True),
-                Reminder.next_run <= now
+        # метрики
+        self.loads = 0
+        self.fire_batches = 0
+        self.fired = 0
+        self.failed = 0
+        self.retried = 0
+        self.coalesced = 0
+        self.skipped = 0
+        self.contended = 0
+        self.renewals = 0
+        self.notifications = 0
+        self.wakeups = 0
+        self.errors = 0
+        self.lag_seconds = 0.0
+        self.lag_max = 0.0
+
+    # --- heap ---
+
+    def _push(self, reminder_id: int, next_run: datetime) -> bool:
+        if self._due.get(reminder_id) == next_run:
+            return False
+        self._due[reminder_id] = next_run
+        heapq.heappush(self._heap, (next_run, reminder_id))
+        return True
+
+    def _pop_due(self, now: datetime) -> list[int]:
+        ids = []
+        while self._heap and self._heap[0][0] <= now and len(ids) < self.batch:
+            next_run, rid = heapq.heappop(self._heap)
+            if self._due.get(rid) == next_run:
+                del self._due[rid]
+                ids.append(rid)
+        return ids
+
+    def notify(self, reminder_id: int, next_run: datetime | None) -> None:
+        """Срок напоминания изменился (подписка на app.services.reminders)."""
+        self.notifications += 1
+        self._attempts.pop(reminder_id, None)
+        self._claimed.pop(reminder_id, None)
+        if next_run is None or (self._horizon is not None and next_run >= self._horizon):
+            # выключено или позже окна — придёт со следующей загрузкой
+            self._due.pop(reminder_id, None)
+            return
+        if self._push(reminder_id, next_run):
+            self._wake.set()
+
+    # --- БД ---
+
+    async def _load(self, now: datetime) -> None:
+        end = now + self.window
+        # пока идёт запрос, принимаем любые уведомления: закоммиченное после него в выборку не попадёт
+        self._horizon = None
+        async with get_session() as session:
+            q = await session.execute(
+                select(Reminder.id, Reminder.next_run, Reminder.locked_until)
+                .where(Reminder.is_active, Reminder.next_run < end)
+                .order_by(Reminder.next_run)
+                .limit(self.limit)
             )
+            rows = q.all()
+        self.loads += 1
+        for rid, next_run, locked_until in rows:
+            # в аренде (отправляется или ждёт повтора) — смотрим снова, когда аренда кончится
+            self._push(rid, max(next_run, locked_until) if locked_until else next_run)
+        # окно обрезано лимитом — следующая загрузка с последнего загруженного срока
+        self._horizon = end if len(rows) < self.limit else rows[-1][1]
+
+    async def _claim(self, now: datetime) -> list[Any]:
+        """
+        Взять в аренду до batch наступивших напоминаний одним UPDATE ... RETURNING.
+        PostgreSQL: подзапрос с FOR UPDATE SKIP LOCKED — воркеры делят строки, не дожидаясь
+        друг друга. SQLite: FOR UPDATE не нужен (и не выводится) — запись в файл и так
+        идёт по одной, так что выполняется один претендент за раз.
+        """
+        ids = claimable_query(now, self.batch)
+        stmt = (
+            update(Reminder)
+            .where(Reminder.id.in_(ids.scalar_subquery()))
+            .values(locked_until=now + self.lease, locked_by=self.worker_id)
+            .returning(Reminder.id, Reminder.chat_id, Reminder.text, Reminder.next_run, Reminder.interval_minutes)
+            .execution_options(synchronize_session=False)
         )
-        reminders = q.scalars().all()
+        async with get_session() as session:
+            rows = (await session.execute(stmt)).all()
+            await session.commit()
+        return rows
 
-        for r in reminders:
-            try:
-                # Отправляем текст в чат
-                await bot.send_message(chat_id=r.chat_id, text=f"⏰ Напоминание: {r.text}")
+    def _next_run(self, r: Any, now: datetime) -> tuple[datetime | None, int]:
+        """
+        (следующий срок, сколько запусков пропущено) для повторяющегося; (None, 0) для
+        одноразового. Срок считается от прежнего запланированного, а не от момента
+        отправки: задержки обработки не накапливаются, расписание не сдвигается.
+        """
+        if not r.interval_minutes or r.interval_minutes <= 0:
+            return None, 0
+        step = timedelta(minutes=r.interval_minutes)
+        missed = max(0, (now - r.next_run) // step)
+        return r.next_run + (missed + 1) * step, missed
 
-                if r.interval_minutes and r.interval_minutes > 0:
-                    # Повторяющееся: переносим next_run
-                    r.next_run = now + timedelta(minutes=r.interval_minutes)
-                else:
-                    # Одноразовое: деактивируем
-                    r.is_active = False
+    async def _recheck(self, ids: set[int]) -> None:
+        """
+        Наступившие из heap, которых не досталось при аренде (взял другой воркер или
+        не влезли в партию): вернуть в heap на срок по БД — не раньше конца чужой аренды.
+        Иначе строка упавшего воркера ждала бы здесь следующей загрузки окна.
+        """
+        async with get_session() as session:
+            q = await session.execute(
+                select(Reminder.id, Reminder.next_run, Reminder.locked_until).where(
+                    Reminder.id.in_(ids), Reminder.is_active
+                )
+            )
+            rows = q.all()
+        for rid, next_run, locked_until in rows:
+            at = max(next_run, locked_until) if locked_until else next_run
+            if self._horizon is None or at < self._horizon:
+                self._push(rid, at)
 
+    async def _renew(self, ids: list[int]) -> None:
+        """Продлевать аренду партии каждую треть срока, пока она отправляется (задача отменяется)."""
+        t = Reminder.__table__
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            try:
+                async with get_session() as session:
+                    await session.execute(
+                        update(t)
+                        .where(t.c.id.in_(ids), t.c.locked_by == self.worker_id)
+                        .values(locked_until=utcnow() + self.lease)
+                    )
+                    await session.commit()
+                self.renewals += 1
             except Exception:
-                # Если отправка не удалась — деактивируем, чтобы не зациклиться
-                r.is_active = False
+                log.exception("Reminder lease renewal failed")
+
+    async def _fire(self, now: datetime, popped: list[int]) -> bool:
+        """Отправить одну партию; True — партия полная, наступившие могут остаться."""
+        due = await self._claim(now)
+        self.fire_batches += 1
+        lost = set(popped) - {r.id for r in due}
+        if lost:
+            self.contended += len(lost)
+            await self._recheck(lost)
+        if not due:
+            return False
 
-        if reminders:
+        # пропуски считаются от первой аренды этого срока: ожидание повторов (429, backoff) — не пропуск
+        plan = {r.id: self._next_run(r, self._claimed.setdefault(r.id, now)) for r in due}
+        outbox = []
+        for r in due:
+            missed = plan[r.id][1]
+            if missed and self.catch_up == "skip":
+                self.skipped += 1  # пропущенное (например, пока сервис лежал) не досылаем
+                continue
+            text = f"⏰ Напоминание: {r.text}"
+            if missed:
+                text += f" (пропущено: {missed})"
+            outbox.append((r, text))
+
+        # сеть — вне транзакции; аренда продлевается, пока партия не ушла целиком
+        renew = asyncio.create_task(self._renew([r.id for r, _ in outbox]))
+        try:
+            results = await self.sender.send_many(
+                [(r.chat_id, text, self._attempts.get(r.id, 0) + 1) for r, text in outbox]
+            )
+        finally:
+            renew.cancel()
+            await asyncio.gather(renew, return_exceptions=True)
+
+        retry: dict[int, datetime] = {}
+        disable: set[int] = set()
+        retry_at = utcnow()
+        for (r, _), res in zip(outbox, results):
+            if res.status == delivery.SENT:
+                self.fired += 1
+                self.coalesced += plan[r.id][1]
+                lag = (retry_at - r.next_run).total_seconds()
+                self.lag_seconds += lag
+                self.lag_max = max(self.lag_max, lag)
+            elif res.status == delivery.RETRY or (
+                res.status == delivery.ERROR and self._attempts.get(r.id, 0) + 1 < self.max_attempts
+            ):
+                # лимит Telegram или сбой: аренда продлевается до повтора, другие воркеры строку не трогают
+                if res.status == delivery.ERROR:
+                    self._attempts[r.id] = self._attempts.get(r.id, 0) + 1
+                self.retried += 1
+                retry[r.id] = retry_at + timedelta(seconds=res.delay)
+                continue
+            else:
+                # попытки кончились (повторяющееся пропускает этот раз) или чат недоступен
+                self.failed += 1
+                if res.status == delivery.DROP:
+                    log.info("Reminder %s disabled: %s", r.id, res.error)
+                    disable.add(r.id)
+            self._attempts.pop(r.id, None)
+
+        advance = {rid: nxt for rid, (nxt, _) in plan.items() if nxt is not None and rid not in retry and rid not in disable}
+        disable |= {rid for rid, (nxt, _) in plan.items() if nxt is None and rid not in retry}
+        await self._apply(advance, disable, retry)
+        for rid in plan.keys() - retry.keys():
+            self._claimed.pop(rid, None)
+        for rid, at in retry.items():
+            self._push(rid, at)
+        for rid, nxt in advance.items():
+            if self._horizon is None or nxt < self._horizon:
+                self._push(rid, nxt)
+        return len(due) >= self.batch
+
+    async def _apply(self, advance: dict[int, datetime], disable: set[int], retry: dict[int, datetime]) -> None:
+        """
+        Итог партии — одним UPDATE: новый next_run (CASE по id), выключение, продление
+        аренды для повторов; остальным аренда снимается. Только свои строки: если аренда
+        истекла и строку взял другой воркер, его запись главнее.
+        """
+        ids = set(advance) | disable | set(retry)
+        if not ids:
+            return
+        t = Reminder.__table__
+        values: dict[str, Any] = {
+            "locked_until": case(retry, value=t.c.id, else_=None) if retry else None,
+            "locked_by": case((t.c.id.in_(retry), t.c.locked_by), else_=None) if retry else None,
+        }
+        if advance:
+            values["next_run"] = case(advance, value=t.c.id, else_=t.c.next_run)
+        if disable:
+            values["is_active"] = case((t.c.id.in_(disable), False), else_=t.c.is_active)
+        async with get_session() as session:
+            await session.execute(update(t).where(t.c.id.in_(ids), t.c.locked_by == self.worker_id).values(values))
             await session.commit()
 
-async def reminders_worker(bot: Bot, stop_event: asyncio.Event):
-    """Фоновая задача: раз в N секунд проверяет и рассылает напоминания."""
-    while not stop_event.is_set():
-        await _process_due_reminders(bot)
+    # --- цикл ---
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        async def _stop() -> None:
+            await stop_event.wait()
+            self._wake.set()
+
+        stopper = asyncio.create_task(_stop())
         try:
-            await asyncio.wait_for(stop_event.wait(), timeout=CHECK_INTERVAL_SECONDS)
-        except asyncio.TimeoutError:
-            pass  # просто продолжаем цикл
+            while not stop_event.is_set():
+                self._wake.clear()
+                try:
+                    now = utcnow()
+                    if self._horizon is None or now >= self._horizon:
+                        await self._load(now)
+                    popped = self._pop_due(now)
+                    if popped or self._more:
+                        # heap подсказывает, когда; что именно отправлять — решает аренда в БД
+                        self._more = await self._fire(now, popped)
+                        continue
+                except Exception:
+                    self.errors += 1
+                    log.exception("Reminder scheduler failed; retry in %ss", REMINDER_RETRY_SECONDS)
+                    self._horizon = None  # перечитать окно: в памяти могло остаться неотправленное
+                    timeout = REMINDER_RETRY_SECONDS
+                else:
+                    deadline = min(self._heap[0][0], self._horizon) if self._heap else self._horizon
+                    timeout = (deadline - utcnow()).total_seconds()
+                if timeout > 0:
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                self.wakeups += 1
+        finally:
+            stopper.cancel()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "worker": self.worker_id,
+            "pending": len(self._due),
+            "horizon": self._horizon.isoformat() if self._horizon else None,
+            "loads": self.loads,
+            "fire_batches": self.fire_batches,
+            "fired": self.fired,
+            "failed": self.failed,
+            "retried": self.retried,
+            "coalesced": self.coalesced,
+            "skipped": self.skipped,
+            "contended": self.contended,
+            "renewals": self.renewals,
+            "notifications": self.notifications,
+            "wakeups": self.wakeups,
+            "errors": self.errors,
+            "avg_lag_ms": round(self.lag_seconds / self.fired * 1000, 1) if self.fired else None,
+            "max_lag_ms": round(self.lag_max * 1000, 1),
+            "delivery": self.sender.stats(),
+        }
+
+
+scheduler: ReminderScheduler | None = None
+
+
+async def reminders_worker(bot: Bot, stop_event: asyncio.Event):
+    """Фоновая задача: рассылает напоминания по мере наступления сроков."""
+    global scheduler
+    scheduler = ReminderScheduler(
+        bot,
+        window=REMINDER_WINDOW_SECONDS,
+        limit=REMINDER_WINDOW_LIMIT,
+        batch=REMINDER_BATCH,
+        max_attempts=REMINDER_MAX_ATTEMPTS,
+        lease=REMINDER_LEASE_SECONDS,
+        catch_up=REMINDER_CATCH_UP,
+    )
+    reminders.subscribe(scheduler.notify)
+    reminders.start_listener()
+    try:
+        await scheduler.run(stop_event)
+    finally:
+        reminders.unsubscribe(scheduler.notify)
+        await reminders.listener.stop()
+
+
+def stats() -> dict[str, Any] | None:
+    return scheduler.stats() if scheduler is not None else None
@@ -8,6 +8,7 @@ from aiogram.client.default import DefaultBotProperties
 # Импорты роутеров
 from app.bot.handlers.start import router as start_router
 from app.bot.handlers.help import router as help_router
+from app.bot.handlers.timezone import router as timezone_router
 from app.bot.handlers.menu import router as menu_router
 from app.bot.handlers.reminders import router as reminders_router
 from app.bot.handlers.sleep import router as sleep_router
@@ -17,14 +18,19 @@ from app.bot.handlers.stats import router as stats_router
 from app.bot.handlers.children import router as children_router  # <-- добавлено
 from app.bot.handlers.family import router as family_router
 from app.bot.handlers.calendar import router as calendar_router
+from app.bot.middlewares.context import RequestContextMiddleware
 
 def build_dispatcher() -> Dispatcher:
     from aiogram.fsm.storage.memory import MemoryStorage
     dp = Dispatcher(storage=MemoryStorage())
 
+    # Сессия БД + пользователь/настройки/активный ребёнок для хендлеров
+    dp.update.outer_middleware(RequestContextMiddleware())
+
     # Порядок: start/help → reminders/menu → доменные разделы → children → family/calendar
     dp.include_router(start_router)
     dp.include_router(help_router)
+    dp.include_router(timezone_router)
     dp.include_router(reminders_router)
     dp.include_router(menu_router)
     dp.include_router(sleep_router)
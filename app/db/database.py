@@ -3,8 +3,11 @@ from __future__ import annotations
 
 import os
 import logging
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Iterator
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -47,6 +50,48 @@ AsyncSessionLocal: async_sessionmaker[AsyncSession] = async_sessionmaker(
 Base = declarative_base()
 
 
+# --- Счётчик SQL-запросов (для метрик «запросов на апдейт») ---------------
+
+_query_counter: ContextVar[list[int] | None] = ContextVar("db_query_counter", default=None)
+
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany) -> None:
+    box = _query_counter.get()
+    if box is not None:
+        box[0] += 1
+
+
+@contextmanager
+def count_queries() -> Iterator[list[int]]:
+    """
+    Считает запросы к БД, выполненные в текущем контексте:
+        with count_queries() as counter:
+            ...
+        counter[0]  # число запросов
+    """
+    box = [0]
+    token = _query_counter.set(box)
+    try:
+        yield box
+    finally:
+        _query_counter.reset(token)
+
+
+# --- INSERT ... ON CONFLICT для текущего диалекта -----------------------
+
+def dialect_insert(table):
+    """
+    insert() с поддержкой on_conflict_do_nothing/on_conflict_do_update
+    для текущего движка (PostgreSQL или SQLite).
+    """
+    if async_engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
 # --- Сессия как ASYNC CONTEXT MANAGER ------------------------------------
 
 @asynccontextmanager
@@ -76,12 +121,10 @@ async def get_session() -> AsyncSession:
 
 async def init_db() -> None:
     """
-    Создаёт таблицы по Base.metadata (idempotent).
+    Создаёт недостающие таблицы и применяет миграции схемы (idempotent).
     Вызовите на старте приложения.
     """
     # Локальный импорт, чтобы избежать циклических зависимостей:
-    from app.db import models  # noqa: F401
+    from app.db.migrations import migrate
 
-    async with async_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    log.info("DB schema is ready.")
+    await migrate()
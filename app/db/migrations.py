@@ -0,0 +1,323 @@
+# app/db/migrations.py
+"""
+Версионные миграции схемы.
+
+create_all создаёт только отсутствующие таблицы: новые индексы и колонки
+в уже существующую БД он не добавит. Такие изменения оформляются миграциями
+(версия + шаги), применённые версии хранятся в таблице schema_migrations.
+
+Новая БД создаётся по моделям и сразу помечается последней версией,
+поэтому модели всегда должны описывать итоговую схему (индексы — в __table_args__).
+
+Запускаются на старте (app/web/main.py, init_db) или вручную:
+    python -m app.db.migrations            # применить
+    python -m app.db.migrations --status   # версии
+    python -m app.db.migrations --explain  # горячие запросы идут по индексам?
+
+Планы горячих запросов на новой и на мигрированной исходной схеме проверяет
+tests/test_migrations.py; --explain — то же самое на рабочей БД (например, PostgreSQL).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    inspect,
+    insert,
+    select,
+    text,
+)
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.db.database import async_engine
+
+log = logging.getLogger(__name__)
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _meta,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# pg_advisory_lock: при старте нескольких воркеров мигрирует только один
+_LOCK_KEY = 7_301_152_001
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    up: Callable[[AsyncConnection], Awaitable[None]]
+    # False — шаги выполняются вне транзакции (нужно для CREATE INDEX CONCURRENTLY)
+    transactional: bool = True
+
+
+# --- шаги ---
+
+def _is_pg(conn: AsyncConnection) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+async def _drop_invalid_index(conn: AsyncConnection, name: str) -> None:
+    # прерванный CREATE INDEX CONCURRENTLY оставляет INVALID-индекс, а IF NOT EXISTS его пропустит
+    res = await conn.execute(
+        text(
+            "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ),
+        {"name": name},
+    )
+    if res.first() is not None:
+        log.warning("Dropping invalid index %s left by an interrupted build", name)
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+async def create_index(
+    conn: AsyncConnection,
+    name: str,
+    table: str,
+    columns: str,
+    *,
+    where: str | None = None,
+    unique: bool = False,
+) -> None:
+    """CREATE INDEX IF NOT EXISTS; на PostgreSQL — CONCURRENTLY (без блокировки записи)."""
+    concurrently = ""
+    if _is_pg(conn):
+        await _drop_invalid_index(conn, name)
+        concurrently = " CONCURRENTLY"
+    sql = f"CREATE {'UNIQUE ' if unique else ''}INDEX{concurrently} IF NOT EXISTS {name} ON {table} ({columns})"
+    if where:
+        sql += f" WHERE {where}"
+    await conn.execute(text(sql))
+
+
+async def drop_index(conn: AsyncConnection, name: str) -> None:
+    concurrently = " CONCURRENTLY" if _is_pg(conn) else ""
+    await conn.execute(text(f"DROP INDEX{concurrently} IF EXISTS {name}"))
+
+
+async def add_column(conn: AsyncConnection, table: str, column: str, ddl: str) -> None:
+    """ALTER TABLE ... ADD COLUMN, если колонки ещё нет (SQLite не знает ADD COLUMN IF NOT EXISTS)."""
+    columns = await conn.run_sync(lambda c: {col["name"] for col in inspect(c).get_columns(table)})
+    if column not in columns:
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+# --- миграции ---
+
+async def _m001_hot_path_indexes(conn: AsyncConnection) -> None:
+    await create_index(conn, "ix_sleep_records_baby_start", "sleep_records", "baby_id, sleep_start")
+    await create_index(
+        conn, "ix_sleep_records_open", "sleep_records", "baby_id, sleep_start", where="sleep_end IS NULL"
+    )
+    await create_index(conn, "ix_feeding_records_baby_fed_at", "feeding_records", "baby_id, fed_at")
+    await create_index(conn, "ix_health_records_baby_created", "health_records", "baby_id, created_at")
+    await create_index(conn, "ix_care_events_family_occurred", "care_events", "family_id, occurred_at")
+    await create_index(conn, "ix_reminders_active_next_run", "reminders", "is_active, next_run")
+    # одиночные индексы по baby_id/family_id покрываются префиксом составных
+    for name in (
+        "ix_sleep_records_baby_id",
+        "ix_feeding_records_baby_id",
+        "ix_health_records_baby_id",
+        "ix_care_events_family_id",
+    ):
+        await drop_index(conn, name)
+
+
+async def _m002_daily_rollups_backfill(conn: AsyncConnection) -> None:
+    # таблицу создал create_all; заполняем её по истории.
+    # Колонки user_settings.timezone ещё нет (миграция 3) — все в поясе по умолчанию.
+    from app.services.rollups import rebuild
+    from app.utils.tz import DEFAULT_TIMEZONE
+
+    n = await rebuild(conn, tz=DEFAULT_TIMEZONE)
+    log.info("daily_rollups backfilled: %s rows", n)
+
+
+async def _m003_user_timezone(conn: AsyncConnection) -> None:
+    await add_column(conn, "user_settings", "timezone", "VARCHAR(64)")
+
+
+async def _m004_reminder_leases(conn: AsyncConnection) -> None:
+    await add_column(conn, "reminders", "locked_until", "TIMESTAMP" if _is_pg(conn) else "DATETIME")
+    await add_column(conn, "reminders", "locked_by", "VARCHAR(64)")
+
+
+async def _m005_reminder_rules(conn: AsyncConnection) -> None:
+    # таблицу (с индексом) создаёт create_all; шаг идемпотентен на случай, если её создали без индекса
+    await create_index(
+        conn, "ix_reminder_rules_baby_kind", "reminder_rules", "baby_id, kind, user_id", unique=True
+    )
+
+
+async def _m006_drop_open_sleep_index(conn: AsyncConnection) -> None:
+    # частичный (baby_id, sleep_start) WHERE sleep_end IS NULL повторял колонки
+    # ix_sleep_records_baby_start: планировщик брал полный индекс (ORDER BY sleep_start
+    # без сортировки), а частичный только замедлял запись
+    await drop_index(conn, "ix_sleep_records_open")
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "hot path composite/partial indexes", _m001_hot_path_indexes, transactional=False),
+    Migration(2, "daily_rollups backfill", _m002_daily_rollups_backfill),
+    Migration(3, "user_settings.timezone", _m003_user_timezone),
+    Migration(4, "reminders.locked_until/locked_by", _m004_reminder_leases),
+    Migration(5, "reminder_rules", _m005_reminder_rules, transactional=False),
+    Migration(6, "drop redundant ix_sleep_records_open", _m006_drop_open_sleep_index, transactional=False),
+]
+
+
+# --- применение ---
+
+async def _applied_versions(conn: AsyncConnection) -> set[int]:
+    res = await conn.execute(select(schema_migrations.c.version))
+    return set(res.scalars())
+
+
+async def _record(conn: AsyncConnection, m: Migration) -> None:
+    await conn.execute(
+        insert(schema_migrations).values(version=m.version, name=m.name, applied_at=datetime.utcnow())
+    )
+
+
+async def _apply(engine: AsyncEngine, m: Migration) -> None:
+    log.info("Applying migration %s: %s", m.version, m.name)
+    if m.transactional:
+        async with engine.begin() as conn:
+            await m.up(conn)
+            await _record(conn, m)
+        return
+    # шаги должны быть идемпотентны (IF NOT EXISTS): при сбое миграция просто повторится
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await m.up(conn)
+        await _record(conn, m)
+
+
+async def migrate(engine: AsyncEngine = async_engine) -> list[int]:
+    """Создаёт недостающие таблицы и применяет новые миграции. Возвращает применённые версии."""
+    from app.db.models import Base  # локально: models не должен зависеть от миграций
+
+    is_pg = engine.dialect.name == "postgresql"
+    async with engine.connect() as lock_conn:
+        if is_pg:
+            await lock_conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": _LOCK_KEY})
+            await lock_conn.commit()
+        try:
+            async with engine.begin() as conn:
+                fresh = not await conn.run_sync(lambda c: inspect(c).has_table("users"))
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(_meta.create_all)
+                done = await _applied_versions(conn)
+                if fresh:
+                    # схема только что создана по моделям — она уже последней версии
+                    for m in MIGRATIONS:
+                        await _record(conn, m)
+                    log.info("DB schema created at version %s.", MIGRATIONS[-1].version)
+                    return []
+
+            applied = []
+            for m in MIGRATIONS:
+                if m.version not in done:
+                    await _apply(engine, m)
+                    applied.append(m.version)
+            log.info("DB schema is ready (applied migrations: %s).", applied or "none")
+            return applied
+        finally:
+            if is_pg:
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _LOCK_KEY})
+                await lock_conn.commit()
+
+
+# --- проверка планов запросов ---
+
+def _hot_queries() -> list[tuple[str, str, object]]:
+    """Запросы берутся у кода, который их выполняет, — проверяется ровно то, что идёт в БД."""
+    from app.bot.handlers.feeding import last_feedings_query
+    from app.bot.handlers.health import last_health_query
+    from app.bot.handlers.sleep import open_sleep_query
+    from app.bot.reminders_worker import claimable_query
+    from app.services.reminder_rules import FEED, rules_query
+    from app.services.sleep_analytics import intervals_query
+
+    day = datetime(2025, 1, 1)
+    return [
+        ("open sleep", "ix_sleep_records_baby_start", open_sleep_query(1)),
+        ("sleep by range", "ix_sleep_records_baby_start", intervals_query(1, day, day)),
+        ("last feedings", "ix_feeding_records_baby_fed_at", last_feedings_query(1)),
+        ("last health records", "ix_health_records_baby_created", last_health_query(1)),
+        ("due reminders", "ix_reminders_active_next_run", claimable_query(day, 500)),
+        ("reminder rules on write", "ix_reminder_rules_baby_kind", rules_query([1], [FEED])),
+    ]
+
+
+async def explain(engine: AsyncEngine = async_engine) -> bool:
+    """EXPLAIN горячих запросов: каждый должен использовать свой индекс."""
+    ok = True
+    async with engine.connect() as conn:
+        if _is_pg(conn):
+            prefix = "EXPLAIN"
+            # на почти пустой таблице seq scan дешевле — проверяем, что индекс вообще применим
+            await conn.execute(text("SET enable_seqscan = off"))
+        else:
+            prefix = "EXPLAIN QUERY PLAN"
+        for name, index, stmt in _hot_queries():
+            sql = stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+            rows = (await conn.execute(text(f"{prefix} {sql}"))).all()
+            plan = "\n".join(str(r[-1]) for r in rows)
+            used = index in plan
+            ok = ok and used
+            print(f"[{'ok' if used else 'FAIL'}] {name}: {index}")
+            if not used:
+                print("    " + plan.replace("\n", "\n    "))
+    return ok
+
+
+async def _status(engine: AsyncEngine = async_engine) -> None:
+    async with engine.connect() as conn:
+        has_table = await conn.run_sync(lambda c: inspect(c).has_table(schema_migrations.name))
+        done = await _applied_versions(conn) if has_table else set()
+    for m in MIGRATIONS:
+        print(f"{'applied' if m.version in done else 'pending':>8}  {m.version:>4}  {m.name}")
+
+
+async def _main(args: argparse.Namespace) -> int:
+    try:
+        if args.status:
+            await _status()
+            return 0
+        await migrate()
+        if args.explain:
+            return 0 if await explain() else 1
+        return 0
+    finally:
+        await async_engine.dispose()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.db.migrations", description="Миграции схемы БД")
+    parser.add_argument("--status", action="store_true", help="показать применённые и ожидающие миграции")
+    parser.add_argument("--explain", action="store_true", help="проверить планы горячих запросов")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    return asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
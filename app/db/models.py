@@ -11,6 +11,7 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Float,
+    Index,
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -74,14 +75,21 @@ class UserSettings(Base):
         ForeignKey("babies.id", ondelete="SET NULL"),
         nullable=True,
     )
+    # IANA-имя часового пояса (None → DEFAULT_TIMEZONE); по нему считаются «сутки» в статистике
+    timezone: Mapped[str | None] = mapped_column(String(64), nullable=True)
 
 
 # --------- Сон ---------
 class SleepRecord(Base):
     __tablename__ = "sleep_records"
+    # Индексы добавляются в существующие БД миграцией 1 (app/db/migrations.py)
+    __table_args__ = (
+        # он же — незакрытый сон («Проснулся»): это самая новая запись ребёнка, первая с конца
+        Index("ix_sleep_records_baby_start", "baby_id", "sleep_start"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    baby_id: Mapped[int] = mapped_column(ForeignKey("babies.id", ondelete="CASCADE"), index=True)
+    baby_id: Mapped[int] = mapped_column(ForeignKey("babies.id", ondelete="CASCADE"))
     sleep_start: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
     sleep_end: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     duration_minutes: Mapped[int | None] = mapped_column(Integer, nullable=True)
@@ -94,9 +102,12 @@ class SleepRecord(Base):
 # --------- Кормление ---------
 class FeedingRecord(Base):
     __tablename__ = "feeding_records"
+    __table_args__ = (
+        Index("ix_feeding_records_baby_fed_at", "baby_id", "fed_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    baby_id: Mapped[int] = mapped_column(ForeignKey("babies.id", ondelete="CASCADE"), index=True)
+    baby_id: Mapped[int] = mapped_column(ForeignKey("babies.id", ondelete="CASCADE"))
     fed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
     # 'breast' | 'formula' | 'water' | 'solid'
     feeding_type: Mapped[str] = mapped_column(String(20))
@@ -110,9 +121,12 @@ class FeedingRecord(Base):
 # --------- Здоровье ---------
 class HealthRecord(Base):
     __tablename__ = "health_records"
+    __table_args__ = (
+        Index("ix_health_records_baby_created", "baby_id", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    baby_id: Mapped[int] = mapped_column(ForeignKey("babies.id", ondelete="CASCADE"), index=True)
+    baby_id: Mapped[int] = mapped_column(ForeignKey("babies.id", ondelete="CASCADE"))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
     # Тип: 'temperature' | 'medicine' | 'doctor_visit' | 'growth'
@@ -138,6 +152,9 @@ class HealthRecord(Base):
 # --------- Напоминания ---------
 class Reminder(Base):
     __tablename__ = "reminders"
+    __table_args__ = (
+        Index("ix_reminders_active_next_run", "is_active", "next_run"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
@@ -153,6 +170,39 @@ class Reminder(Base):
 
     is_active: Mapped[bool] = mapped_column(default=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Аренда: воркер, взявший напоминание в отправку, и до какого времени (потом его может взять другой)
+    locked_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    locked_by: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+
+# --------- Правила напоминаний ---------
+class ReminderRule(Base):
+    """
+    Правило пользователя «напомнить через N минут после события» (кнопки remind:* в настройках).
+    У правила одно своё напоминание: запись сна/кормления переносит его next_run
+    (app/services/reminder_rules.py), новые напоминания не создаются.
+    """
+    __tablename__ = "reminder_rules"
+    __table_args__ = (
+        # правила ребёнка при записи сна/кормления; заодно одно правило вида на пользователя
+        Index("ix_reminder_rules_baby_kind", "baby_id", "kind", "user_id", unique=True),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    baby_id: Mapped[int] = mapped_column(ForeignKey("babies.id", ondelete="CASCADE"))
+
+    # 'feed' | 'sleep' | 'diaper' | 'walk' | 'bath'
+    kind: Mapped[str] = mapped_column(String(20))
+    # через сколько минут после события (для повторяющихся — интервал)
+    after_minutes: Mapped[int] = mapped_column(Integer)
+    is_enabled: Mapped[bool] = mapped_column(default=True)
+
+    reminder_id: Mapped[int | None] = mapped_column(ForeignKey("reminders.id", ondelete="SET NULL"), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    reminder: Mapped["Reminder | None"] = relationship()
 # --- Семья, участники, инвайты, журнал событий (календарь) ---
 
 from uuid import uuid4
@@ -214,9 +264,12 @@ class CareEvent(Base):
     details: произвольный текст (например: 'formula 120 ml' или 'сон 45 мин')
     """
     __tablename__ = "care_events"
+    __table_args__ = (
+        Index("ix_care_events_family_occurred", "family_id", "occurred_at"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
 
-    family_id: Mapped[int | None] = mapped_column(ForeignKey("families.id", ondelete="SET NULL"), index=True, nullable=True)
+    family_id: Mapped[int | None] = mapped_column(ForeignKey("families.id", ondelete="SET NULL"), nullable=True)
     baby_id: Mapped[int | None] = mapped_column(ForeignKey("babies.id", ondelete="SET NULL"), index=True, nullable=True)
     actor_user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id", ondelete="SET NULL"), index=True, nullable=True)
 
@@ -227,3 +280,32 @@ class CareEvent(Base):
     # связи (по желанию)
     # family: relationship("Family")
     # baby: relationship("Baby")
+
+
+class ProcessedUpdate(Base):
+    """
+    Недавно принятые update_id из вебхука — общая память о дублях
+    для нескольких воркеров/инстансов (Telegram повторяет доставку при медленном ответе).
+    """
+    __tablename__ = "processed_updates"
+
+    update_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    received_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True, nullable=False)
+
+
+class DailyRollup(Base):
+    """
+    Суточные итоги по ребёнку: обновляются в той же транзакции, что и запись
+    сна/кормления (CareUnitOfWork), поэтому статистика за N дней читает не больше N строк.
+    Пересчёт из сырых записей: python -m app.services.rollups
+    """
+    __tablename__ = "daily_rollups"
+
+    baby_id: Mapped[int] = mapped_column(ForeignKey("babies.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+
+    sleep_minutes: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    sleep_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    feed_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    ml: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    g: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
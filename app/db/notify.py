@@ -0,0 +1,79 @@
+# app/db/notify.py
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Callable
+
+from sqlalchemy import text
+
+from app.db.database import async_engine
+
+log = logging.getLogger(__name__)
+
+
+def pg_notify_available() -> bool:
+    return async_engine.dialect.name == "postgresql"
+
+
+async def pg_notify(channel: str, payload: str) -> None:
+    """Отправить NOTIFY в канал (no-op вне PostgreSQL)."""
+    if not pg_notify_available():
+        return
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+        await conn.commit()
+
+
+class PgListener:
+    """
+    LISTEN на канал PostgreSQL через отдельное asyncpg-соединение.
+    При обрыве переподключается; callback вызывается с payload уведомления.
+    """
+
+    def __init__(self, channel: str, callback: Callable[[str], None]) -> None:
+        self._channel = channel
+        self._callback = callback
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None and pg_notify_available():
+            self._task = asyncio.create_task(self._run(), name=f"pg-listen-{self._channel}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _on_notify(self, conn, pid, channel, payload) -> None:
+        try:
+            self._callback(payload)
+        except Exception:  # noqa: BLE001
+            log.exception("LISTEN %s callback failed", channel)
+
+    async def _run(self) -> None:
+        import asyncpg
+
+        dsn = async_engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        delay = 1
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                await conn.add_listener(self._channel, self._on_notify)
+                log.info("Listening on PostgreSQL channel %s", self._channel)
+                delay = 1
+                # держим соединение, периодически проверяя, что оно живо
+                while True:
+                    await asyncio.sleep(30)
+                    await conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001
+                log.warning("LISTEN %s failed: %s; reconnect in %ss", self._channel, e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
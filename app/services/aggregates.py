@@ -0,0 +1,197 @@
+# app/services/aggregates.py
+"""
+Агрегаты по дням за один проход: все метрики дня считаются условными суммами
+(SUM(CASE ...)) в одном GROUP BY, вместо отдельного запроса на каждую метрику.
+
+Дни — локальные сутки пользователя (tz), сдвиг делается в SQL:
+- PostgreSQL: col AT TIME ZONE 'UTC' AT TIME ZONE tz;
+- SQLite: date(col, '+N minutes'), где N выбирается CASE по отрезкам смещения
+  пояса (переходы DST на запрошенном интервале считает zoneinfo).
+Фильтр по времени — по границам локальных суток в UTC, поэтому составные
+индексы (baby_id, время) продолжают работать.
+Результат приводится к типу Date — на выходе всегда datetime.date.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable
+
+from sqlalchemy import Date, Float, case, func, literal_column, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.db.database import async_engine
+from app.db.models import FeedingRecord, HealthRecord, SleepRecord
+from app.utils.tz import day_start_utc, offset_segments, zone
+
+DayKey = tuple[int, date]  # (baby_id, локальный день)
+
+
+def _minutes(offset: int) -> str:
+    return f"{offset:+d} minutes"
+
+
+def day_bucket(
+    col: Any, tz: str | None = None, start: datetime | None = None, end: datetime | None = None
+) -> ColumnElement[date]:
+    """
+    Локальный день метки времени (naive UTC) в поясе tz.
+    start/end (naive UTC) — интервал данных; для SQLite по нему ищутся переходы DST.
+    """
+    name = zone(tz).key
+    if async_engine.dialect.name == "postgresql":
+        return type_coerce(func.date(func.timezone(name, func.timezone("UTC", col))), Date)
+
+    now = datetime.utcnow()
+    segments = offset_segments(name, start or now, end or now)
+    if len(segments) == 1:
+        offset = segments[0][1]
+        expr = func.date(col, _minutes(offset)) if offset else func.date(col)
+    else:
+        modifier = case(
+            *((col < border, _minutes(offset)) for border, offset in segments[:-1]),
+            else_=_minutes(segments[-1][1]),
+        )
+        expr = func.date(col, modifier)
+    return type_coerce(expr, Date)
+
+
+def day_range(end: date, days: int) -> list[date]:
+    """Последние `days` дней по `end` включительно, по возрастанию."""
+    return [end - timedelta(days=i) for i in range(days - 1, -1, -1)]
+
+
+def sum_if(cond: Any, value: Any) -> ColumnElement[int]:
+    return func.coalesce(func.sum(case((cond, value), else_=0)), 0)
+
+
+def count_if(cond: Any) -> ColumnElement[int]:
+    return sum_if(cond, 1)
+
+
+def avg_if(cond: Any, value: Any) -> ColumnElement[float | None]:
+    # AVG игнорирует NULL: строки не по условию в среднее не попадают
+    return type_coerce(func.avg(case((cond, value), else_=None)), Float)
+
+
+async def _by_day(
+    session: AsyncSession | AsyncConnection,
+    model: Any,
+    time_col: Any,
+    metrics: dict[str, Any],
+    *,
+    baby_id: int | Iterable[int] | None,
+    tz: str | None,
+    start: date | None,
+    end: date | None,
+    where: tuple[Any, ...] = (),
+) -> dict[DayKey, dict[str, Any]]:
+    cond = list(where)
+    if baby_id is not None:
+        ids = [baby_id] if isinstance(baby_id, int) else list(baby_id)
+        cond.append(model.baby_id == ids[0] if len(ids) == 1 else model.baby_id.in_(ids))
+    # границы локальных суток в UTC — фильтр остаётся индексным
+    lo = day_start_utc(start, tz) if start is not None else None
+    hi = day_start_utc(end + timedelta(days=1), tz) if end is not None else None
+    if lo is not None:
+        cond.append(time_col >= lo)
+    if hi is not None:
+        cond.append(time_col < hi)
+    if (lo is None or hi is None) and async_engine.dialect.name != "postgresql":
+        # для CASE по смещениям нужен интервал — берём его из данных
+        lo_data, hi_data = (await session.execute(select(func.min(time_col), func.max(time_col)).where(*cond))).one()
+        if lo_data is None:
+            return {}
+        lo, hi = lo or lo_data, hi or hi_data
+
+    day = day_bucket(time_col, tz, lo, hi).label("bucket_day")
+    q = (
+        select(model.baby_id, day, *(expr.label(name) for name, expr in metrics.items()))
+        .where(*cond)
+        # по алиасу: выражение с bind-параметрами PostgreSQL не сопоставит с SELECT
+        .group_by(model.baby_id, literal_column("bucket_day"))
+    )
+    out: dict[DayKey, dict[str, Any]] = {}
+    for row in (await session.execute(q)).all():
+        out[(row[0], row[1])] = dict(zip(metrics, row[2:]))
+    return out
+
+
+# --- кормление ---
+
+def _feeding_metrics() -> dict[str, Any]:
+    f = FeedingRecord
+    return {
+        "feed_count": func.count(),
+        "ml": func.coalesce(func.sum(f.amount_ml), 0),
+        "g": func.coalesce(func.sum(f.amount_g), 0),
+        "breast": count_if(f.feeding_type == "breast"),
+        "formula": count_if(f.feeding_type == "formula"),
+        "water": count_if(f.feeding_type == "water"),
+        "solid": count_if(f.feeding_type == "solid"),
+        "formula_ml": sum_if(f.feeding_type == "formula", func.coalesce(f.amount_ml, 0)),
+        "water_ml": sum_if(f.feeding_type == "water", func.coalesce(f.amount_ml, 0)),
+    }
+
+
+async def feeding_by_day(
+    session: AsyncSession | AsyncConnection,
+    *,
+    baby_id: int | Iterable[int] | None = None,
+    tz: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+) -> dict[DayKey, dict[str, int]]:
+    """Кормления по (ребёнок, день): число, мл, г и разбивка по типам — одним запросом."""
+    rows = await _by_day(
+        session, FeedingRecord, FeedingRecord.fed_at, _feeding_metrics(),
+        baby_id=baby_id, tz=tz, start=start, end=end,
+    )
+    return {k: {m: int(v or 0) for m, v in r.items()} for k, r in rows.items()}
+
+
+# --- сон ---
+
+async def sleep_by_day(
+    session: AsyncSession | AsyncConnection,
+    *,
+    baby_id: int | Iterable[int] | None = None,
+    tz: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+) -> dict[DayKey, dict[str, int]]:
+    """Завершённые сны по дню засыпания: сумма минут и число снов."""
+    s = SleepRecord
+    metrics = {
+        "sleep_minutes": func.coalesce(func.sum(s.duration_minutes), 0),
+        "sleep_count": func.count(),
+    }
+    rows = await _by_day(
+        session, s, s.sleep_start, metrics,
+        baby_id=baby_id, tz=tz, start=start, end=end, where=(s.duration_minutes.is_not(None),),
+    )
+    return {k: {m: int(v or 0) for m, v in r.items()} for k, r in rows.items()}
+
+
+# --- здоровье ---
+
+async def health_by_day(
+    session: AsyncSession | AsyncConnection,
+    *,
+    baby_id: int | Iterable[int] | None = None,
+    tz: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+) -> dict[DayKey, dict[str, Any]]:
+    """Записи здоровья по дням: средняя/максимальная температура и счётчики по типам."""
+    h = HealthRecord
+    is_temp = h.record_type == "temperature"
+    metrics = {
+        "temp_avg": avg_if(is_temp, h.temperature_c),
+        "temp_max": type_coerce(func.max(case((is_temp, h.temperature_c), else_=None)), Float),
+        "temp_count": count_if(is_temp),
+        "medicine_count": count_if(h.record_type == "medicine"),
+        "visit_count": count_if(h.record_type == "doctor_visit"),
+        "growth_count": count_if(h.record_type == "growth"),
+    }
+    return await _by_day(session, h, h.created_at, metrics, baby_id=baby_id, tz=tz, start=start, end=end)
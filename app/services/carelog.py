@@ -1,15 +1,24 @@
 # app/services/carelog.py
 from __future__ import annotations
 from datetime import datetime, timezone
+from typing import Any
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models import CareEvent, FamilyMember, UserSettings
+from app.services import identity, reminder_rules, reminders, rollups
+
+_MISSING = object()
 
 async def get_user_family_id(session: AsyncSession, user_id: int) -> int | None:
+    cached = identity.families.get(user_id, _MISSING)
+    if cached is not _MISSING:
+        return cached
     q = select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
     res = await session.execute(q)
     row = res.first()
-    return row[0] if row else None
+    family_id = row[0] if row else None
+    identity.families.set(user_id, family_id)
+    return family_id
 
 async def get_active_baby_id(session: AsyncSession, user_id: int) -> int | None:
     q = select(UserSettings.active_baby_id).where(UserSettings.user_id == user_id)
@@ -17,7 +26,7 @@ async def get_active_baby_id(session: AsyncSession, user_id: int) -> int | None:
     row = res.first()
     return row[0] if row else None
 
-async def log_event(
+async def stage_event(
     session: AsyncSession,
     *,
     actor_user_id: int,
@@ -26,6 +35,7 @@ async def log_event(
     occurred_at: datetime | None = None,
     baby_id: int | None = None,
 ) -> CareEvent:
+    """Добавляет CareEvent в сессию без commit (коммитит вызывающий код)."""
     family_id = await get_user_family_id(session, actor_user_id)
     if baby_id is None:
         baby_id = await get_active_baby_id(session, actor_user_id)
@@ -42,5 +52,97 @@ async def log_event(
         details=details,
     )
     session.add(ce)
+    return ce
+
+async def log_event(
+    session: AsyncSession,
+    *,
+    actor_user_id: int,
+    event_type: str,
+    details: str | None = None,
+    occurred_at: datetime | None = None,
+    baby_id: int | None = None,
+) -> CareEvent:
+    """Записать одно событие отдельной транзакцией (для действий без доменной записи)."""
+    ce = await stage_event(
+        session,
+        actor_user_id=actor_user_id,
+        event_type=event_type,
+        details=details,
+        occurred_at=occurred_at,
+        baby_id=baby_id,
+    )
     await session.commit()
     return ce
+
+class CareUnitOfWork:
+    """
+    Доменная запись (сон/кормление/...) и её CareEvent — одной транзакцией, один commit:
+
+        async with CareUnitOfWork(session, actor_user_id=user.id) as uow:
+            uow.add(FeedingRecord(...))
+            await uow.event("feeding", "смесь 120 мл", baby_id=baby.id)
+
+    При исключении внутри блока всё откатывается: запись без события в календаре не останется.
+    Суточные итоги (daily_rollups) обновляются в той же транзакции, там же переносятся
+    напоминания правил ребёнка (reminder_rules); планировщик будится после commit.
+    """
+
+    def __init__(self, session: AsyncSession, *, actor_user_id: int, tz: str | None = None) -> None:
+        self.session = session
+        self.actor_user_id = actor_user_id
+        self.tz = tz  # пояс владельца ребёнка: по нему записи делятся на сутки в daily_rollups
+        self.records: list[Any] = []
+        self.events: list[CareEvent] = []
+        self.rule_events: dict[tuple[int, str], Any] = {}
+        self.deltas: list[tuple[Any, dict[str, int]]] = []
+
+    def add(self, record: Any) -> Any:
+        """Новая или изменённая доменная запись."""
+        self.session.add(record)
+        # вклад в суточные итоги и событие для правил напоминаний — сразу, по состоянию
+        # объекта: запрос в event() (промах кэша семьи) сделает autoflush и сотрёт историю
+        if (d := rollups.delta(record)):
+            self.deltas.append((record, d))
+        self.rule_events.update(reminder_rules.events([record]))
+        self.records.append(record)
+        return record
+
+    async def event(
+        self,
+        event_type: str,
+        details: str | None = None,
+        *,
+        baby_id: int | None = None,
+        occurred_at: datetime | None = None,
+    ) -> CareEvent:
+        ce = await stage_event(
+            self.session,
+            actor_user_id=self.actor_user_id,
+            event_type=event_type,
+            details=details,
+            occurred_at=occurred_at,
+            baby_id=baby_id,
+        )
+        self.events.append(ce)
+        return ce
+
+    async def commit(self) -> None:
+        await rollups.apply(self.session, self.deltas, self.tz)
+        touched = await reminder_rules.stage(self.session, self.rule_events)
+        await self.session.commit()
+        self.records.clear()
+        self.events.clear()
+        self.rule_events.clear()
+        self.deltas.clear()
+        if touched:
+            await reminders.changed(*touched)
+
+    async def __aenter__(self) -> "CareUnitOfWork":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.commit()
+        else:
+            await self.session.rollback()
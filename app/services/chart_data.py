@@ -0,0 +1,74 @@
+# app/services/chart_data.py
+"""
+Данные для графиков: суточные ряды сна и кормлений, точки роста/веса.
+
+Одни и те же ряды рисует бот (matplotlib в пуле, app.utils.charts) и отдаёт
+мини-приложению JSON-ом (app.web.main, /api/charts) — там графики рисует браузер.
+"""
+from __future__ import annotations
+
+import os
+from datetime import date
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import HealthRecord
+from app.services import rollups
+from app.services.aggregates import day_range
+from app.utils.lazy import lazy_import
+from app.utils.tz import local_today, to_local
+
+# numpy грузится при первом запросе, а не при импорте веб-сервиса
+sleep_analytics = lazy_import("app.services.sleep_analytics")
+
+# Сколько последних замеров роста/веса показывать
+GROWTH_POINTS = int(os.getenv("GROWTH_POINTS", "12"))
+
+
+async def feed_by_day(session: AsyncSession, baby_id: int, days: list[date]) -> tuple[list[int], list[int]]:
+    """Суточные итоги из daily_rollups: жидкости (formula + water) в мл, прикорм в г."""
+    rolls = await rollups.daily(session, baby_id, days[0], days[-1])
+    return [rolls[d].ml if d in rolls else 0 for d in days], [rolls[d].g if d in rolls else 0 for d in days]
+
+
+async def growth(session: AsyncSession, baby_id: int, limit: int = GROWTH_POINTS) -> list[Any]:
+    """Последние `limit` замеров (created_at, weight_g, height_cm), от старых к новым."""
+    q = await session.execute(
+        select(HealthRecord.created_at, HealthRecord.weight_g, HealthRecord.height_cm)
+        .where(HealthRecord.baby_id == baby_id, HealthRecord.record_type == "growth")
+        .order_by(HealthRecord.created_at.desc())
+        .limit(limit)
+    )
+    return list(reversed(q.all()))
+
+
+async def summary(
+    session: AsyncSession, baby_id: int, tz: str | None, days: int = 7, today: date | None = None
+) -> dict[str, Any]:
+    """
+    Компактные ряды за `days` локальных дней (по today включительно):
+    сон днём/ночью в минутах, кормления в мл/г, замеры роста. Значения —
+    по индексам `days`, без повторения дат в каждой точке.
+    """
+    today = today or local_today(tz)
+    span = day_range(today, days)
+    sleep = await sleep_analytics.sleep_stats(session, baby_id, tz, days=days, today=today)
+    ml, g = await feed_by_day(session, baby_id, span)
+    points = await growth(session, baby_id)
+    return {
+        "tz": tz,
+        "days": [d.isoformat() for d in span],
+        "sleep": {
+            "day": sleep.day.tolist(),
+            "night": sleep.night.tolist(),
+            "naps": sleep.naps.tolist(),
+        },
+        "feed": {"ml": ml, "g": g},
+        "growth": {
+            "dates": [to_local(r.created_at, tz).date().isoformat() for r in points],
+            "weight_g": [r.weight_g for r in points],
+            "height_cm": [r.height_cm for r in points],
+        },
+    }
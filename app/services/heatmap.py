@@ -0,0 +1,131 @@
+# app/services/heatmap.py
+"""
+Карта режима дня: дни × 96 слотов по 15 минут локального времени.
+
+Сны переводятся в минуты локального времени от начала первого дня, и занятость
+считается разностным массивом: +1 в минуту засыпания, −1 в минуту пробуждения,
+cumsum > 0 — битовая карта «спит» по минутам диапазона. Она сворачивается в
+слоты (минут сна в слоте, 0–15). Пересекающиеся записи при этом не удваиваются.
+Кормления ложатся поверх — числом кормлений в слоте.
+
+Локальное время — по настенным часам: смещение пояса берётся по отрезкам
+offset_segments, так что в дни перехода DST слоты остаются 00:00–24:00.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import FeedingRecord
+from app.services.aggregates import day_range
+from app.services.sleep_analytics import load_intervals
+from app.utils.tz import day_start_utc, local_today, offset_segments, utcnow
+
+SLOT_MINUTES = 15
+SLOTS = 24 * 60 // SLOT_MINUTES
+
+# Диапазон карты по умолчанию, дни
+DEFAULT_DAYS = 28
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+@dataclass
+class Heatmap:
+    tz: str | None
+    days: list[date]
+    sleep: np.ndarray  # (дни, SLOTS): минут сна в слоте
+    feeds: np.ndarray  # (дни, SLOTS): кормлений в слоте
+
+    def to_json(self) -> dict[str, Any]:
+        """Для мини-приложения: сон — матрица минут, кормления — разреженно [день, слот, число]."""
+        d, s = np.nonzero(self.feeds)
+        return {
+            "tz": self.tz,
+            "days": [d_.isoformat() for d_ in self.days],
+            "slot_minutes": SLOT_MINUTES,
+            "sleep": self.sleep.tolist(),
+            "feeds": np.stack([d, s, self.feeds[d, s]], axis=1).tolist(),
+        }
+
+
+def _seconds(dt: datetime) -> int:
+    return int((dt - _EPOCH).total_seconds())
+
+
+def _local_minutes(
+    utc: np.ndarray, borders: np.ndarray, offsets: np.ndarray, base: int, side: str = "right"
+) -> np.ndarray:
+    """
+    Секунды UTC → минуты локальных настенных часов от `base` (локальная полночь, секунды).
+    side="left" — для концов интервалов: момент перехода относится к прежнему смещению.
+    """
+    local = utc + offsets[np.searchsorted(borders, utc, side=side)]
+    return (local - base) // 60
+
+
+def _split(starts: np.ndarray, ends: np.ndarray, borders: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Разрезать интервалы по моментам перехода DST — каждый кусок в одном смещении."""
+    for b in borders:
+        cross = (starts < b) & (ends > b)
+        if cross.any():
+            starts = np.concatenate((starts, np.full(int(cross.sum()), b)))
+            ends = np.concatenate((np.where(cross, b, ends), ends[cross]))
+    return starts, ends
+
+
+def occupancy(
+    starts: np.ndarray, ends: np.ndarray, feeds: np.ndarray, days: list[date], tz: str | None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Интервалы сна и моменты кормлений (секунды UTC) → матрицы (дни, SLOTS)."""
+    n = len(days)
+    total = n * 24 * 60
+    lo, hi = day_start_utc(days[0], tz), day_start_utc(days[-1] + timedelta(days=1), tz)
+    base = _seconds(datetime.combine(days[0], time.min))
+    segments = offset_segments(tz, lo, hi)
+    borders = np.array([_seconds(b) for b, _ in segments[:-1]], dtype=np.int64)
+    offsets = np.array([off for _, off in segments], dtype=np.int64) * 60
+
+    sleep = np.zeros((n, SLOTS), dtype=np.int64)
+    if len(starts):
+        # при переводе часов назад час повторяется: куски до и после перехода ложатся отдельно
+        starts, ends = _split(starts, ends, borders)
+        si = np.clip(_local_minutes(starts, borders, offsets, base), 0, total)
+        ei = np.maximum(np.clip(_local_minutes(ends, borders, offsets, base, side="left"), 0, total), si)
+        diff = np.bincount(si, minlength=total + 1) - np.bincount(ei, minlength=total + 1)
+        busy = np.cumsum(diff[:total]) > 0
+        sleep = busy.reshape(n, SLOTS, SLOT_MINUTES).sum(axis=2)
+
+    fed = np.zeros(n * SLOTS, dtype=np.int64)
+    if len(feeds):
+        fi = _local_minutes(feeds, borders, offsets, base)
+        fi = fi[(fi >= 0) & (fi < total)]
+        fed = np.bincount(fi // SLOT_MINUTES, minlength=n * SLOTS)
+    return sleep, fed.reshape(n, SLOTS)
+
+
+async def build(
+    session: AsyncSession, baby_id: int, tz: str | None, days: int = DEFAULT_DAYS, today: date | None = None
+) -> Heatmap:
+    """Карта за последние `days` локальных дней (по today включительно)."""
+    span = day_range(today or local_today(tz), days)
+    now = utcnow()
+    lo = day_start_utc(span[0], tz)
+    hi = min(day_start_utc(span[-1] + timedelta(days=1), tz), now)
+    starts, ends = await load_intervals(session, baby_id, lo, hi, now)
+    q = await session.execute(
+        select(FeedingRecord.fed_at).where(
+            FeedingRecord.baby_id == baby_id,
+            FeedingRecord.fed_at >= lo,
+            FeedingRecord.fed_at < hi,
+        )
+    )
+    fed_at = list(q.scalars())
+    feeds = np.array(fed_at, dtype="datetime64[s]").astype(np.int64) if fed_at else np.empty(0, np.int64)
+    sleep, fed = occupancy(starts, ends, feeds, span, tz)
+    return Heatmap(tz=tz, days=span, sleep=sleep, feeds=fed)
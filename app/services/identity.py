@@ -0,0 +1,116 @@
+# app/services/identity.py
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import User, UserSettings, Baby
+from app.db.notify import PgListener, pg_notify
+from app.utils.cache import TTLCache
+
+log = logging.getLogger(__name__)
+
+# telegram_id → снимок (user, settings, активный ребёнок, семья); user_id → family_id.
+# Эти связи меняются редко и только в известных хендлерах — там кэш явно сбрасывается.
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "300"))
+# Общий канал сброса для нескольких воркеров (PostgreSQL LISTEN/NOTIFY)
+IDENTITY_CACHE_CHANNEL = os.getenv("IDENTITY_CACHE_CHANNEL", "0").strip() == "1"
+
+_CHANNEL = "identity_invalidate"
+
+
+def _columns(obj: Any) -> dict[str, Any] | None:
+    if obj is None:
+        return None
+    return {c.key: getattr(obj, c.key) for c in obj.__table__.columns}
+
+
+def _attach(session: AsyncSession, model: type, cols: dict[str, Any] | None) -> Any:
+    """Создаёт persistent-объект из снимка колонок без SELECT (как будто только что загружен)."""
+    if cols is None:
+        return None
+    obj = model(**cols)
+    make_transient_to_detached(obj)
+    session.add(obj)
+    return obj
+
+
+@dataclass(frozen=True)
+class IdentitySnapshot:
+    user: dict[str, Any]
+    settings: dict[str, Any] | None
+    baby: dict[str, Any] | None
+    family_id: int | None
+
+    @classmethod
+    def capture(
+        cls, user: User, settings: UserSettings | None, baby: Baby | None, family_id: int | None
+    ) -> "IdentitySnapshot":
+        return cls(_columns(user), _columns(settings), _columns(baby), family_id)
+
+    def attach(self, session: AsyncSession) -> tuple[User, UserSettings | None, Baby | None]:
+        return (
+            _attach(session, User, self.user),
+            _attach(session, UserSettings, self.settings),
+            _attach(session, Baby, self.baby),
+        )
+
+
+users: TTLCache[IdentitySnapshot] = TTLCache(IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL)
+families: TTLCache[int | None] = TTLCache(IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL)
+
+
+def remember(telegram_id: int, snapshot: IdentitySnapshot) -> None:
+    users.set(telegram_id, snapshot)
+    families.set(snapshot.user["id"], snapshot.family_id)
+
+
+# --- сброс ---
+
+def _drop(payload: str) -> None:
+    kind, _, key = payload.partition(":")
+    if kind == "tg":
+        users.pop(int(key))
+    elif kind == "user":
+        families.pop(int(key))
+
+
+async def _publish(payload: str) -> None:
+    if not IDENTITY_CACHE_CHANNEL:
+        return
+    try:
+        await pg_notify(_CHANNEL, payload)
+    except Exception:  # noqa: BLE001
+        log.exception("Identity invalidation publish failed: %s", payload)
+
+
+async def invalidate_user(telegram_id: int) -> None:
+    """Сменился активный ребёнок/список детей/профиль пользователя."""
+    payload = f"tg:{telegram_id}"
+    _drop(payload)
+    await _publish(payload)
+
+
+async def invalidate_family(user_id: int, telegram_id: int) -> None:
+    """Пользователь вступил в семью, создал её или вышел."""
+    for payload in (f"user:{user_id}", f"tg:{telegram_id}"):
+        _drop(payload)
+        await _publish(payload)
+
+
+listener = PgListener(_CHANNEL, _drop)
+
+
+def start_listener() -> None:
+    if IDENTITY_CACHE_CHANNEL:
+        listener.start()
+
+
+def stats() -> dict[str, Any]:
+    return {"users": users.stats(), "families": families.stats(), "channel": IDENTITY_CACHE_CHANNEL}
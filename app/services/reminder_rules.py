@@ -0,0 +1,195 @@
+# app/services/reminder_rules.py
+"""
+Правила напоминаний пользователя (кнопки remind:* в настройках).
+
+У включённого правила ровно одно напоминание (Reminder), и запись сна/кормления
+только переносит его срок: CareUnitOfWork до commit берёт события из своих записей
+(events), одним запросом по ix_reminder_rules_baby_kind выбирает правила ребёнка,
+которых они касаются, и сдвигает next_run от времени события (stage). История
+записей не читается, так что работа на одну запись не зависит от её размера.
+После commit планировщик будится через app.services.reminders.changed.
+
+Виды:
+- feed — через REMIND_FEED_MINUTES после последнего кормления (вода не считается);
+- sleep — окно бодрствования: через REMIND_WAKE_MINUTES после пробуждения,
+  засыпание напоминание снимает;
+- diaper, walk, bath — повтор каждые N минут с момента включения.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Iterable
+
+from sqlalchemy import Select, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Baby, FeedingRecord, Reminder, ReminderRule, SleepRecord
+from app.services import reminders
+from app.utils.tz import utcnow
+
+log = logging.getLogger(__name__)
+
+REMIND_FEED_MINUTES = int(os.getenv("REMIND_FEED_MINUTES", "180"))
+REMIND_WAKE_MINUTES = int(os.getenv("REMIND_WAKE_MINUTES", "90"))
+REMIND_DIAPER_MINUTES = int(os.getenv("REMIND_DIAPER_MINUTES", "180"))
+REMIND_WALK_MINUTES = int(os.getenv("REMIND_WALK_MINUTES", "1440"))
+REMIND_BATH_MINUTES = int(os.getenv("REMIND_BATH_MINUTES", "1440"))
+
+# от чего отсчитывается срок: кормление, пробуждение, просто интервал
+FEED, WAKE, REPEAT = "feed", "wake", "repeat"
+
+
+@dataclass(frozen=True)
+class RuleKind:
+    title: str
+    trigger: str
+    minutes: int
+    text: str  # {after} — интервал словами
+
+
+KINDS: dict[str, RuleKind] = {
+    "feed": RuleKind("Кормление", FEED, REMIND_FEED_MINUTES, "прошло {after} с последнего кормления"),
+    "diaper": RuleKind("Подгузник", REPEAT, REMIND_DIAPER_MINUTES, "проверить подгузник"),
+    "sleep": RuleKind("Сон", WAKE, REMIND_WAKE_MINUTES, "бодрствует уже {after} — пора укладывать"),
+    "walk": RuleKind("Прогулка", REPEAT, REMIND_WALK_MINUTES, "время прогулки"),
+    "bath": RuleKind("Купание", REPEAT, REMIND_BATH_MINUTES, "время купания"),
+}
+
+
+def fmt_minutes(minutes: int) -> str:
+    h, m = divmod(minutes, 60)
+    return " ".join(p for p in (f"{h} ч" if h else "", f"{m} мин" if m else "") if p) or "0 мин"
+
+
+def _schedule(reminder: Reminder, next_run: datetime | None) -> None:
+    """Новый срок (None — снять); аренда снимается, как в reminders.reschedule."""
+    reminders.release(reminder)
+    if next_run is None:
+        reminder.is_active = False
+        return
+    reminder.next_run = next_run
+    reminder.is_active = True
+
+
+# --- запись сна/кормления ---
+
+def events(records: Iterable[Any]) -> dict[tuple[int, str], Any]:
+    """
+    (baby_id, FEED|WAKE) → последняя запись единицы работы, от которой считать срок.
+    Вызывать до flush: новые и закрытые записи видны по состоянию объекта.
+    """
+    out: dict[tuple[int, str], Any] = {}
+    for r in records:
+        state = inspect(r)
+        if isinstance(r, FeedingRecord):
+            if state.pending and r.feeding_type != "water":
+                out[(r.baby_id, FEED)] = r
+        elif isinstance(r, SleepRecord):
+            # засыпание (новая запись без конца) или пробуждение (sleep_end только что задан)
+            if (state.pending and r.sleep_end is None) or state.attrs.sleep_end.history.added:
+                out[(r.baby_id, WAKE)] = r
+    return out
+
+
+def _event_time(record: Any) -> datetime | None:
+    if isinstance(record, FeedingRecord):
+        return record.fed_at
+    return record.sleep_end  # None — ребёнок уснул, окно бодрствования закрыто
+
+
+def rules_query(baby_ids: Iterable[int], triggers: Iterable[str]) -> Select:
+    """Включённые правила детей с их напоминаниями (индекс ix_reminder_rules_baby_kind)."""
+    triggers = set(triggers)
+    return (
+        select(ReminderRule, Reminder)
+        .join(Reminder, Reminder.id == ReminderRule.reminder_id)
+        .where(
+            ReminderRule.baby_id.in_(set(baby_ids)),
+            ReminderRule.kind.in_([k for k, spec in KINDS.items() if spec.trigger in triggers]),
+            ReminderRule.is_enabled,
+        )
+    )
+
+
+async def stage(session: AsyncSession, found: dict[tuple[int, str], Any]) -> list[Reminder]:
+    """Перенести напоминания правил, которых касаются события (до commit); вернуть изменённые."""
+    if not found:
+        return []
+    q = await session.execute(rules_query({b for b, _ in found}, {t for _, t in found}))
+    rows = q.all()
+    if not rows:
+        return []
+    await session.flush()  # fed_at по умолчанию появляется при flush
+    touched = []
+    for rule, reminder in rows:
+        when = _event_time(found[(rule.baby_id, KINDS[rule.kind].trigger)])
+        _schedule(reminder, when + timedelta(minutes=rule.after_minutes) if when else None)
+        touched.append(reminder)
+    return touched
+
+
+# --- настройки ---
+
+async def _initial(session: AsyncSession, rule: ReminderRule, spec: RuleKind) -> datetime | None:
+    """Срок при включении: по последнему событию (одна строка по индексу) или от текущего момента."""
+    now = utcnow()
+    step = timedelta(minutes=rule.after_minutes)
+    if spec.trigger == REPEAT:
+        return now + step
+    if spec.trigger == FEED:
+        last = await session.scalar(
+            select(FeedingRecord.fed_at)
+            .where(FeedingRecord.baby_id == rule.baby_id, FeedingRecord.feeding_type != "water")
+            .order_by(FeedingRecord.fed_at.desc())
+            .limit(1)
+        )
+    else:
+        # незакрытый сон — ребёнок спит, срок появится при пробуждении
+        last = await session.scalar(
+            select(SleepRecord.sleep_end)
+            .where(SleepRecord.baby_id == rule.baby_id)
+            .order_by(SleepRecord.sleep_start.desc())
+            .limit(1)
+        )
+    # событие давно прошло — не напоминаем задним числом, ждём следующего
+    return last + step if last is not None and last + step > now else None
+
+
+async def enabled(session: AsyncSession, user_id: int, baby_id: int) -> set[str]:
+    """Включённые виды правил пользователя для ребёнка."""
+    q = await session.execute(
+        select(ReminderRule.kind).where(
+            ReminderRule.baby_id == baby_id, ReminderRule.user_id == user_id, ReminderRule.is_enabled
+        )
+    )
+    return set(q.scalars())
+
+
+async def toggle(session: AsyncSession, *, user_id: int, baby: Baby, chat_id: int, kind: str) -> bool:
+    """Включить/выключить правило; True — включено. Коммитит и будит планировщик."""
+    spec = KINDS[kind]
+    q = await session.execute(
+        select(ReminderRule, Reminder)
+        .outerjoin(Reminder, Reminder.id == ReminderRule.reminder_id)
+        .where(ReminderRule.baby_id == baby.id, ReminderRule.kind == kind, ReminderRule.user_id == user_id)
+    )
+    row = q.first()
+    rule, reminder = row if row else (None, None)
+    if rule is None:
+        rule = ReminderRule(user_id=user_id, baby_id=baby.id, kind=kind, after_minutes=spec.minutes, is_enabled=False)
+        session.add(rule)
+    if reminder is None:
+        # напоминание правила удалили (или правила не было) — заводим заново
+        reminder = Reminder(user_id=user_id, chat_id=chat_id, text="", next_run=utcnow(), is_active=False)
+        rule.reminder = reminder
+    rule.is_enabled = not rule.is_enabled
+    reminder.chat_id = chat_id
+    reminder.text = f"{baby.name}: {spec.text.format(after=fmt_minutes(rule.after_minutes))}"[:255]
+    reminder.interval_minutes = rule.after_minutes if spec.trigger == REPEAT else None
+    _schedule(reminder, await _initial(session, rule, spec) if rule.is_enabled else None)
+    await session.commit()
+    await reminders.changed(reminder)
+    return rule.is_enabled
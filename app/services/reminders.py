@@ -0,0 +1,153 @@
+# app/services/reminders.py
+"""
+Запись напоминаний и оповещение планировщика (app.bot.reminders_worker).
+
+Планировщик держит ближайшие next_run в памяти и спит до первого из них, поэтому
+о каждом изменении таблицы reminders ему нужно сообщить после commit: в своём
+процессе — напрямую (subscribe), в других — через PostgreSQL NOTIFY (REMINDER_CHANNEL).
+"""
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime
+from typing import Any, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import flag_modified
+
+from app.db.models import Reminder
+from app.db.notify import PgListener, pg_notify
+
+log = logging.getLogger(__name__)
+
+# LISTEN/NOTIFY между процессами (работает только на PostgreSQL)
+REMINDER_CHANNEL = os.getenv("REMINDER_CHANNEL", "1").strip() == "1"
+
+_CHANNEL = "reminders_changed"
+_MISSING = object()
+
+# (id напоминания, новый next_run или None — удалено/выключено)
+Listener = Callable[[int, datetime | None], None]
+_listeners: list[Listener] = []
+
+
+def subscribe(listener: Listener) -> None:
+    _listeners.append(listener)
+
+
+def unsubscribe(listener: Listener) -> None:
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def encode(reminder_id: int, next_run: datetime | None) -> str:
+    return f"{reminder_id}:{next_run.isoformat() if next_run else ''}"
+
+
+def decode(payload: str) -> tuple[int, datetime | None]:
+    rid, _, when = payload.partition(":")
+    return int(rid), datetime.fromisoformat(when) if when else None
+
+
+def _dispatch(reminder_id: int, next_run: datetime | None) -> None:
+    for listener in list(_listeners):
+        try:
+            listener(reminder_id, next_run)
+        except Exception:  # noqa: BLE001
+            log.exception("Reminder listener failed")
+
+
+def _on_remote(payload: str) -> None:
+    try:
+        reminder_id, next_run = decode(payload)
+    except ValueError:
+        log.warning("Bad reminder notification: %r", payload)
+        return
+    _dispatch(reminder_id, next_run)
+
+
+async def notify(reminder_id: int, next_run: datetime | None) -> None:
+    """Сообщить планировщикам о новом сроке напоминания (вызывать после commit)."""
+    _dispatch(reminder_id, next_run)
+    if not REMINDER_CHANNEL:
+        return
+    try:
+        await pg_notify(_CHANNEL, encode(reminder_id, next_run))
+    except Exception:  # noqa: BLE001
+        log.exception("Reminder notification publish failed: %s", reminder_id)
+
+
+async def changed(*reminders: Reminder) -> None:
+    """Созданные или изменённые напоминания уже закоммичены — разбудить планировщик."""
+    for r in reminders:
+        await notify(r.id, r.next_run if r.is_active else None)
+
+
+# --- запись ---
+
+def release(reminder: Reminder) -> None:
+    """
+    Снять аренду при переносе/выключении: воркер, который сейчас отправляет прежний
+    срок, пишет итог только в строки со своим locked_by и новое значение не затрёт.
+    """
+    reminder.locked_until = None
+    reminder.locked_by = None
+    # объект мог быть загружен до аренды (там None) — без флага UPDATE пропустил бы колонки
+    flag_modified(reminder, "locked_until")
+    flag_modified(reminder, "locked_by")
+
+
+async def create(
+    session: AsyncSession,
+    *,
+    user_id: int,
+    chat_id: int,
+    text: str,
+    next_run: datetime,
+    interval_minutes: int | None = None,
+) -> Reminder:
+    """Новое напоминание; next_run — naive UTC."""
+    r = Reminder(user_id=user_id, chat_id=chat_id, text=text, next_run=next_run, interval_minutes=interval_minutes)
+    session.add(r)
+    await session.commit()
+    await changed(r)
+    return r
+
+
+async def reschedule(
+    session: AsyncSession, reminder: Reminder, next_run: datetime, *, interval_minutes: Any = _MISSING,
+) -> Reminder:
+    """Перенести (и включить) напоминание; interval_minutes меняется, только если передан."""
+    reminder.next_run = next_run
+    reminder.is_active = True
+    release(reminder)
+    if interval_minutes is not _MISSING:
+        reminder.interval_minutes = interval_minutes
+    await session.commit()
+    await changed(reminder)
+    return reminder
+
+
+async def deactivate(session: AsyncSession, reminder: Reminder) -> None:
+    reminder.is_active = False
+    release(reminder)
+    await session.commit()
+    await changed(reminder)
+
+
+async def delete(session: AsyncSession, reminder: Reminder) -> None:
+    reminder_id = reminder.id
+    await session.delete(reminder)
+    await session.commit()
+    await notify(reminder_id, None)
+
+
+# --- LISTEN ---
+
+listener = PgListener(_CHANNEL, _on_remote)
+
+
+def start_listener() -> None:
+    if REMINDER_CHANNEL:
+        listener.start()
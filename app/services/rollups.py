@@ -0,0 +1,230 @@
+# app/services/rollups.py
+"""
+Суточные итоги (daily_rollups) по сну и кормлению.
+День — локальные сутки владельца ребёнка (UserSettings.timezone); при смене пояса
+итоги его детей пересобираются (rebuild).
+
+Минуты сна делятся по локальной полуночи, как в app.services.sleep_analytics:
+сон 21:00–07:00 даёт 180 минут одному дню и 420 следующему. Число снов и кормлений —
+по дню засыпания/кормления. Пересекающиеся записи (двойной ввод) здесь не сливаются.
+
+Запись: CareUnitOfWork берёт вклад записи (delta) в add(), а перед commit вызывает
+apply() — счётчики дня увеличиваются одним INSERT ... ON CONFLICT DO UPDATE в той же
+транзакции, что и сама запись.
+Чтение: daily() — не больше одной строки на день.
+
+Пересчёт из сырых записей (история, ручные правки БД):
+    python -m app.services.rollups [--baby ID]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable
+
+from sqlalchemy import delete, insert, inspect, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.db.database import async_engine, dialect_insert
+from app.db.models import Baby, DailyRollup, FeedingRecord, SleepRecord, UserSettings
+from app.services import aggregates
+from app.utils.tz import day_start_utc, to_local
+
+log = logging.getLogger(__name__)
+
+COUNTERS = ("sleep_minutes", "sleep_count", "feed_count", "ml", "g")
+
+_INSERT_CHUNK = 500
+
+
+def _day(dt: datetime, tz: str | None) -> date:
+    return to_local(dt, tz).date()
+
+
+def split_minutes(start: datetime, lo: int, hi: int, tz: str | None) -> dict[date, int]:
+    """
+    Минуты сна с lo-й по hi-ю от засыпания по локальным суткам (сон через полночь
+    делится); hi < lo — отрицательные (длительность уменьшили).
+    """
+    sign = 1
+    if hi < lo:
+        lo, hi, sign = hi, lo, -1
+    parts: dict[date, int] = {}
+    t, end, done = start + timedelta(minutes=lo), start + timedelta(minutes=hi), lo
+    while t < end:
+        day = _day(t, tz)
+        t = min(end, day_start_utc(day + timedelta(days=1), tz))
+        # граница — целая минута от засыпания, так что части в сумме дают hi - lo
+        upto = hi if t == end else round((t - start).total_seconds() / 60)
+        if upto > done:
+            parts[day] = parts.get(day, 0) + sign * (upto - done)
+        done = upto
+    return parts
+
+
+# --- запись ---
+
+def delta(record: Any) -> dict[str, int] | None:
+    """
+    Вклад изменённой записи в счётчики дня (по истории атрибутов). Брать до любого
+    запроса в сессии: autoflush сбрасывает pending и историю.
+    """
+    state = inspect(record)
+    if isinstance(record, FeedingRecord):
+        if not state.pending:
+            return None
+        return {"feed_count": 1, "ml": record.amount_ml or 0, "g": record.amount_g or 0}
+    if isinstance(record, SleepRecord):
+        hist = state.attrs.duration_minutes.history
+        if not hist.added:
+            return None
+        new = hist.added[0] or 0
+        old = hist.deleted[0] if hist.deleted else None
+        # открытый сон не считается; закрытие — +1 сон, правка длительности — только минуты
+        return {"sleep_minutes": new - (old or 0), "sleep_count": 0 if old is not None else 1}
+    return None
+
+
+async def bump(session: AsyncSession | AsyncConnection, baby_id: int, day: date, delta: dict[str, int]) -> None:
+    """Прибавить delta к счётчикам дня (строка создаётся при первой записи)."""
+    values = {c: 0 for c in COUNTERS}
+    values.update(delta)
+    stmt = dialect_insert(DailyRollup).values(baby_id=baby_id, day=day, **values)
+    table = DailyRollup.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.baby_id, table.c.day],
+        set_={c: table.c[c] + stmt.excluded[c] for c in delta},
+    )
+    await session.execute(stmt)
+
+
+async def apply(
+    session: AsyncSession, pending: Iterable[tuple[Any, dict[str, int]]], tz: str | None = None
+) -> None:
+    """Учесть (запись, delta) единицы работы в daily_rollups (вызывается до commit); tz — пояс владельца."""
+    pending = list(pending)
+    if not pending:
+        return
+    await session.flush()  # значения по умолчанию (fed_at и т.п.) появляются при flush
+    merged: dict[tuple[int, date], dict[str, int]] = {}
+
+    def add(baby_id: int, day: date, d: dict[str, int]) -> None:
+        acc = merged.setdefault((baby_id, day), {})
+        for k, v in d.items():
+            acc[k] = acc.get(k, 0) + v
+
+    for r, d in pending:
+        if isinstance(r, FeedingRecord):
+            add(r.baby_id, _day(r.fed_at, tz), d)
+            continue
+        d = dict(d)
+        # прибавленные минуты — от прежней длительности до новой, по суткам, куда они попали
+        minutes = d.pop("sleep_minutes", 0)
+        new = r.duration_minutes or 0
+        add(r.baby_id, _day(r.sleep_start, tz), d)
+        for day, m in split_minutes(r.sleep_start, new - minutes, new, tz).items():
+            add(r.baby_id, day, {"sleep_minutes": m})
+    for (baby_id, day), delta in merged.items():
+        await bump(session, baby_id, day, delta)
+
+
+# --- чтение ---
+
+async def daily(session: AsyncSession, baby_id: int, start: date, end: date) -> dict[date, DailyRollup]:
+    """Итоги по дням в [start, end]; дней без записей в словаре нет."""
+    q = await session.execute(
+        select(DailyRollup).where(
+            DailyRollup.baby_id == baby_id,
+            DailyRollup.day >= start,
+            DailyRollup.day <= end,
+        )
+    )
+    return {r.day: r for r in q.scalars()}
+
+
+# --- пересчёт ---
+
+async def _sleep_by_day(
+    conn: AsyncSession | AsyncConnection, baby_ids: list[int] | None, tz: str | None
+) -> dict[tuple[int, date], dict[str, int]]:
+    """Завершённые сны: число — по дню засыпания, минуты — по суткам, куда они попали."""
+    q = select(SleepRecord.baby_id, SleepRecord.sleep_start, SleepRecord.duration_minutes).where(
+        SleepRecord.duration_minutes.is_not(None)
+    )
+    if baby_ids is not None:
+        q = q.where(SleepRecord.baby_id.in_(baby_ids))
+    out: dict[tuple[int, date], dict[str, int]] = {}
+    for baby, start, minutes in (await conn.execute(q)).all():
+        out.setdefault((baby, _day(start, tz)), {"sleep_minutes": 0, "sleep_count": 0})["sleep_count"] += 1
+        for day, m in split_minutes(start, 0, minutes, tz).items():
+            out.setdefault((baby, day), {"sleep_minutes": 0, "sleep_count": 0})["sleep_minutes"] += m
+    return out
+
+
+async def _babies_by_tz(
+    conn: AsyncSession | AsyncConnection, baby_ids: list[int] | None
+) -> dict[str | None, list[int]]:
+    q = select(Baby.id, UserSettings.timezone).outerjoin(UserSettings, UserSettings.user_id == Baby.user_id)
+    if baby_ids is not None:
+        q = q.where(Baby.id.in_(baby_ids))
+    groups: dict[str | None, list[int]] = {}
+    for bid, tz in (await conn.execute(q)).all():
+        groups.setdefault(tz, []).append(bid)
+    return groups
+
+
+async def rebuild(
+    conn: AsyncSession | AsyncConnection,
+    baby_id: int | Iterable[int] | None = None,
+    *,
+    tz: str | None = None,
+) -> int:
+    """
+    Пересобрать итоги из sleep_records/feeding_records. Возвращает число строк.
+    tz задан — все выбранные дети считаются в нём; иначе — в поясе владельца каждого.
+    """
+    ids = None if baby_id is None else ([baby_id] if isinstance(baby_id, int) else list(baby_id))
+    groups = {tz: ids} if tz is not None else await _babies_by_tz(conn, ids)
+
+    rows: list[dict[str, Any]] = []
+    for group_tz, group_ids in groups.items():
+        # по одному проходу на таблицу; сон делится по полуночи в Python — SQL группирует
+        # только по одной метке времени записи
+        sleep = await _sleep_by_day(conn, group_ids, group_tz)
+        feeding = await aggregates.feeding_by_day(conn, baby_id=group_ids, tz=group_tz)
+        for baby, day in sleep.keys() | feeding.keys():
+            s, f = sleep.get((baby, day), {}), feeding.get((baby, day), {})
+            rows.append({"baby_id": baby, "day": day, **{c: s.get(c, f.get(c, 0)) for c in COUNTERS}})
+
+    wipe = delete(DailyRollup)
+    if ids is not None:
+        wipe = wipe.where(DailyRollup.baby_id.in_(ids))
+    await conn.execute(wipe)
+    for i in range(0, len(rows), _INSERT_CHUNK):
+        await conn.execute(insert(DailyRollup), rows[i:i + _INSERT_CHUNK])
+    return len(rows)
+
+
+async def _main(baby_id: int | None) -> None:
+    try:
+        async with async_engine.begin() as conn:
+            n = await rebuild(conn, baby_id)
+        log.info("daily_rollups rebuilt: %s rows", n)
+    finally:
+        await async_engine.dispose()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.services.rollups", description="Пересчёт daily_rollups")
+    parser.add_argument("--baby", type=int, default=None, help="только для ребёнка с этим id")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    asyncio.run(_main(args.baby))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+# app/services/sleep_analytics.py
+"""
+Аналитика сна по интервалам: сны ребёнка загружаются одним запросом в массивы
+NumPy (секунды UTC), дальше всё считается векторно, без цикла по записям.
+
+- Суточные суммы делятся по локальной полуночи: сон 21:00–07:00 даёт
+  3 ч одному дню и 7 ч следующему. Для этого строится функция «сколько
+  секунд сна прошло к моменту t» (cumsum длин + searchsorted) и берётся
+  её разность на границах суток.
+- День/ночь — та же разность на границах дневного окна
+  (SLEEP_NIGHT_END:00–SLEEP_NIGHT_START:00 локально), ночь — остаток суток.
+- Самый длинный сон, окна бодрствования (промежутки между снами),
+  дневные сны (засыпание в дневном окне).
+
+Пересекающиеся записи (двойной ввод) сливаются, чтобы не считать минуты дважды.
+Незавершённый сон считается до текущего момента.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import SleepRecord
+from app.services.aggregates import day_range
+from app.utils.tz import day_start_utc, local_today, utcnow, zone
+
+# Дневное окно в локальных часах: сон, начавшийся в нём, — дневной
+NIGHT_START = int(os.getenv("SLEEP_NIGHT_START", "20"))
+NIGHT_END = int(os.getenv("SLEEP_NIGHT_END", "8"))
+
+# Диапазоны для кнопок статистики, дни
+RANGES = (7, 30, 90, 365)
+
+# Насколько раньше начала диапазона искать сны, перешедшие через его границу
+MAX_SLEEP = timedelta(hours=24)
+# Промежутки длиннее — скорее пропуск в записях, чем бодрствование
+MAX_WAKE_SECONDS = 12 * 3600
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+@dataclass
+class SleepStats:
+    days: list[date]
+    total: np.ndarray  # минуты сна по дням
+    day: np.ndarray  # из них в дневном окне
+    night: np.ndarray  # остальное
+    naps: np.ndarray  # дневных снов по дням
+    longest: int = 0  # минуты
+    longest_start: datetime | None = None  # локальное время засыпания
+    wake_avg: int | None = None  # минуты
+    wake_max: int | None = None
+
+    @property
+    def tracked_days(self) -> int:
+        """Дней, в которые был хоть какой-то сон (по ним считаются средние)."""
+        return int(np.count_nonzero(self.total))
+
+    def avg(self, values: np.ndarray) -> float:
+        mask = self.total > 0
+        return float(values[mask].mean()) if mask.any() else 0.0
+
+
+# --- загрузка ---
+
+def _seconds(values: list[datetime]) -> np.ndarray:
+    return np.array(values, dtype="datetime64[s]").astype(np.int64)
+
+
+def intervals_query(baby_id: int, start: datetime, end: datetime) -> Select:
+    """Фильтр только по sleep_start — работает индекс (baby_id, sleep_start)."""
+    return (
+        select(SleepRecord.sleep_start, SleepRecord.sleep_end)
+        .where(
+            SleepRecord.baby_id == baby_id,
+            SleepRecord.sleep_start >= start - MAX_SLEEP,
+            SleepRecord.sleep_start < end,
+        )
+        .order_by(SleepRecord.sleep_start)
+    )
+
+
+async def load_intervals(
+    session: AsyncSession, baby_id: int, start: datetime, end: datetime, now: datetime | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Сны, пересекающие [start, end) (naive UTC), как два массива секунд UTC."""
+    q = await session.execute(intervals_query(baby_id, start, end))
+    rows = q.all()
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    now = now or utcnow()
+    starts = _seconds([r[0] for r in rows])
+    ends = _seconds([r[1] or now for r in rows])
+    return starts, ends
+
+
+# --- расчёт ---
+
+def _merge(starts: np.ndarray, ends: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Отсортировать и слить пересекающиеся интервалы."""
+    order = np.argsort(starts, kind="stable")
+    s, e = starts[order], np.maximum(ends[order], starts[order])
+    reach = np.maximum.accumulate(e)
+    first = np.ones(len(s), dtype=bool)
+    first[1:] = s[1:] > reach[:-1]
+    idx = np.flatnonzero(first)
+    return s[idx], np.maximum.reduceat(e, idx)
+
+
+def _asleep_before(s: np.ndarray, e: np.ndarray, cum: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """Секунд сна до каждого момента t (интервалы слиты и отсортированы)."""
+    k = np.searchsorted(e, t, side="right")  # интервалы, закончившиеся к t
+    cur = np.minimum(k, len(s) - 1)
+    partial = np.where(k < len(s), np.clip(t - s[cur], 0, None), 0)
+    return cum[k] + partial
+
+
+def _local_edges(days: list[date], hour: int, tz: str | None) -> np.ndarray:
+    z = zone(tz)
+    return np.array(
+        [int(datetime.combine(d, time(hour), tzinfo=z).timestamp()) for d in days], dtype=np.int64
+    )
+
+
+def _minutes(seconds: np.ndarray) -> np.ndarray:
+    return np.rint(seconds / 60).astype(np.int64)
+
+
+def compute(
+    starts: np.ndarray, ends: np.ndarray, days: list[date], tz: str | None, now: datetime | None = None
+) -> SleepStats:
+    """Все метрики по локальным дням `days` (подряд, по возрастанию) за один проход."""
+    n = len(days)
+    mids = _local_edges(days + [days[-1] + timedelta(days=1)], 0, tz)
+    zeros = np.zeros(n, dtype=np.int64)
+    stats = SleepStats(days=days, total=zeros, day=zeros.copy(), night=zeros.copy(), naps=zeros.copy())
+    if not len(starts):
+        return stats
+
+    s, e = _merge(starts, ends)
+    lo = mids[0]
+    hi = min(mids[-1], int(((now or utcnow()) - _EPOCH).total_seconds()))
+    keep = (e > lo) & (s < hi)
+    s, e = s[keep], e[keep]
+    if not len(s):
+        return stats
+    cum = np.concatenate(([0], np.cumsum(e - s)))
+
+    morning = _local_edges(days, NIGHT_END, tz)
+    evening = _local_edges(days, NIGHT_START, tz)
+    total = np.diff(_asleep_before(s, e, cum, mids))
+    daytime = _asleep_before(s, e, cum, evening) - _asleep_before(s, e, cum, morning)
+    stats.total = _minutes(total)
+    stats.day = _minutes(daytime)
+    stats.night = stats.total - stats.day
+
+    # дневные сны: засыпание внутри дневного окна своего дня
+    day_idx = np.searchsorted(mids, s, side="right") - 1
+    inside = (day_idx >= 0) & (day_idx < n)
+    di = day_idx[inside]
+    nap = (s[inside] >= morning[di]) & (s[inside] < evening[di])
+    stats.naps = np.bincount(di[nap], minlength=n).astype(np.int64)
+
+    # самый длинный сон — в пределах диапазона
+    lengths = np.minimum(e, hi) - np.maximum(s, lo)
+    i = int(np.argmax(lengths))
+    stats.longest = int(round(lengths[i] / 60))
+    started = datetime.fromtimestamp(int(s[i]), tz=timezone.utc)
+    stats.longest_start = started.astimezone(zone(tz)).replace(tzinfo=None)
+
+    # окна бодрствования: промежутки между соседними снами
+    gaps = s[1:] - e[:-1]
+    gaps = gaps[(e[:-1] >= lo) & (gaps <= MAX_WAKE_SECONDS)]
+    if len(gaps):
+        stats.wake_avg = int(round(gaps.mean() / 60))
+        stats.wake_max = int(round(gaps.max() / 60))
+    return stats
+
+
+async def sleep_stats(
+    session: AsyncSession, baby_id: int, tz: str | None, days: int = 7, today: date | None = None
+) -> SleepStats:
+    """Статистика сна за последние `days` локальных дней (по today включительно)."""
+    span = day_range(today or local_today(tz), days)
+    now = utcnow()
+    lo = day_start_utc(span[0], tz)
+    hi = lo + timedelta(days=days + 1)  # с запасом на DST; лишнее отрежет compute
+    starts, ends = await load_intervals(session, baby_id, lo, min(hi, now), now)
+    return compute(starts, ends, span, tz, now)
@@ -0,0 +1,82 @@
+# app/services/users.py
+from __future__ import annotations
+
+from aiogram import types
+from sqlalchemy import case, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import dialect_insert
+from app.db.models import User, UserSettings, Baby, FamilyMember
+
+
+async def load_user_context(
+    session: AsyncSession, tg: types.User
+) -> tuple[User | None, UserSettings | None, Baby | None, int | None]:
+    """
+    Пользователь, его настройки, активный ребёнок и id семьи — одним запросом.
+    Активный: settings.active_baby_id (если ребёнок принадлежит пользователю),
+    иначе первый по id.
+    """
+    family_id = (
+        select(FamilyMember.family_id)
+        .where(FamilyMember.user_id == User.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    q = await session.execute(
+        select(User, UserSettings, Baby, family_id)
+        .outerjoin(UserSettings, UserSettings.user_id == User.id)
+        .outerjoin(Baby, Baby.user_id == User.id)
+        .where(User.telegram_id == tg.id)
+        .order_by(case((Baby.id == UserSettings.active_baby_id, 0), else_=1), Baby.id.asc())
+        .limit(1)
+    )
+    row = q.first()
+    if row is None:
+        return None, None, None, None
+    return row[0], row[1], row[2], row[3]
+
+
+async def upsert_user(session: AsyncSession, tg: types.User) -> User:
+    """
+    Создать пользователя или обновить username/имя — одним INSERT ... ON CONFLICT
+    DO UPDATE ... RETURNING. Безопасно при параллельных апдейтах нового пользователя.
+    """
+    stmt = dialect_insert(User).values(
+        telegram_id=tg.id,
+        username=tg.username,
+        first_name=tg.first_name,
+        last_name=tg.last_name,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={
+            "username": stmt.excluded.username,
+            "first_name": stmt.excluded.first_name,
+            "last_name": stmt.excluded.last_name,
+        },
+    ).returning(User)
+    res = await session.execute(
+        select(User).from_statement(stmt),
+        execution_options={"populate_existing": True},
+    )
+    return res.scalar_one()
+
+
+async def upsert_settings(session: AsyncSession, user_id: int) -> UserSettings:
+    """Настройки пользователя (создаются при первом обращении) — одним запросом."""
+    stmt = dialect_insert(UserSettings).values(user_id=user_id, active_baby_id=None)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserSettings.user_id],
+        set_={"user_id": stmt.excluded.user_id},  # no-op, чтобы RETURNING вернул строку
+    ).returning(UserSettings)
+    res = await session.execute(
+        select(UserSettings).from_statement(stmt),
+        execution_options={"populate_existing": True},
+    )
+    return res.scalar_one()
+
+
+def is_stale(user: User, tg: types.User) -> bool:
+    """Изменились ли username/имя в Telegram по сравнению с БД."""
+    return (user.username, user.first_name, user.last_name) != (tg.username, tg.first_name, tg.last_name)
@@ -0,0 +1,218 @@
+# app/utils/chart_cache.py
+"""
+Кэш готовых графиков по содержимому.
+
+Ключ — sha256 от (функция построения, её аргументы, CHART_STYLE_VERSION): одинаковые
+данные дают один и тот же PNG, поэтому повторное нажатие «Сон за 7 дней» без новых
+записей не строит график заново.
+
+Уровни:
+- память: LRU по суммарному размеру PNG (CHART_CACHE_MEMORY_MB);
+- диск: LRU по mtime в CHART_CACHE_DIR (CHART_CACHE_DISK_MB, 0 — выключен);
+- file_id Telegram: после первой отправки фото повторно уходит по file_id, без загрузки байтов.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable
+
+from app.utils import chart_pool
+from app.utils.cache import TTLCache
+
+log = logging.getLogger(__name__)
+
+CHART_CACHE_MEMORY_MB = float(os.getenv("CHART_CACHE_MEMORY_MB", "16"))
+CHART_CACHE_DISK_MB = float(os.getenv("CHART_CACHE_DISK_MB", "64"))
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", "").strip() or os.path.join(tempfile.gettempdir(), "baby-tracker-charts")
+CHART_FILE_IDS = int(os.getenv("CHART_FILE_IDS", "10000"))
+CHART_FILE_ID_TTL = float(os.getenv("CHART_FILE_ID_TTL", str(30 * 24 * 3600)))
+
+# Меняется вместе с оформлением графиков в app/utils/charts.py — старые PNG перестают совпадать
+CHART_STYLE_VERSION = 1
+
+
+def chart_key(fn: Callable[..., Any], args: tuple = (), kwargs: dict | None = None) -> str:
+    payload = {
+        "fn": f"{fn.__module__}.{fn.__qualname__}",
+        "style": CHART_STYLE_VERSION,
+        "args": args,
+        "kwargs": kwargs or {},
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class BytesLRU:
+    """LRU в памяти с лимитом по суммарному размеру значений."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self._data: OrderedDict[str, bytes] = OrderedDict()
+        self.max_bytes = max(0, max_bytes)
+        self.size = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> bytes | None:
+        data = self._data.get(key)
+        if data is not None:
+            self._data.move_to_end(key)
+        return data
+
+    def set(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._data[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, dropped = self._data.popitem(last=False)
+            self.size -= len(dropped)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskLRU:
+    """
+    PNG-файлы <key>.png в каталоге; при переполнении удаляются давно не читанные
+    (mtime обновляется при чтении). Методы синхронные — вызывать через asyncio.to_thread.
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int) -> None:
+        self.path = Path(path)
+        self.max_bytes = max(0, max_bytes)
+        self._index: OrderedDict[str, int] | None = None
+        self._lock = threading.Lock()
+        self.size = 0
+        self.evictions = 0
+
+    def _load(self) -> OrderedDict[str, int]:
+        if self._index is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            files = sorted(self.path.glob("*.png"), key=lambda p: p.stat().st_mtime)
+            self._index = OrderedDict((p.stem, p.stat().st_size) for p in files)
+            self.size = sum(self._index.values())
+        return self._index
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            index = self._load()
+            if key not in index:
+                return None
+            file = self.path / f"{key}.png"
+            try:
+                data = file.read_bytes()
+                os.utime(file)
+            except OSError:
+                self.size -= index.pop(key)
+                return None
+            index.move_to_end(key)
+            return data
+
+    def set(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            index = self._load()
+            tmp = self.path / f"{key}.tmp"
+            tmp.write_bytes(data)
+            tmp.replace(self.path / f"{key}.png")
+            self.size += len(data) - index.pop(key, 0)
+            index[key] = len(data)
+            while self.size > self.max_bytes and index:
+                old, size = index.popitem(last=False)
+                (self.path / f"{old}.png").unlink(missing_ok=True)
+                self.size -= size
+                self.evictions += 1
+
+
+class ChartCache:
+    def __init__(self, memory_bytes: int, disk_dir: str | Path | None, disk_bytes: int) -> None:
+        self.memory = BytesLRU(memory_bytes)
+        self.disk = DiskLRU(disk_dir, disk_bytes) if disk_dir and disk_bytes > 0 else None
+        self.file_ids: TTLCache[str] = TTLCache(CHART_FILE_IDS, CHART_FILE_ID_TTL)
+
+        # метрики
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_errors = 0
+
+    async def png(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> tuple[str, bytes]:
+        """(ключ, PNG) для fn(*args, **kwargs)."""
+        key = chart_key(fn, args, kwargs)
+        return key, await self.fetch(key, fn, args, kwargs)
+
+    async def fetch(self, key: str, fn: Callable[..., Any], args: tuple, kwargs: dict) -> bytes:
+        """PNG по ключу: из памяти, с диска или построением в пуле (app.utils.chart_pool)."""
+        data = self.memory.get(key)
+        if data is not None:
+            self.memory_hits += 1
+            return data
+        if self.disk is not None:
+            try:
+                data = await asyncio.to_thread(self.disk.get, key)
+            except OSError:
+                self.disk_errors += 1
+                log.exception("Chart disk cache read failed")
+            if data is not None:
+                self.disk_hits += 1
+                self.memory.set(key, data)
+                return data
+
+        self.misses += 1
+        data = await chart_pool.render(fn, *args, **kwargs)
+        self.memory.set(key, data)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, data)
+            except OSError:
+                self.disk_errors += 1
+                log.exception("Chart disk cache write failed")
+        return data
+
+    def file_id(self, key: str) -> str | None:
+        return self.file_ids.get(key)
+
+    def remember_file_id(self, key: str, file_id: str) -> None:
+        self.file_ids.set(key, file_id)
+
+    def forget_file_id(self, key: str) -> None:
+        self.file_ids.pop(key)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory": {"items": len(self.memory), "bytes": self.memory.size, "evictions": self.memory.evictions},
+            "disk": (
+                {"dir": str(self.disk.path), "bytes": self.disk.size, "evictions": self.disk.evictions}
+                if self.disk is not None else None
+            ),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+            "disk_errors": self.disk_errors,
+            "file_ids": self.file_ids.stats(),
+        }
+
+
+cache = ChartCache(
+    int(CHART_CACHE_MEMORY_MB * 1024 * 1024),
+    CHART_CACHE_DIR,
+    int(CHART_CACHE_DISK_MB * 1024 * 1024),
+)
+
+
+def stats() -> dict[str, Any]:
+    return cache.stats()
@@ -0,0 +1,153 @@
+# app/utils/chart_pool.py
+"""
+Построение графиков вне event loop.
+
+matplotlib синхронный: PNG 7×4 дюйма при 140 dpi строится десятки–сотни мс,
+и всё это время бот не обрабатывает ничьи апдейты. render() отдаёт функцию из
+app.utils.charts в пул процессов (или потоков) и ждёт PNG асинхронно.
+
+CHART_POOL: process (по умолчанию) | thread | inline (прямо в event loop — для отладки).
+Если пул процессов создать нельзя (нет /dev/shm, ограничения хостинга) — потоки.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Any, Callable
+
+log = logging.getLogger(__name__)
+
+CHART_POOL = os.getenv("CHART_POOL", "process").strip().lower()
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+# Одновременно строящихся графиков (остальные ждут своей очереди)
+CHART_MAX_CONCURRENCY = int(os.getenv("CHART_MAX_CONCURRENCY", "4"))
+# Сколько ждать график, включая очередь, секунд
+CHART_TIMEOUT = float(os.getenv("CHART_TIMEOUT", "15"))
+
+
+def _run(fn: Callable[..., Any], args: tuple, kwargs: dict) -> bytes:
+    out = fn(*args, **kwargs)
+    return out.getvalue() if isinstance(out, BytesIO) else bytes(out)
+
+
+def _warmup() -> None:
+    # matplotlib импортируется один раз при старте воркера, а не на первом графике
+    from app.utils import charts
+    charts.warmup()
+
+
+class ChartPool:
+    """Пул для синхронных функций построения графиков с лимитом параллельности и таймаутом."""
+
+    def __init__(self, mode: str = "process", *, workers: int = 2, max_concurrency: int = 4, timeout: float = 15.0):
+        self.mode = mode if mode in ("process", "thread", "inline") else "process"
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self._sem = asyncio.Semaphore(max(1, max_concurrency))
+        self._executor: Executor | None = None
+        self.active: str | None = "inline" if self.mode == "inline" else None
+
+        # метрики
+        self.in_flight = 0
+        self.rendered = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.render_seconds = 0.0
+
+    def start(self) -> None:
+        """Поднять пул (заранее, на старте сервиса — иначе при первом графике)."""
+        if self._executor is not None or self.mode == "inline":
+            return
+        if self.mode == "process":
+            try:
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_warmup,
+                )
+                self.active = "process"
+                return
+            except (OSError, NotImplementedError, ImportError) as e:
+                log.warning("Chart process pool is unavailable (%s); using threads.", e)
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="chart")
+        self.active = "thread"
+
+    async def warm(self) -> None:
+        """Поднять воркеров и загрузить в них matplotlib до первого графика."""
+        if self.mode == "inline":
+            return
+        self.start()
+        loop = asyncio.get_running_loop()
+        # в пуле процессов воркер стартует на первой задаче; initializer уже делает warmup
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _warmup) for _ in range(self.workers)))
+
+    def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def render(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> bytes:
+        """
+        PNG от fn(*args, **kwargs) (BytesIO или bytes). fn и аргументы должны
+        пиклиться: функции модуля app.utils.charts и простые списки/строки.
+        TimeoutError — если не уложились в timeout вместе с ожиданием очереди.
+        """
+        if self.mode == "inline":
+            return _run(fn, args, kwargs)
+        try:
+            return await asyncio.wait_for(self._submit(fn, args, kwargs), self.timeout)
+        except asyncio.TimeoutError:
+            # уже запущенное построение не прервать — воркер освободится сам
+            self.timeouts += 1
+            log.warning("Chart %s timed out after %.1fs", getattr(fn, "__name__", fn), self.timeout)
+            raise TimeoutError("chart rendering timed out") from None
+
+    async def _submit(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> bytes:
+        async with self._sem:
+            self.start()
+            loop = asyncio.get_running_loop()
+            self.in_flight += 1
+            t0 = time.perf_counter()
+            try:
+                png = await loop.run_in_executor(self._executor, _run, fn, args, kwargs)
+            except BrokenProcessPool:
+                # воркер упал (OOM и т.п.) — новый пул поднимется на следующем графике
+                self.failed += 1
+                self._executor = None
+                raise
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self.in_flight -= 1
+            self.rendered += 1
+            self.render_seconds += time.perf_counter() - t0
+            return png
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "mode": self.active or self.mode,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "avg_ms": round(self.render_seconds / self.rendered * 1000, 1) if self.rendered else None,
+        }
+
+
+pool = ChartPool(
+    CHART_POOL, workers=CHART_WORKERS, max_concurrency=CHART_MAX_CONCURRENCY, timeout=CHART_TIMEOUT,
+)
+
+
+async def render(fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> bytes:
+    return await pool.render(fn, *args, **kwargs)
+
+
+def stats() -> dict[str, Any]:
+    return pool.stats()
@@ -1,10 +1,38 @@
 from __future__ import annotations
+from functools import lru_cache
 from io import BytesIO
-from typing import List, Tuple
+from typing import Any, Dict, List, Tuple
 
-import matplotlib
-matplotlib.use("Agg")  # без GUI
-import matplotlib.pyplot as plt
+MAX_XTICKS = 12
+
+
+@lru_cache(maxsize=None)
+def _figure_class() -> Any:
+    # matplotlib грузится при первом графике (в воркере пула), а не при импорте модуля
+    import matplotlib
+    matplotlib.use("Agg")  # без GUI
+    # Figure без pyplot: нет глобального состояния, можно строить из нескольких потоков
+    from matplotlib.figure import Figure
+    return Figure
+
+
+def warmup() -> None:
+    _figure_class()
+
+
+def _png(fig: Any) -> BytesIO:
+    fig.tight_layout()
+    buf = BytesIO()
+    fig.savefig(buf, format="png", dpi=140)
+    buf.seek(0)
+    return buf
+
+
+def _xticks(ax: Any, x_labels: List[str]) -> None:
+    # на длинных диапазонах (30–365 дней) подписываем не каждый столбец
+    pos = range(len(x_labels))
+    step = max(1, -(-len(x_labels) // MAX_XTICKS))
+    ax.set_xticks(pos[::step], x_labels[::step], rotation=45 if step > 1 else 0)
 
 
 def bar_chart_png(
@@ -14,15 +42,122 @@ def bar_chart_png(
     ylabel: str,
 ) -> BytesIO:
     """Строит простой столбчатый график и возвращает PNG в памяти."""
-    fig, ax = plt.subplots(figsize=(7, 4))  # один график, без стилей
-    ax.bar(x_labels, values)
+    fig = _figure_class()(figsize=(7, 4))  # один график, без стилей
+    ax = fig.subplots()
+    ax.bar(range(len(x_labels)), values)
+    _xticks(ax, x_labels)
     ax.set_title(title)
     ax.set_ylabel(ylabel)
     ax.grid(True, axis="y", linestyle="--", linewidth=0.5)
-    plt.tight_layout()
+    return _png(fig)
 
-    buf = BytesIO()
-    fig.savefig(buf, format="png", dpi=140)
-    plt.close(fig)
-    buf.seek(0)
-    return buf
+
+# --- несколько рядов и панелей ---
+#
+# Ряд — словарь (пиклится в пул и хэшируется кэшем как есть):
+#   {"label": "мл", "values": [...], "kind": "bar" | "line", "axis": "left" | "right", "stack": False}
+# Столбцы без stack стоят рядом (в том числе с разных осей), со stack — друг на друге.
+
+def _draw_series(ax: Any, x_labels: List[str], series: List[Dict[str, Any]], ylabel: str, y2label: str = "") -> None:
+    axes = {"left": ax}
+    if any(s.get("axis") == "right" for s in series):
+        axes["right"] = ax.twinx()
+        axes["right"].set_ylabel(y2label)
+
+    pos = list(range(len(x_labels)))
+    groups = [s for s in series if s.get("kind", "bar") == "bar" and not s.get("stack")]
+    stacked = [s for s in series if s.get("kind", "bar") == "bar" and s.get("stack")]
+    slots = len(groups) + (1 if stacked else 0)
+    width = 0.8 / max(1, slots)
+    offset = -0.4 + width / 2
+    handles = []
+
+    for i, s in enumerate(groups):
+        target = axes[s.get("axis", "left")]
+        x = [p + offset + i * width for p in pos]
+        handles.append(target.bar(x, s["values"], width, label=s["label"], color=f"C{len(handles)}"))
+    if stacked:
+        x = [p + offset + len(groups) * width for p in pos]
+        bottom = [0.0] * len(pos)
+        for s in stacked:
+            target = axes[s.get("axis", "left")]
+            handles.append(target.bar(x, s["values"], width, bottom=bottom, label=s["label"], color=f"C{len(handles)}"))
+            bottom = [b + v for b, v in zip(bottom, s["values"])]
+    for s in series:
+        if s.get("kind") == "line":
+            target = axes[s.get("axis", "left")]
+            handles.extend(target.plot(pos, s["values"], marker="o", label=s["label"], color=f"C{len(handles)}"))
+
+    _xticks(ax, x_labels)
+    ax.set_ylabel(ylabel)
+    ax.grid(True, axis="y", linestyle="--", linewidth=0.5)
+    if len(handles) > 1:
+        ax.legend(handles=handles, loc="upper left", fontsize=8, framealpha=0.8)
+
+
+def series_chart_png(
+    title: str,
+    x_labels: List[str],
+    series: List[Dict[str, Any]],
+    ylabel: str,
+    y2label: str = "",
+) -> BytesIO:
+    """Несколько рядов на одном графике: рядом, стопкой или на второй оси (axis="right")."""
+    fig = _figure_class()(figsize=(7, 4))
+    ax = fig.subplots()
+    _draw_series(ax, x_labels, series, ylabel, y2label)
+    ax.set_title(title)
+    return _png(fig)
+
+
+def panels_png(title: str, panels: List[Dict[str, Any]]) -> BytesIO:
+    """
+    Панели друг под другом в одном PNG. Панель — словарь с ключами
+    title, x_labels, series, ylabel и (необязательно) y2label; без данных — подпись «нет данных».
+    """
+    fig = _figure_class()(figsize=(7, 2.8 * len(panels) + 0.6))
+    axes = fig.subplots(len(panels), 1, squeeze=False)[:, 0]
+    for ax, panel in zip(axes, panels):
+        ax.set_title(panel["title"], fontsize=10)
+        if not panel["x_labels"]:
+            ax.text(0.5, 0.5, "нет данных", ha="center", va="center", transform=ax.transAxes, color="gray")
+            ax.set_xticks([])
+            ax.set_yticks([])
+            continue
+        _draw_series(ax, panel["x_labels"], panel["series"], panel.get("ylabel", ""), panel.get("y2label", ""))
+    fig.suptitle(title)
+    return _png(fig)
+
+
+def heatmap_png(
+    title: str,
+    y_labels: List[str],
+    cells: List[List[float]],
+    points: List[Tuple[int, int]] | None = None,
+    points_label: str = "",
+) -> BytesIO:
+    """
+    Тепловая карта «дни × слоты суток»: cells — доля 0..1 по строкам-дням,
+    слоты равномерно делят 24 часа. points — отметки (строка, слот) поверх карты.
+    """
+    rows = len(y_labels)
+    slots = len(cells[0]) if cells else 1
+    slot_h = 24 / slots
+    fig = _figure_class()(figsize=(8, max(3.0, 0.22 * rows + 1.4)))
+    ax = fig.subplots()
+    ax.imshow(
+        cells, aspect="auto", cmap="Blues", vmin=0, vmax=1,
+        extent=(0, 24, rows, 0), interpolation="nearest",
+    )
+    if points:
+        ax.scatter(
+            [s * slot_h + slot_h / 2 for _, s in points], [r + 0.5 for r, _ in points],
+            s=14, color="tab:orange", edgecolors="white", linewidths=0.5, label=points_label or None,
+        )
+        if points_label:
+            ax.legend(loc="upper right", fontsize=8, framealpha=0.8)
+    ax.set_xticks(range(0, 25, 3), [f"{h:02d}:00" for h in range(0, 25, 3)])
+    step = max(1, -(-rows // (MAX_XTICKS * 2)))
+    ax.set_yticks([i + 0.5 for i in range(0, rows, step)], y_labels[::step])
+    ax.set_title(title)
+    return _png(fig)
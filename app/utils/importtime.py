@@ -0,0 +1,117 @@
+# app/utils/importtime.py
+"""
+Холодный импорт веб-сервиса: отчёт по пакетам и проверка бюджета.
+
+Импорт выполняется в отдельном интерпретаторе с `-X importtime`, поэтому
+результат не зависит от уже загруженных модулей:
+
+    python -m app.utils.importtime                # отчёт + проверка IMPORT_BUDGET_SECONDS
+    python -m app.utils.importtime --budget 3.5   # код 1, если дольше 3.5 с (0 — без лимита)
+
+Кроме времени проверяется, что тяжёлые модули (--forbid, по умолчанию
+matplotlib и numpy) не загружаются при старте: они грузятся лениво и прогреваются
+в фоне (app.utils.lazy, app.utils.chart_pool).
+Отсутствие тяжёлых модулей после импорта проверяет и tests/test_importtime.py;
+время — только здесь (зависит от машины).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+
+DEFAULT_MODULE = "app.web.main"
+DEFAULT_FORBID = ("matplotlib", "numpy")
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "6.0"))
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {forbid!r} if m in sys.modules]}}))
+"""
+
+
+@dataclass
+class ImportReport:
+    module: str
+    seconds: float  # время `import module` в свежем интерпретаторе
+    by_package: dict[str, float]  # собственное время импорта по корневому пакету, секунды
+    by_module: dict[str, float]  # совокупное время модулей самого приложения (app.*), секунды
+    forbidden_loaded: list[str]
+
+
+def _parse(stderr: str) -> tuple[dict[str, float], dict[str, float]]:
+    by_package: dict[str, float] = {}
+    by_module: dict[str, float] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|", 2))
+        root = name.split(".", 1)[0]
+        by_package[root] = by_package.get(root, 0.0) + int(self_us) / 1e6
+        if root == "app":
+            by_module[name] = int(cumulative_us) / 1e6
+    return by_package, by_module
+
+
+def _probe(module: str, forbid: tuple[str, ...], *flags: str) -> tuple[dict, str]:
+    proc = subprocess.run(
+        [sys.executable, *flags, "-c", _PROBE.format(module=module, forbid=tuple(forbid))],
+        capture_output=True, text=True, check=False,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def measure(module: str = DEFAULT_MODULE, forbid: tuple[str, ...] = DEFAULT_FORBID) -> ImportReport:
+    # время — без -X importtime (он сам заметно замедляет импорт), разбивка — с ним
+    result, _ = _probe(module, forbid)
+    _, trace = _probe(module, forbid, "-X", "importtime")
+    by_package, by_module = _parse(trace)
+    return ImportReport(module, result["seconds"], by_package, by_module, result["loaded"])
+
+
+def _print(report: ImportReport, top: int) -> None:
+    print(f"import {report.module}: {report.seconds:.3f} s")
+    print(f"\n{'package':<28}{'self, ms':>10}  (-X importtime, с его накладными расходами)")
+    for name, sec in sorted(report.by_package.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"{name:<28}{sec * 1000:>10.1f}")
+    print(f"\n{'app module':<40}{'cumulative, ms':>16}")
+    for name, sec in sorted(report.by_module.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"{name:<40}{sec * 1000:>16.1f}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.utils.importtime", description="Время холодного импорта")
+    parser.add_argument("--module", default=DEFAULT_MODULE, help="что импортировать (по умолчанию app.web.main)")
+    parser.add_argument("--top", type=int, default=15, help="сколько строк в отчёте")
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS, help="лимит, секунд (0 — без лимита)")
+    parser.add_argument(
+        "--forbid", default=",".join(DEFAULT_FORBID), help="модули, которых не должно быть после импорта",
+    )
+    args = parser.parse_args(argv)
+
+    forbid = tuple(m for m in args.forbid.split(",") if m)
+    report = measure(args.module, forbid)
+    _print(report, args.top)
+
+    failed = False
+    if report.forbidden_loaded:
+        print(f"\nFAIL: loaded at import time: {', '.join(report.forbidden_loaded)}")
+        failed = True
+    if args.budget and report.seconds > args.budget:
+        print(f"\nFAIL: cold import {report.seconds:.3f} s > budget {args.budget:.3f} s")
+        failed = True
+    if not failed and args.budget:
+        print(f"\nOK: cold import {report.seconds:.3f} s <= budget {args.budget:.3f} s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+# app/utils/lazy.py
+"""
+Отложенный импорт тяжёлых модулей (numpy, аналитика): холодный старт веб-сервиса
+не платит за них до первого вызова, а warmup() догружает их в фоне после старта.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import logging
+import time
+from types import ModuleType
+from typing import Any, Iterable
+
+log = logging.getLogger(__name__)
+
+
+class LazyModule:
+    """Модуль, который импортируется при первом обращении к атрибуту."""
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module: ModuleType | None = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            # import_module потокобезопасен: warmup из фонового потока не мешает
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name: str) -> Any:
+    return LazyModule(name)
+
+
+def _import_all(names: Iterable[str]) -> None:
+    for name in names:
+        importlib.import_module(name)
+
+
+async def warmup(names: Iterable[str]) -> float:
+    """Импортировать модули в фоновом потоке; возвращает затраченные секунды."""
+    names = list(names)
+    t0 = time.perf_counter()
+    try:
+        await asyncio.to_thread(_import_all, names)
+    except Exception:
+        log.exception("Warmup import failed: %s", names)
+    return time.perf_counter() - t0
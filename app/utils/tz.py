@@ -0,0 +1,119 @@
+# app/utils/tz.py
+"""
+Часовые пояса пользователей.
+
+Все метки времени в БД — naive UTC. В локальное время пользователя они переводятся
+только для показа и для деления на сутки (границы «сегодня», «последние 7 дней»).
+"""
+from __future__ import annotations
+
+import os
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Пояс для пользователей, которые его не указали (/timezone)
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "UTC").strip() or "UTC"
+
+_OFFSET_RE = re.compile(r"^(?:UTC|GMT)?\s*([+-])\s*(\d{1,2})$", re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def zone(name: str | None) -> ZoneInfo:
+    """ZoneInfo по имени; пустое или неизвестное имя → DEFAULT_TIMEZONE (или UTC)."""
+    for candidate in (name, DEFAULT_TIMEZONE, "UTC"):
+        if not candidate:
+            continue
+        try:
+            return ZoneInfo(candidate)
+        except (ZoneInfoNotFoundError, ValueError):
+            continue
+    return ZoneInfo("UTC")
+
+
+def parse_timezone(text: str) -> str | None:
+    """
+    Имя IANA («Europe/Moscow») или смещение («+3», «UTC-5») → имя пояса для хранения.
+    Неизвестное → None.
+    """
+    text = text.strip()
+    m = _OFFSET_RE.match(text)
+    if m:
+        hours = int(m.group(2))
+        if hours > 14:
+            return None
+        if hours == 0:
+            return "UTC"
+        # в Etc/GMT знак обратный: UTC+3 == Etc/GMT-3
+        return f"Etc/GMT{'-' if m.group(1) == '+' else '+'}{hours}"
+    try:
+        ZoneInfo(text)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+    return text
+
+
+def label(name: str) -> str:
+    """Имя пояса для показа: Etc/GMT-3 → UTC+3 (знак в Etc/GMT обратный)."""
+    if name.startswith("Etc/GMT") and len(name) > 7:
+        sign = "+" if name[7] == "-" else "-"
+        return f"UTC{sign}{name[8:]}"
+    return name
+
+
+def utcnow() -> datetime:
+    """Текущее время как naive UTC (так хранятся метки времени в БД)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_local(dt: datetime, tz: str | None) -> datetime:
+    """naive UTC → naive локальное время пользователя."""
+    return dt.replace(tzinfo=timezone.utc).astimezone(zone(tz)).replace(tzinfo=None)
+
+
+def local_today(tz: str | None) -> date:
+    return datetime.now(zone(tz)).date()
+
+
+def day_start_utc(day: date, tz: str | None) -> datetime:
+    """Начало локальных суток `day` как naive UTC."""
+    local = datetime.combine(day, time.min, tzinfo=zone(tz))
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _offset_minutes(z: ZoneInfo, utc: datetime) -> int:
+    return int(utc.replace(tzinfo=timezone.utc).astimezone(z).utcoffset().total_seconds() // 60)
+
+
+def offset_segments(tz: str | None, start: datetime, end: datetime) -> list[tuple[datetime | None, int]]:
+    """
+    Смещение пояса (в минутах) на отрезке [start, end] naive UTC:
+    [(граница, смещение до неё), ..., (None, последнее смещение)].
+    Переходы DST ищутся шагом в сутки и уточняются бисекцией до секунды.
+    """
+    z = zone(tz)
+    segments: list[tuple[datetime | None, int]] = []
+    cur = start
+    off = _offset_minutes(z, cur)
+    step = timedelta(days=1)
+    while cur < end:
+        nxt = min(cur + step, end)
+        nxt_off = _offset_minutes(z, nxt)
+        if nxt_off != off:
+            lo, hi = cur, nxt  # смещение меняется в (lo, hi]
+            while hi - lo > timedelta(seconds=1):
+                mid = lo + (hi - lo) / 2
+                if _offset_minutes(z, mid) == off:
+                    lo = mid
+                else:
+                    hi = mid
+            # переходы бывают только на целых секундах
+            whole = hi.replace(microsecond=0)
+            if _offset_minutes(z, whole) != off:
+                hi = whole
+            segments.append((hi, off))
+            off = nxt_off
+        cur = nxt
+    segments.append((None, off))
+    return segments
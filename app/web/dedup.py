@@ -0,0 +1,114 @@
+# app/web/dedup.py
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import delete
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.db.database import AsyncSessionLocal, dialect_insert
+from app.db.models import ProcessedUpdate
+
+log = logging.getLogger(__name__)
+
+
+class UpdateDeduplicator:
+    """
+    Отсекает повторно доставленные апдейты по update_id.
+
+    Первый уровень — LRU в памяти процесса (последние `capacity` id).
+    Второй (опционально, use_db=True) — таблица processed_updates, общая
+    для всех воркеров: вставка с ON CONFLICT DO NOTHING атомарно решает,
+    кто из них «первым» увидел апдейт.
+    """
+
+    def __init__(self, capacity: int = 10_000, *, use_db: bool = False, db_ttl_hours: int = 24) -> None:
+        self._capacity = max(1, capacity)
+        self._recent: OrderedDict[int, None] = OrderedDict()
+        self._use_db = use_db
+        self._db_ttl = timedelta(hours=db_ttl_hours)
+        self._inserts_since_cleanup = 0
+
+        # метрики
+        self.checked = 0
+        self.duplicates_memory = 0
+        self.duplicates_db = 0
+        self.db_errors = 0
+
+    def _remember(self, update_id: int) -> None:
+        self._recent[update_id] = None
+        self._recent.move_to_end(update_id)
+        while len(self._recent) > self._capacity:
+            self._recent.popitem(last=False)
+
+    async def is_duplicate(self, update_id: int) -> bool:
+        """True — апдейт уже видели; иначе запоминает его и возвращает False."""
+        self.checked += 1
+        if update_id in self._recent:
+            self._recent.move_to_end(update_id)
+            self.duplicates_memory += 1
+            return True
+
+        self._remember(update_id)
+        if not self._use_db:
+            return False
+
+        try:
+            async with AsyncSessionLocal() as session:
+                stmt = (
+                    dialect_insert(ProcessedUpdate)
+                    .values(update_id=update_id, received_at=datetime.utcnow())
+                    .on_conflict_do_nothing(index_elements=[ProcessedUpdate.update_id])
+                    .returning(ProcessedUpdate.update_id)
+                )
+                inserted = (await session.execute(stmt)).first() is not None
+                await self._maybe_cleanup(session)
+                await session.commit()
+        except SQLAlchemyError:
+            # БД недоступна — лучше обработать апдейт, чем потерять его
+            self.db_errors += 1
+            log.exception("Dedup table check failed for update_id=%s", update_id)
+            return False
+
+        if not inserted:
+            self.duplicates_db += 1
+            return True
+        return False
+
+    async def forget(self, update_id: int) -> None:
+        """Снять отметку (апдейт не принят, например очередь полна — Telegram повторит)."""
+        self._recent.pop(update_id, None)
+        if not self._use_db:
+            return
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(delete(ProcessedUpdate).where(ProcessedUpdate.update_id == update_id))
+                await session.commit()
+        except SQLAlchemyError:
+            self.db_errors += 1
+            log.exception("Dedup forget failed for update_id=%s", update_id)
+
+    async def _maybe_cleanup(self, session) -> None:
+        # Старые id не нужны: Telegram повторяет доставку не дольше суток
+        self._inserts_since_cleanup += 1
+        if self._inserts_since_cleanup < 1000:
+            return
+        self._inserts_since_cleanup = 0
+        border = datetime.utcnow() - self._db_ttl
+        await session.execute(delete(ProcessedUpdate).where(ProcessedUpdate.received_at < border))
+
+    def stats(self) -> dict[str, Any]:
+        dups = self.duplicates_memory + self.duplicates_db
+        return {
+            "checked": self.checked,
+            "duplicates": dups,
+            "duplicates_memory": self.duplicates_memory,
+            "duplicates_db": self.duplicates_db,
+            "hit_rate": round(dups / self.checked, 4) if self.checked else 0.0,
+            "memory_size": len(self._recent),
+            "use_db": self._use_db,
+            "db_errors": self.db_errors,
+        }
@@ -1,21 +1,37 @@
 from __future__ import annotations
 
+import time
+
+_IMPORT_STARTED = time.perf_counter()  # отчёт о холодном старте: сколько заняли импорты ниже
+
 import asyncio
 import logging
 import os
 from pathlib import Path
 
 from fastapi import FastAPI, Request, Header, HTTPException, Query
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from aiogram.types import Update
 from sqlalchemy.exc import SQLAlchemyError
 
+from app.bot import reminders_worker
+from app.bot.middlewares.context import query_stats
 from app.bot.runner import build_bot, build_dispatcher, setup_logging
-from app.db.database import async_engine  # см. свои пути, если отличаются
-from app.db.models import Base            # здесь metadata всех таблиц
+from app.db.migrations import migrate
+from app.db.database import get_session
+from app.services import chart_data, identity
+from app.services.users import load_user_context
+from app.utils import chart_cache, chart_pool, fastjson, lazy
+from app.utils.tz import zone
+from app.web.dedup import UpdateDeduplicator
+from app.web.scheduler import UpdateScheduler, update_shard_key
+from app.web.update_queue import UpdateQueue
+from app.web import webapp_auth, webhook_reply
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
 # ---------------------- Базовая настройка FastAPI ----------------------
 BASE_DIR = Path(__file__).resolve().parent  # .../app/web
@@ -34,14 +50,126 @@ TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
 WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip()              # БЕЗ завершающего '/'
 WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "").strip()
 
+# Очередь апдейтов: вебхук сразу отвечает 200, обработка идёт в фоне;
+# WEBHOOK_WORKERS — сколько апдейтов обрабатывается одновременно в этом режиме
+WEBHOOK_QUEUE = os.getenv("WEBHOOK_QUEUE", "0").strip() == "1"
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_QUEUE_PUT_TIMEOUT = float(os.getenv("WEBHOOK_QUEUE_PUT_TIMEOUT", "2.0"))
+
+# Параллельная обработка разных чатов (внутри одного чата — строго по порядку)
+UPDATE_MAX_CONCURRENCY = int(os.getenv("UPDATE_MAX_CONCURRENCY", "32"))
+UPDATE_MAX_PENDING = int(os.getenv("UPDATE_MAX_PENDING", "10000"))
+
+# Ответ на апдейт прямо в HTTP-ответе вебхука (экономит один запрос к Bot API).
+# Работает только без очереди: при очереди ответ уходит до обработки.
+WEBHOOK_REPLY = os.getenv("WEBHOOK_REPLY", "0").strip() == "1"
+
+# Защита от повторной доставки: последние update_id в памяти (+ общая таблица)
+WEBHOOK_DEDUP_SIZE = int(os.getenv("WEBHOOK_DEDUP_SIZE", "10000"))
+WEBHOOK_DEDUP_DB = os.getenv("WEBHOOK_DEDUP_DB", "0").strip() == "1"
+
+# Напоминания рассылает каждый воркер веб-сервиса: строки делятся арендой в БД
+# (app.bot.reminders_worker), так что дублей нет при любом числе воркеров и инстансов.
+# Лимит Telegram делится на TELEGRAM_SENDERS (по умолчанию WEB_CONCURRENCY) процессов.
+REMINDERS_WORKER = os.getenv("REMINDERS_WORKER", "1").strip() == "1"
+
+# Тяжёлые модули (numpy, аналитика, matplotlib в воркерах графиков) не грузятся при
+# импорте — их догружает фоновый прогрев через WARMUP_DELAY секунд после старта,
+# чтобы первый вебхук после холодного старта не ждал их.
+WARMUP = os.getenv("WARMUP", "1").strip() == "1"
+WARMUP_DELAY = float(os.getenv("WARMUP_DELAY", "2.0"))
+_WARMUP_MODULES = ("app.services.sleep_analytics", "app.services.heatmap")
+
+# Данные графиков мини-приложения: клиент может держать ответ столько секунд
+WEBAPP_CHARTS_MAX_AGE = int(os.getenv("WEBAPP_CHARTS_MAX_AGE", "60"))
+_HEATMAP_DAYS = (7, 14, 28, 56, 91)
+heatmap = lazy.lazy_import("app.services.heatmap")
+
+# Холодный старт: импорты, on_startup, фоновый прогрев (секунды)
+startup_report: dict[str, float | None] = {
+    "imports": round(IMPORT_SECONDS, 3), "startup": None, "warmup_imports": None, "warmup_charts": None,
+}
+
 # ---------------------- aiogram: Bot & Dispatcher ----------------------
 bot = build_bot(TELEGRAM_BOT_TOKEN) if TELEGRAM_BOT_TOKEN else None
 dp = build_dispatcher()
 
+if bot and WEBHOOK_REPLY:
+    bot.session.middleware(webhook_reply.WebhookReplyMiddleware())
+
+# Типы апдейтов, на которые есть хендлеры; остальные отбрасываем до валидации
+USED_UPDATE_TYPES: list[str] = dp.resolve_used_update_types()
+_USED_UPDATE_TYPES_SET = frozenset(USED_UPDATE_TYPES)
+
 # Целевой URL вебхука (заполним на старте)
 TARGET_WEBHOOK: str | None = None
 
 
+def _is_routed(data: dict) -> bool:
+    """Есть ли в сыром апдейте хотя бы один тип события, который обрабатывают роутеры."""
+    return any(key in _USED_UPDATE_TYPES_SET for key in data if key != "update_id")
+
+
+async def _process_update(update: Update) -> None:
+    await dp.feed_update(bot, update)
+
+
+dedup = UpdateDeduplicator(WEBHOOK_DEDUP_SIZE, use_db=WEBHOOK_DEDUP_DB)
+
+async def _process_update_with_reply(update: Update) -> dict | None:
+    """
+    Обрабатывает апдейт, собирая последний подходящий вызов Bot API.
+    Возвращает JSON для ответа вебхука или None (всё уже отправлено запросами).
+    """
+    reply = webhook_reply.WebhookReply()
+    token = webhook_reply.activate(reply)
+    try:
+        await dp.feed_update(bot, update)
+    except Exception:
+        # Ответ вебхука при ошибке не дойдёт — отправляем отложенное сразу
+        reply.closed = True
+        await reply.flush(bot)
+        raise
+    finally:
+        webhook_reply.deactivate(token)
+
+    method = reply.close()
+    if method is None:
+        return None
+    payload = webhook_reply.build_reply_payload(bot, method)
+    if payload is None:
+        await bot(method)
+    return payload
+
+
+scheduler = UpdateScheduler(
+    max_concurrency=UPDATE_MAX_CONCURRENCY,
+    max_pending=UPDATE_MAX_PENDING,
+)
+
+
+async def _schedule_update(update: Update) -> None:
+    """
+    Консьюмер очереди: выполняет апдейт в шарде своего чата и ждёт конца обработки —
+    так пул консьюмеров ограничивает параллельность, а метрики очереди считают
+    саму обработку, а не передачу в шард.
+    """
+    await scheduler.run(update_shard_key(update), lambda: _process_update(update))
+
+
+update_queue: UpdateQueue | None = (
+    UpdateQueue(
+        _schedule_update,
+        maxsize=WEBHOOK_QUEUE_SIZE,
+        workers=WEBHOOK_WORKERS,
+        put_timeout=WEBHOOK_QUEUE_PUT_TIMEOUT,
+    )
+    if WEBHOOK_QUEUE
+    else None
+)
+
+
 # ---------------------- Вспомогательные функции ----------------------
 async def set_webhook_with_retry() -> None:
     """
@@ -58,7 +186,7 @@ async def set_webhook_with_retry() -> None:
                     url=TARGET_WEBHOOK,
                     secret_token=(WEBHOOK_SECRET or None),
                     drop_pending_updates=False,  # не теряем ожидающие апдейты
-                    allowed_updates=["message", "callback_query"],
+                    allowed_updates=USED_UPDATE_TYPES,
                 )
                 logger.info("Webhook set to %s", TARGET_WEBHOOK)
             else:
@@ -84,19 +212,39 @@ async def webhook_keeper() -> None:
         await asyncio.sleep(600)  # 10 минут
 
 
+async def warmup() -> None:
+    await asyncio.sleep(WARMUP_DELAY)
+    startup_report["warmup_imports"] = round(await lazy.warmup(_WARMUP_MODULES), 3)
+    t0 = time.perf_counter()
+    try:
+        await chart_pool.pool.warm()
+    except Exception:
+        logger.exception("Chart pool warmup failed")
+    startup_report["warmup_charts"] = round(time.perf_counter() - t0, 3)
+    logger.info("Warmup done: %s", startup_report)
+
+
 # ---------------------- Хуки жизненного цикла ----------------------
 @app.on_event("startup")
 async def on_startup() -> None:
-    # 1) Создаём таблицы в БД (SQLite/Postgres) если их ещё нет
+    started = time.perf_counter()
+    # 1) Создаём недостающие таблицы и применяем миграции схемы (индексы и т.п.)
     try:
-        async with async_engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-        logger.info("DB schema is ready.")
+        await migrate()
     except SQLAlchemyError:
         logger.exception("DB init failed")
         raise
 
-    # 2) Ставим вебхук + запускаем сторожа
+    # 2) Общий канал сброса identity-кэша между воркерами (если включён)
+    identity.start_listener()
+
+    # 3) Пул обработчиков очереди апдейтов (если включён)
+    if update_queue is not None:
+        update_queue.start()
+        if WEBHOOK_REPLY:
+            logger.warning("WEBHOOK_REPLY is ignored while WEBHOOK_QUEUE is enabled.")
+
+    # 4) Ставим вебхук + запускаем сторожа
     if bot and WEBHOOK_URL:
         global TARGET_WEBHOOK
         TARGET_WEBHOOK = f"{WEBHOOK_URL.rstrip('/')}/webhook/telegram"
@@ -105,12 +253,33 @@ async def on_startup() -> None:
     else:
         logger.warning("Bot token or WEBHOOK_URL is empty; webhook will not be set.")
 
+    # 5) Рассылка напоминаний
+    if bot and REMINDERS_WORKER:
+        app.state.reminders_stop = asyncio.Event()
+        app.state.reminders_task = asyncio.create_task(
+            reminders_worker.reminders_worker(bot, app.state.reminders_stop)
+        )
+
+    # 6) Отчёт о холодном старте и фоновый прогрев тяжёлых модулей
+    startup_report["startup"] = round(time.perf_counter() - started, 3)
+    logger.info("Cold start: imports %.3fs, startup %.3fs", IMPORT_SECONDS, startup_report["startup"])
+    if WARMUP:
+        app.state.warmup_task = asyncio.create_task(warmup())
+
 
 @app.on_event("shutdown")
 async def on_shutdown() -> None:
-    # НИЧЕГО НЕ УДАЛЯЕМ: не трогаем webhook на выключении,
-    # чтобы он не очищался при перезапусках на хостинге.
-    pass
+    # НЕ УДАЛЯЕМ webhook на выключении, чтобы он не очищался
+    # при перезапусках на хостинге. Только дорабатываем очередь.
+    if update_queue is not None:
+        await update_queue.stop()
+    # очередь лишь раздала апдейты по шардам — дожидаемся самой обработки
+    await scheduler.stop()
+    if getattr(app.state, "reminders_task", None) is not None:
+        app.state.reminders_stop.set()
+        await asyncio.gather(app.state.reminders_task, return_exceptions=True)
+    await identity.listener.stop()
+    chart_pool.pool.stop()
 
 
 # ---------------------- Маршруты WebApp ----------------------
@@ -122,6 +291,60 @@ async def index(request: Request):
     )
 
 
+# ---------------------- Данные графиков для мини-приложения ----------------------
+# Сервер отдаёт готовые суточные ряды, рисует браузер (canvas в index.html) —
+# для пользователей мини-приложения matplotlib не запускается вовсе.
+async def _webapp_context(session, authorization: str | None) -> tuple[int, str]:
+    """(id активного ребёнка, часовой пояс) пользователя из подписанного initData."""
+    if not TELEGRAM_BOT_TOKEN:
+        raise HTTPException(status_code=503, detail="Bot is not configured")
+    try:
+        tg_user = webapp_auth.user_from_header(authorization, TELEGRAM_BOT_TOKEN)
+    except webapp_auth.InitDataError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+    snapshot = identity.users.get(tg_user.id)
+    if snapshot is None:
+        user, settings, baby, family_id = await load_user_context(session, tg_user)
+        if user is None:
+            raise HTTPException(status_code=404, detail="user not found")
+        snapshot = identity.IdentitySnapshot.capture(user, settings, baby, family_id)
+        identity.remember(tg_user.id, snapshot)
+    if snapshot.baby is None:
+        raise HTTPException(status_code=404, detail="no baby profile")
+    tz = zone(snapshot.settings["timezone"] if snapshot.settings else None).key
+    return snapshot.baby["id"], tz
+
+
+def _json(data: dict) -> Response:
+    return Response(
+        fastjson.dumps(data),
+        media_type="application/json",
+        headers={"Cache-Control": f"private, max-age={WEBAPP_CHARTS_MAX_AGE}"},
+    )
+
+
+@app.get("/api/charts")
+async def charts_data(days: int = Query(7), authorization: str | None = Header(None)):
+    """Сон (минуты днём/ночью), кормления (мл/г) по дням и замеры роста активного ребёнка."""
+    if days not in chart_data.sleep_analytics.RANGES:
+        raise HTTPException(status_code=400, detail=f"days must be one of {chart_data.sleep_analytics.RANGES}")
+    async with get_session() as session:
+        baby_id, tz = await _webapp_context(session, authorization)
+        return _json(await chart_data.summary(session, baby_id, tz, days))
+
+
+@app.get("/api/charts/heatmap")
+async def charts_heatmap(days: int = Query(28), authorization: str | None = Header(None)):
+    """Режим дня: минуты сна по 15-минутным слотам и кормления (app.services.heatmap)."""
+    if days not in _HEATMAP_DAYS:
+        raise HTTPException(status_code=400, detail=f"days must be one of {_HEATMAP_DAYS}")
+    async with get_session() as session:
+        baby_id, tz = await _webapp_context(session, authorization)
+        hm = await heatmap.build(session, baby_id, tz, days)
+        return _json(hm.to_json())
+
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
@@ -139,9 +362,43 @@ async def telegram_webhook(
         # но в продакшене лучше 403:
         raise HTTPException(status_code=403, detail="invalid secret")
 
-    data = await request.json()
-    update = Update.model_validate(data)
-    await dp.feed_update(bot, update)
+    data = fastjson.loads(await request.body())
+
+    # Апдейт типа, который ни один роутер не обрабатывает, — не валидируем вовсе
+    if not _is_routed(data):
+        return JSONResponse({"ok": True})
+
+    # Повторная доставка того же апдейта — подтверждаем, но не обрабатываем
+    update_id = data.get("update_id")
+    if isinstance(update_id, int) and await dedup.is_duplicate(update_id):
+        return JSONResponse({"ok": True})
+
+    try:
+        update = Update.model_validate(data)
+    except Exception:
+        # id уже записан как принятый — иначе повтор этого апдейта отбросится как дубль
+        if isinstance(update_id, int):
+            await dedup.forget(update_id)
+        raise
+
+    if update_queue is not None:
+        # Быстрый ответ: кладём в очередь; если она переполнена —
+        # отвечаем 503, Telegram повторит доставку позже.
+        if not await update_queue.put(update):
+            await dedup.forget(update.update_id)
+            raise HTTPException(status_code=503, detail="update queue is full")
+        return JSONResponse({"ok": True})
+
+    use_reply = WEBHOOK_REPLY and bot is not None
+    process = _process_update_with_reply if use_reply else _process_update
+    try:
+        result = await scheduler.run(update_shard_key(update), lambda: process(update))
+    except Exception:
+        # Ответим ошибкой — пусть повторная доставка не считается дублем
+        await dedup.forget(update.update_id)
+        raise
+    if use_reply and result:
+        return JSONResponse(result)
     return JSONResponse({"ok": True})
 
 
@@ -177,3 +434,26 @@ async def reset_webhook(authorization: str | None = Header(None)):
         raise HTTPException(status_code=500, detail="bot or webhook url is not ready")
     await set_webhook_with_retry()
     return {"ok": True, "url": TARGET_WEBHOOK}
+
+
+# ---------------------- Метрики (опционально) ----------------------
+@app.get("/admin/metrics")
+async def metrics(authorization: str | None = Header(None)):
+    """
+    Метрики обработки апдейтов:
+    curl https://<домен>/admin/metrics -H "Authorization: Bearer <WEBHOOK_SECRET>"
+    """
+    if not WEBHOOK_SECRET or authorization != f"Bearer {WEBHOOK_SECRET}":
+        raise HTTPException(status_code=403, detail="forbidden")
+    return {
+        "update_queue": update_queue.stats() if update_queue is not None else None,
+        "scheduler": scheduler.stats(),
+        "dedup": dedup.stats(),
+        "db_queries_per_update": query_stats(),
+        "identity_cache": identity.stats(),
+        "charts": chart_pool.stats(),
+        "chart_cache": chart_cache.stats(),
+        "reminders": reminders_worker.stats(),
+        "startup": startup_report,
+        "webhook_reply": dict(webhook_reply.stats) if WEBHOOK_REPLY else None,
+    }
@@ -0,0 +1,176 @@
+# app/web/scheduler.py
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Hashable
+
+from aiogram.types import Update
+
+log = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[Any]]
+
+
+def update_shard_key(update: Update) -> Hashable | None:
+    """
+    Ключ шарда для апдейта: чат, а если его нет — пользователь.
+    Апдейты с одним ключом выполняются строго по очереди.
+    """
+    event = update.event
+    chat = getattr(event, "chat", None)
+    if chat is None:
+        msg = getattr(event, "message", None)
+        chat = getattr(msg, "chat", None)
+    if chat is not None:
+        return ("chat", chat.id)
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return ("user", user.id)
+    return None
+
+
+class UpdateScheduler:
+    """
+    Планировщик перед Dispatcher.feed_update: внутри одного шарда (чата)
+    задачи идут в порядке поступления, разные шарды — параллельно.
+
+    Для каждого шарда держим только очередь ожидающих задач; как только она
+    опустела, шард удаляется — память пропорциональна числу чатов «в работе»,
+    а не числу всех пользователей.
+    """
+
+    def __init__(self, *, max_concurrency: int = 32, max_pending: int = 10_000) -> None:
+        self._shards: dict[Hashable, deque[tuple[Job, asyncio.Future | None]]] = {}
+        self._sem = asyncio.Semaphore(max(1, max_concurrency))
+        self._max_concurrency = max(1, max_concurrency)
+        self._max_pending = max(1, max_pending)
+        self._pending = 0
+        # event loop держит на задачи только слабые ссылки — без этого drain может собрать GC
+        self._tasks: set[asyncio.Task] = set()
+        self._closed = False
+        self._has_room = asyncio.Event()
+        self._has_room.set()
+
+        # метрики
+        self.running = 0
+        self.processed = 0
+        self.failed = 0
+        self.shards_created = 0
+        self.max_shards = 0
+
+    async def dispatch(self, key: Hashable | None, job: Job) -> None:
+        """Ставит задачу в шард и не ждёт её выполнения (ошибки только логируются)."""
+        await self._enqueue(key, job, None)
+
+    async def run(self, key: Hashable | None, job: Job) -> Any:
+        """Ставит задачу в шард и ждёт результата."""
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self._enqueue(key, job, fut)
+        return await fut
+
+    async def _enqueue(self, key: Hashable | None, job: Job, fut: asyncio.Future | None) -> None:
+        if self._closed:
+            raise RuntimeError("update scheduler is stopped")
+        # backpressure: не даём бесконечно копить ожидающие задачи
+        while self._pending >= self._max_pending:
+            self._has_room.clear()
+            await self._has_room.wait()
+        self._pending += 1
+
+        if key is None:
+            # без ключа порядок не важен — отдельный «одноразовый» шард
+            self._spawn(None, deque([(job, fut)]))
+            return
+
+        shard = self._shards.get(key)
+        if shard is not None:
+            shard.append((job, fut))
+            return
+
+        shard = deque([(job, fut)])
+        self._shards[key] = shard
+        self.shards_created += 1
+        if len(self._shards) > self.max_shards:
+            self.max_shards = len(self._shards)
+        self._spawn(key, shard)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Перестаёт принимать задачи и ждёт уже поставленные (не дольше timeout),
+        затем отменяет оставшиеся. Вызывать на выключении после очереди апдейтов:
+        те апдейты Telegram уже получил с ответом 200 и повторно не пришлёт.
+        """
+        self._closed = True
+        if not self._tasks:
+            return
+        _, left = await asyncio.wait(set(self._tasks), timeout=timeout)
+        if left:
+            log.warning("Update scheduler: %s updates left unfinished on shutdown", self._pending)
+            for t in left:
+                t.cancel()
+            await asyncio.gather(*left, return_exceptions=True)
+
+    def _spawn(self, key: Hashable | None, shard: deque) -> None:
+        task = asyncio.create_task(self._drain(key, shard))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    def _abort(key: Hashable | None, fut: asyncio.Future | None) -> None:
+        # ошибка, а не отмена: вызывающий (вебхук) ответит 500 и снимет update_id с учёта дублей
+        if fut is not None and not fut.done():
+            fut.set_exception(RuntimeError(f"update job cancelled (shard={key})"))
+
+    async def _drain(self, key: Hashable | None, shard: deque) -> None:
+        try:
+            while shard:
+                job, fut = shard.popleft()
+                try:
+                    async with self._sem:
+                        self.running += 1
+                        try:
+                            result = await job()
+                        except Exception as e:  # noqa: BLE001
+                            self.failed += 1
+                            if fut is None:
+                                log.exception("Scheduled update failed (shard=%s)", key)
+                            elif not fut.done():
+                                fut.set_exception(e)
+                        else:
+                            self.processed += 1
+                            if fut is not None and not fut.done():
+                                fut.set_result(result)
+                        finally:
+                            self.running -= 1
+                except BaseException:
+                    # отмена (CancelledError) — ждущий этой задачи не должен висеть
+                    self.failed += 1
+                    self._abort(key, fut)
+                    raise
+                finally:
+                    self._pending -= 1
+                    self._has_room.set()
+        finally:
+            # шард пуст — выселяем (между проверкой и удалением нет await)
+            if key is not None and self._shards.get(key) is shard:
+                del self._shards[key]
+            # прервались на отмене — оставшиеся в шарде уже не выполнятся: освобождаем места
+            while shard:
+                _, fut = shard.popleft()
+                self._pending -= 1
+                self._abort(key, fut)
+            self._has_room.set()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "shards": len(self._shards),
+            "max_shards": self.max_shards,
+            "shards_created": self.shards_created,
+            "pending": self._pending,
+            "running": self.running,
+            "max_concurrency": self._max_concurrency,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
@@ -0,0 +1,130 @@
+# app/web/update_queue.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+log = logging.getLogger(__name__)
+
+
+class UpdateQueue:
+    """
+    Ограниченная очередь апдейтов между вебхуком и диспетчером.
+
+    Вебхук кладёт апдейт через put() и сразу отвечает Telegram 200,
+    а пул из `workers` фоновых задач разбирает очередь и вызывает handler.
+    Консьюмер ждёт handler до конца, так что одновременно обрабатывается
+    не больше `workers` апдейтов, и очередь растёт, когда обработка не успевает.
+    Если очередь полна дольше `put_timeout` секунд — put() возвращает False
+    (backpressure: вебхук отвечает ошибкой, и Telegram повторит доставку позже).
+
+    Метрики: wait — от put() до начала обработки, latency — от put() до её конца.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[Any]],
+        *,
+        maxsize: int = 1000,
+        workers: int = 8,
+        put_timeout: float = 2.0,
+    ) -> None:
+        self._handler = handler
+        self._queue: asyncio.Queue[tuple[float, Any]] = asyncio.Queue(maxsize=maxsize)
+        self._workers_count = max(1, workers)
+        self._put_timeout = put_timeout
+        self._tasks: list[asyncio.Task] = []
+
+        # метрики
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    # --- жизненный цикл ---
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        for i in range(self._workers_count):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"update-worker-{i}"))
+        log.info("Update queue started: maxsize=%s workers=%s", self._queue.maxsize, self._workers_count)
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """Даёт воркерам дообработать очередь (не дольше drain_timeout), затем гасит их."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            log.warning("Update queue: %s updates left undrained on shutdown", self._queue.qsize())
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    # --- продюсер ---
+
+    async def put(self, item: Any) -> bool:
+        entry = (time.monotonic(), item)
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(entry), timeout=self._put_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+        self.enqueued += 1
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    # --- консьюмеры ---
+
+    async def _worker(self) -> None:
+        while True:
+            enqueued_at, item = await self._queue.get()
+            wait = time.monotonic() - enqueued_at
+            self.wait_total += wait
+            if wait > self.wait_max:
+                self.wait_max = wait
+            try:
+                await self._handler(item)
+                self.processed += 1
+            except Exception:  # noqa: BLE001
+                self.failed += 1
+                log.exception("Update handler failed")
+            finally:
+                latency = time.monotonic() - enqueued_at
+                self.latency_total += latency
+                if latency > self.latency_max:
+                    self.latency_max = latency
+                self._queue.task_done()
+
+    # --- метрики ---
+
+    def stats(self) -> dict[str, Any]:
+        taken = self.processed + self.failed
+        return {
+            "depth": self._queue.qsize(),
+            "maxsize": self._queue.maxsize,
+            "max_depth": self.max_depth,
+            "workers": self._workers_count,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_avg_ms": round(self.wait_total / taken * 1000, 2) if taken else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 2),
+            "latency_avg_ms": round(self.latency_total / taken * 1000, 2) if taken else 0.0,
+            "latency_max_ms": round(self.latency_max * 1000, 2),
+        }
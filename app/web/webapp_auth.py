@@ -0,0 +1,68 @@
+# app/web/webapp_auth.py
+"""
+Проверка initData мини-приложения Telegram.
+
+Клиент передаёт строку Telegram.WebApp.initData в заголовке
+`Authorization: tma <initData>`. Подпись — HMAC-SHA256 отсортированных пар
+key=value (без hash) ключом HMAC-SHA256("WebAppData", токен бота):
+https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+import time
+from typing import Any
+from urllib.parse import parse_qsl
+
+from aiogram import types
+
+from app.utils import fastjson
+
+# Сколько живёт initData после auth_date, секунд (0 — не проверять)
+WEBAPP_AUTH_MAX_AGE = int(os.getenv("WEBAPP_AUTH_MAX_AGE", str(24 * 3600)))
+
+
+class InitDataError(ValueError):
+    """initData отсутствует, подделан или устарел."""
+
+
+def _secret(bot_token: str) -> bytes:
+    return hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+
+
+def sign(fields: dict[str, str], bot_token: str) -> str:
+    """hash для набора полей initData (без самого hash)."""
+    check = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    return hmac.new(_secret(bot_token), check.encode(), hashlib.sha256).hexdigest()
+
+
+def validate(init_data: str, bot_token: str, *, max_age: int = WEBAPP_AUTH_MAX_AGE) -> dict[str, Any]:
+    """Поля initData после проверки подписи; `user` уже разобран из JSON."""
+    if not init_data or not bot_token:
+        raise InitDataError("init data is empty")
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received = fields.pop("hash", "")
+    if not received or not hmac.compare_digest(sign(fields, bot_token), received):
+        raise InitDataError("bad signature")
+    try:
+        auth_date = int(fields.get("auth_date", "0"))
+    except ValueError:
+        raise InitDataError("bad auth_date") from None
+    if max_age and time.time() - auth_date > max_age:
+        raise InitDataError("init data expired")
+    if "user" in fields:
+        fields["user"] = fastjson.loads(fields["user"])
+    return fields
+
+
+def user_from_header(authorization: str | None, bot_token: str) -> types.User:
+    """Пользователь Telegram из заголовка `Authorization: tma <initData>`."""
+    scheme, _, init_data = (authorization or "").partition(" ")
+    if scheme.lower() != "tma":
+        raise InitDataError("expected 'Authorization: tma <initData>'")
+    fields = validate(init_data.strip(), bot_token)
+    if not isinstance(fields.get("user"), dict):
+        raise InitDataError("no user in init data")
+    return types.User.model_validate(fields["user"])
@@ -0,0 +1,119 @@
+# app/web/webhook_reply.py
+from __future__ import annotations
+
+from contextvars import ContextVar, Token
+from datetime import datetime
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import (
+    AnswerCallbackQuery,
+    DeleteMessage,
+    SendChatAction,
+    SendMessage,
+    TelegramMethod,
+)
+from aiogram.types import Chat, Message
+
+# Методы, результат которых хендлеры не используют, — их можно отдать телом ответа вебхука.
+# Всё остальное (answer_photo и т.п., где нужен file_id) всегда идёт обычным запросом.
+_BOOL_METHODS = (AnswerCallbackQuery, SendChatAction, DeleteMessage)
+
+_current: ContextVar["WebhookReply | None"] = ContextVar("webhook_reply", default=None)
+
+# метрики
+stats: dict[str, int] = {"replied_inline": 0, "flushed": 0, "passthrough": 0}
+
+
+class WebhookReply:
+    """
+    Отложенный вызов Bot API для одного апдейта.
+
+    Держим не более одного метода. Любой следующий вызов сначала отправляет
+    отложенный обычным запросом — так порядок сообщений не меняется, а в ответ
+    вебхука уходит последний подходящий вызов хендлера.
+    """
+
+    def __init__(self) -> None:
+        self.method: TelegramMethod[Any] | None = None
+        self.closed = False
+
+    async def flush(self, bot: Bot, make_request: NextRequestMiddlewareType | None = None) -> None:
+        method, self.method = self.method, None
+        if method is None:
+            return
+        stats["flushed"] += 1
+        if make_request is not None:
+            await make_request(bot, method)
+        else:
+            await bot(method)
+
+    def close(self) -> TelegramMethod[Any] | None:
+        """Закрыть сбор (дальнейшие вызовы — обычные запросы) и забрать отложенный метод."""
+        self.closed = True
+        method, self.method = self.method, None
+        return method
+
+
+def activate(reply: WebhookReply) -> Token:
+    return _current.set(reply)
+
+
+def deactivate(token: Token) -> None:
+    _current.reset(token)
+
+
+def _placeholder_result(method: TelegramMethod[Any]) -> Any | None:
+    """Результат, который вернём хендлеру вместо настоящего ответа API (None — нельзя отложить)."""
+    if isinstance(method, _BOOL_METHODS):
+        return True
+    if isinstance(method, SendMessage) and isinstance(method.chat_id, int):
+        # Настоящий message_id станет известен только Telegram — хендлеры его не используют
+        return Message(
+            message_id=0,
+            date=datetime.now(),
+            chat=Chat(id=method.chat_id, type="private"),
+            text=method.text,
+        )
+    return None
+
+
+class WebhookReplyMiddleware(BaseRequestMiddleware):
+    """Request-middleware сессии бота: перехватывает подходящие вызовы внутри апдейта."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod[Any],
+    ) -> Any:
+        # make_request возвращает уже «распакованный» результат метода
+        reply = _current.get()
+        if reply is None or reply.closed:
+            return await make_request(bot, method)
+
+        await reply.flush(bot, make_request)
+
+        result = _placeholder_result(method)
+        if result is None:
+            stats["passthrough"] += 1
+            return await make_request(bot, method)
+
+        reply.method = method
+        return result
+
+
+def build_reply_payload(bot: Bot, method: TelegramMethod[Any]) -> dict[str, Any] | None:
+    """JSON-тело ответа вебхука: {"method": ..., <параметры>}. None — если нужны файлы."""
+    files: dict[str, Any] = {}
+    payload: dict[str, Any] = {"method": method.__api_method__}
+    for key, value in method.model_dump(warnings=False).items():
+        value = bot.session.prepare_value(value, bot=bot, files=files, _dumps_json=False)
+        if value is None:
+            continue
+        payload[key] = value
+    if files:
+        return None
+    stats["replied_inline"] += 1
+    return payload
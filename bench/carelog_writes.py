@@ -0,0 +1,95 @@
+# bench/carelog_writes.py
+"""
+Бенчмарк записи действий по уходу: старый путь (commit записи + log_event со своим commit)
+против CareUnitOfWork (запись и CareEvent одним commit).
+
+Работа у путей одинаковая: запись, суточные итоги (rollups) и перенос напоминаний
+правил (reminder_rules) — различается только число commit. Печатает commit и
+SQL-запросов на событие и пропускную способность.
+По умолчанию — временная SQLite-БД в файле (fsync настоящий); можно задать DATABASE_URL.
+
+Запуск из корня репозитория:
+    python -m bench.carelog_writes [N]
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_tmp.name}/bench.db")
+
+from sqlalchemy import event  # noqa: E402
+
+from app.db.database import AsyncSessionLocal, async_engine, count_queries  # noqa: E402
+from app.db.models import Base, Baby, FeedingRecord, User  # noqa: E402
+from app.services import reminder_rules, reminders, rollups  # noqa: E402
+from app.services.carelog import CareUnitOfWork, log_event  # noqa: E402
+
+_commits = [0]
+
+
+@event.listens_for(async_engine.sync_engine, "commit")
+def _on_commit(conn) -> None:
+    _commits[0] += 1
+
+
+async def _setup() -> tuple[int, int]:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        user = User(telegram_id=1, first_name="Bench")
+        session.add(user)
+        await session.flush()
+        baby = Baby(user_id=user.id, name="Bench")
+        session.add(baby)
+        await session.commit()
+        return user.id, baby.id
+
+
+async def old_path(session, user_id: int, baby_id: int) -> None:
+    record = FeedingRecord(baby_id=baby_id, feeding_type="formula", amount_ml=120)
+    session.add(record)
+    found = reminder_rules.events([record])
+    await rollups.apply(session, [(record, rollups.delta(record))])
+    touched = await reminder_rules.stage(session, found)
+    await session.commit()
+    if touched:
+        await reminders.changed(*touched)
+    await log_event(session, actor_user_id=user_id, event_type="feeding", details="смесь 120 мл", baby_id=baby_id)
+
+
+async def new_path(session, user_id: int, baby_id: int) -> None:
+    async with CareUnitOfWork(session, actor_user_id=user_id) as uow:
+        uow.add(FeedingRecord(baby_id=baby_id, feeding_type="formula", amount_ml=120))
+        await uow.event("feeding", "смесь 120 мл", baby_id=baby_id)
+
+
+async def _bench(fn, user_id: int, baby_id: int, n: int) -> tuple[float, float, float]:
+    _commits[0] = 0
+    with count_queries() as counter:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            # как в бою: новая сессия на каждый апдейт
+            async with AsyncSessionLocal() as session:
+                await fn(session, user_id, baby_id)
+        elapsed = time.perf_counter() - t0
+    return _commits[0] / n, counter[0] / n, n / elapsed
+
+
+async def main(n: int) -> None:
+    user_id, baby_id = await _setup()
+    print(f"db: {async_engine.url.render_as_string()}, events: {n}")
+    print(f"{'path':<16}{'commits/ev':>12}{'queries/ev':>12}{'events/s':>10}")
+    for name, fn in (("old (2 commits)", old_path), ("unit of work", new_path)):
+        await _bench(fn, user_id, baby_id, 20)  # прогрев
+        commits, queries, rate = await _bench(fn, user_id, baby_id, n)
+        print(f"{name:<16}{commits:>12.2f}{queries:>12.2f}{rate:>10.0f}")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,69 @@
+# bench/chart_render.py
+"""
+Бенчмарк блокировки event loop построением графиков.
+
+Фоновая задача «тикает» каждые 5 мс и меряет, насколько позже срока просыпается —
+это задержка, которую в это время получили бы апдейты других чатов. Параллельно
+строится N графиков (как stats_feed_7d у нескольких семей сразу):
+inline (прямо в event loop, как раньше), в пуле потоков и в пуле процессов.
+
+Запуск из корня репозитория:
+    python -m bench.chart_render [N]
+"""
+from __future__ import annotations
+
+import asyncio
+import statistics
+import sys
+import time
+
+from app.utils.chart_pool import ChartPool
+from app.utils.charts import bar_chart_png
+
+TICK = 0.005
+
+_KW = dict(
+    title="Кормление (жидкость) за 7 дней, мл",
+    x_labels=["11.10", "12.10", "13.10", "14.10", "15.10", "16.10", "17.10"],
+    values=[480, 520, 610, 560, 590, 640, 300],
+    ylabel="мл",
+)
+
+
+async def _ticker(stop: asyncio.Event, lags: list[float]) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(TICK)
+        lags.append(loop.time() - t0 - TICK)
+
+
+async def _bench(pool: ChartPool, n: int) -> tuple[float, float, float]:
+    await pool.render(bar_chart_png, **_KW)  # прогрев: пул и импорт matplotlib
+    stop, lags = asyncio.Event(), []
+    ticker = asyncio.create_task(_ticker(stop, lags))
+    await asyncio.sleep(TICK * 2)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(pool.render(bar_chart_png, **_KW) for _ in range(n)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await ticker
+    lags.sort()
+    p95 = lags[int(len(lags) * 0.95) - 1] if len(lags) > 1 else lags[-1]
+    return elapsed, max(lags), p95 if lags else 0.0
+
+
+async def main(n: int) -> None:
+    print(f"charts: {n}, tick: {TICK * 1000:.0f} ms")
+    print(f"{'mode':<10}{'wall, ms':>10}{'max stall, ms':>15}{'p95 stall, ms':>15}")
+    for mode in ("inline", "thread", "process"):
+        pool = ChartPool(mode, workers=2, max_concurrency=4, timeout=60)
+        try:
+            elapsed, worst, p95 = await _bench(pool, n)
+        finally:
+            pool.stop()
+        print(f"{pool.stats()['mode']:<10}{elapsed * 1000:>10.0f}{worst * 1000:>15.1f}{p95 * 1000:>15.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 8))
@@ -0,0 +1,130 @@
+# bench/reminder_claim.py
+"""
+Бенчмарк рассылки несколькими воркерами: аренда партий (UPDATE ... RETURNING,
+на PostgreSQL — FOR UPDATE SKIP LOCKED) делит наступившие напоминания между
+ReminderScheduler'ами без дублей.
+
+Воркеры — задачи в одном процессе, у каждого свой worker_id и свой Sender.
+Bot API — заглушка с задержкой --latency. По умолчанию лимит Telegram выключен
+(--rate 0), и воркер упирается в свою параллельность (--concurrency): около
+concurrency/latency сообщений в секунду. Рост с числом воркеров показывает только,
+что аренда делит строки без дублей и ожидания, — в бою весь бот ограничен ~30 сообщ./с,
+и больше воркеров рассылку не ускорят. С --rate 30 каждому Sender достаётся
+rate/воркеров, как при TELEGRAM_SENDERS: пропускная способность при любом числе
+воркеров не выше лимита (пиковая секунда peak/s — до rate + burst: запас bucket
+расходуется в первую секунду).
+
+Печатает время до полной отправки, пропускную способность, пиковую секунду и
+число дублей для 1, 2, 4, ... воркеров.
+
+По умолчанию — временная SQLite-БД в файле; для SKIP LOCKED задайте DATABASE_URL
+на PostgreSQL.
+
+Запуск из корня репозитория:
+    python -m bench.reminder_claim [--reminders 3000] [--workers 1,2,4] [--rate 30]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_tmp.name}/bench.db")
+
+from sqlalchemy import delete, func, insert, select  # noqa: E402
+
+from app.bot.delivery import Sender  # noqa: E402
+from app.bot.reminders_worker import ReminderScheduler  # noqa: E402
+from app.db.database import AsyncSessionLocal, async_engine, get_session  # noqa: E402
+from app.db.models import Base, Reminder, User  # noqa: E402
+from app.utils.tz import utcnow  # noqa: E402
+
+
+class FakeBot:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.sent: Counter[str] = Counter()
+        self.seconds: Counter[int] = Counter()  # отправлено за каждую секунду
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        await asyncio.sleep(self.latency)
+        self.sent[text] += 1
+        self.seconds[int(time.monotonic())] += 1
+
+
+async def _seed(n: int) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(Reminder))
+        user = await session.scalar(select(User).limit(1))
+        if user is None:
+            user = User(telegram_id=1, first_name="Bench")
+            session.add(user)
+            await session.flush()
+        due = utcnow() - timedelta(seconds=1)
+        await session.execute(
+            insert(Reminder),
+            [{"user_id": user.id, "chat_id": 1000 + i, "text": f"#{i}", "next_run": due} for i in range(n)],
+        )
+        await session.commit()
+
+
+async def _left() -> int:
+    async with get_session() as session:
+        return await session.scalar(
+            select(func.count()).select_from(Reminder).where(Reminder.is_active, Reminder.next_run <= utcnow())
+        )
+
+
+async def _run(workers: int, args: argparse.Namespace) -> tuple[float, int, int, int]:
+    await _seed(args.reminders)
+    bot = FakeBot(args.latency)
+    # лимит бота делится между воркерами, как TELEGRAM_SENDERS в app.bot.delivery
+    rate, burst = (args.rate / workers, max(1, int(args.rate) // workers)) if args.rate else (1e6, 1_000_000)
+    stop = asyncio.Event()
+    schedulers = [
+        ReminderScheduler(
+            bot,
+            batch=args.batch,
+            worker_id=f"bench-{i}",
+            sender=Sender(bot, rate=rate, burst=burst, concurrency=args.concurrency),
+        )
+        for i in range(workers)
+    ]
+    t0 = time.perf_counter()
+    tasks = [asyncio.create_task(s.run(stop)) for s in schedulers]
+    while await _left():
+        await asyncio.sleep(0.2)
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await asyncio.gather(*tasks)
+    duplicates = sum(c - 1 for c in bot.sent.values() if c > 1)
+    return elapsed, len(bot.sent), max(bot.seconds.values(), default=0), duplicates
+
+
+async def main(args: argparse.Namespace) -> None:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    print(
+        f"reminders: {args.reminders}, batch {args.batch}, per-worker concurrency {args.concurrency}, "
+        f"latency {args.latency * 1000:.0f} ms, bot rate limit {args.rate or 'off'}, db {async_engine.dialect.name}"
+    )
+    print(f"{'workers':>8}{'drain, s':>10}{'msg/s':>8}{'peak/s':>8}{'sent':>8}{'dups':>6}")
+    for n in (int(w) for w in args.workers.split(",")):
+        elapsed, sent, peak, dups = await _run(n, args)
+        print(f"{n:>8}{elapsed:>10.1f}{sent / elapsed:>8.0f}{peak:>8}{sent:>8}{dups:>6}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m bench.reminder_claim")
+    parser.add_argument("--reminders", type=int, default=3000)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.1, help="ответ Bot API, сек")
+    parser.add_argument("--rate", type=float, default=0, help="лимит бота, сообщ./с (0 — без лимита)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,159 @@
+# bench/reminder_delivery.py
+"""
+Бенчмарк рассылки: N напоминаний с одним и тем же сроком.
+
+Bot API — заглушка, которая ведёт себя как Telegram: задержка ответа --latency,
+общий лимит 30 сообщений/с и 1/с в чат (сверх — TelegramRetryAfter), доля
+сетевых ошибок --errors, доля чатов, где бот заблокирован, --forbidden.
+
+Сравниваются прежняя отправка (по одной, любая ошибка выключает напоминание)
+и ReminderScheduler с app.bot.delivery. Печатает время до полной отправки,
+сколько дошло, сколько потеряно (включая заблокированные чаты) и сколько раз
+упёрлись в 429.
+
+По умолчанию — временная SQLite-БД в файле; можно задать DATABASE_URL.
+
+Запуск из корня репозитория:
+    python -m bench.reminder_delivery [--reminders 10000] [--latency 0.1]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_tmp.name}/bench.db")
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter  # noqa: E402
+from aiogram.methods import SendMessage  # noqa: E402
+from sqlalchemy import delete, func, insert, select  # noqa: E402
+
+from app.bot.delivery import Sender, TokenBucket  # noqa: E402
+from app.bot.reminders_worker import ReminderScheduler  # noqa: E402
+from app.db.database import AsyncSessionLocal, async_engine, get_session  # noqa: E402
+from app.db.models import Base, Reminder, User  # noqa: E402
+from app.utils.tz import utcnow  # noqa: E402
+
+
+class FakeBotAPI:
+    """sendMessage с лимитами Telegram: 30/с на бота, 1/с в чат."""
+
+    def __init__(self, latency: float, error_rate: float, forbidden: set[int]) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.forbidden = forbidden
+        self.bucket = TokenBucket(30, 30)
+        self.last: dict[int, float] = {}
+        self.delivered: set[int] = set()
+        self.flood = 0
+
+    def _global_ok(self) -> bool:
+        self.bucket._refill()
+        if self.bucket._tokens < 1:
+            return False
+        self.bucket._tokens -= 1
+        return True
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        method = SendMessage(chat_id=chat_id, text=text)
+        await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        if random.random() < self.error_rate:
+            raise TelegramNetworkError(method, "connection reset")
+        if chat_id in self.forbidden:
+            raise TelegramForbiddenError(method, "Forbidden: bot was blocked by the user")
+        now = time.monotonic()
+        if now - self.last.get(chat_id, -10.0) < 1.0 or not self._global_ok():
+            self.flood += 1
+            raise TelegramRetryAfter(method, "Too Many Requests", retry_after=1)
+        self.last[chat_id] = now
+        self.delivered.add(int(text.rsplit("#", 1)[-1]))
+
+
+async def old_path(bot: FakeBotAPI) -> None:
+    """Прежний _process_due_reminders: по одной, исключение → is_active = False."""
+    now = utcnow()
+    async with get_session() as session:
+        q = await session.execute(select(Reminder).where(Reminder.is_active, Reminder.next_run <= now))
+        for r in q.scalars().all():
+            try:
+                await bot.send_message(chat_id=r.chat_id, text=f"⏰ Напоминание: {r.text}")
+                r.is_active = False
+            except Exception:
+                r.is_active = False
+        await session.commit()
+
+
+async def new_path(bot: FakeBotAPI) -> ReminderScheduler:
+    scheduler = ReminderScheduler(bot, sender=Sender(bot))
+    stop = asyncio.Event()
+    task = asyncio.create_task(scheduler.run(stop))
+    # готово, когда не осталось наступивших активных (ждущие повтора тоже активны)
+    while True:
+        await asyncio.sleep(0.5)
+        async with get_session() as session:
+            left = await session.scalar(
+                select(func.count()).select_from(Reminder).where(Reminder.is_active, Reminder.next_run <= utcnow())
+            )
+        if not left:
+            break
+    stop.set()
+    await task
+    return scheduler
+
+
+async def _seed(n: int, chats: int) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(Reminder))
+        user = await session.scalar(select(User).limit(1))
+        if user is None:
+            user = User(telegram_id=1, first_name="Bench")
+            session.add(user)
+            await session.flush()
+        due = utcnow() - timedelta(seconds=1)
+        await session.execute(
+            insert(Reminder),
+            [
+                {"user_id": user.id, "chat_id": 1000 + random.randrange(chats), "text": f"#{i}", "next_run": due}
+                for i in range(n)
+            ],
+        )
+        await session.commit()
+
+
+async def main(args: argparse.Namespace) -> None:
+    logging.getLogger("app.bot.delivery").setLevel(logging.ERROR)  # сбои заглушки ожидаемы
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    chats = max(1, int(args.reminders * 0.95))  # часть чатов получает несколько напоминаний
+    forbidden = {1000 + c for c in random.sample(range(chats), int(chats * args.forbidden))}
+    print(
+        f"reminders: {args.reminders} in {chats} chats, latency {args.latency * 1000:.0f} ms, "
+        f"errors {args.errors:.1%}, blocked chats {len(forbidden)}"
+    )
+    print(f"{'mode':<12}{'drain, s':>10}{'delivered':>12}{'lost':>8}{'429s':>8}")
+    for mode in ("sequential", "scheduler"):
+        await _seed(args.reminders, chats)
+        bot = FakeBotAPI(args.latency, args.errors, forbidden)
+        t0 = time.perf_counter()
+        if mode == "sequential":
+            await old_path(bot)
+        else:
+            await new_path(bot)
+        elapsed = time.perf_counter() - t0
+        lost = args.reminders - len(bot.delivered)
+        print(f"{mode:<12}{elapsed:>10.1f}{len(bot.delivered):>12}{lost:>8}{bot.flood:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m bench.reminder_delivery")
+    parser.add_argument("--reminders", type=int, default=10_000)
+    parser.add_argument("--latency", type=float, default=0.1, help="ответ Bot API, сек")
+    parser.add_argument("--errors", type=float, default=0.01, help="доля сетевых ошибок")
+    parser.add_argument("--forbidden", type=float, default=0.005, help="доля чатов, где бот заблокирован")
+    asyncio.run(main(parser.parse_args()))
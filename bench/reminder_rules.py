@@ -0,0 +1,135 @@
+# bench/reminder_rules.py
+"""
+Бенчмарк правил напоминаний (app.services.reminder_rules): цена одной записи
+сна/кормления в зависимости от размера истории ребёнка.
+
+Для каждого размера истории (--history, записей кормления и сна) создаются
+ребёнок и --users родителей с включёнными правилами «кормление» и «сон», затем
+--writes раз пишется кормление или пробуждение через CareUnitOfWork (как в
+хендлерах). Печатает SQL-запросов на запись, время записи и сколько напоминаний
+перенесено. Для сравнения — «пересчёт»: то, что пришлось бы делать периодическому
+обходу, — найти последние кормление и пробуждение по истории для каждого правила.
+
+По умолчанию — временная SQLite-БД в файле; можно задать DATABASE_URL.
+
+Запуск из корня репозитория:
+    python -m bench.reminder_rules [--history 0,10000,100000] [--writes 300]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_tmp.name}/bench.db")
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from app.db.database import AsyncSessionLocal, async_engine, count_queries  # noqa: E402
+from app.db.models import Base, Baby, FeedingRecord, Reminder, ReminderRule, SleepRecord, User  # noqa: E402
+from app.services import reminder_rules, reminders  # noqa: E402
+from app.services.carelog import CareUnitOfWork  # noqa: E402
+from app.utils.tz import utcnow  # noqa: E402
+
+_INSERT_CHUNK = 5000
+
+
+async def _seed(n: int, users: int) -> tuple[list[int], Baby]:
+    """Ребёнок с историей из n записей (пополам кормления и сны) и родители с правилами."""
+    async with AsyncSessionLocal() as session:
+        parents = [User(telegram_id=random.randrange(1, 10**12), first_name="Bench") for _ in range(users)]
+        session.add_all(parents)
+        await session.flush()
+        baby = Baby(user_id=parents[0].id, name="Bench")
+        session.add(baby)
+        await session.flush()
+        start = utcnow() - timedelta(minutes=90 * n)
+        feeds = [
+            {"baby_id": baby.id, "fed_at": start + timedelta(minutes=180 * i), "feeding_type": "formula", "amount_ml": 120}
+            for i in range(n // 2)
+        ]
+        sleeps = [
+            {
+                "baby_id": baby.id,
+                "sleep_start": start + timedelta(minutes=180 * i + 60),
+                "sleep_end": start + timedelta(minutes=180 * i + 120),
+                "duration_minutes": 60,
+            }
+            for i in range(n - n // 2)
+        ]
+        for model, rows in ((FeedingRecord, feeds), (SleepRecord, sleeps)):
+            for i in range(0, len(rows), _INSERT_CHUNK):
+                await session.execute(insert(model), rows[i:i + _INSERT_CHUNK])
+        await session.commit()
+        user_ids = [p.id for p in parents]
+    for uid in user_ids:
+        for kind in ("feed", "sleep"):
+            async with AsyncSessionLocal() as session:
+                await reminder_rules.toggle(session, user_id=uid, baby=baby, chat_id=uid, kind=kind)
+    return user_ids, baby
+
+
+async def _write(user_id: int, baby_id: int, i: int) -> None:
+    async with AsyncSessionLocal() as session:
+        async with CareUnitOfWork(session, actor_user_id=user_id) as uow:
+            if i % 2 == 0:
+                uow.add(FeedingRecord(baby_id=baby_id, feeding_type="formula", amount_ml=120))
+                await uow.event("feeding", "смесь 120 мл", baby_id=baby_id)
+            else:
+                now = utcnow()
+                uow.add(SleepRecord(baby_id=baby_id, sleep_start=now - timedelta(minutes=40), sleep_end=now, duration_minutes=40))
+                await uow.event("sleep_end", "сон 40 мин", baby_id=baby_id)
+
+
+async def _rescan(baby_id: int, rules: int) -> None:
+    """Периодический пересчёт: последнее событие по истории для каждого правила."""
+    async with AsyncSessionLocal() as session:
+        for _ in range(rules):
+            await session.scalar(select(func.max(FeedingRecord.fed_at)).where(FeedingRecord.baby_id == baby_id))
+            await session.scalar(select(func.max(SleepRecord.sleep_end)).where(SleepRecord.baby_id == baby_id))
+
+
+async def main(args: argparse.Namespace) -> None:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    moved = [0]
+    reminders.subscribe(lambda rid, next_run: moved.__setitem__(0, moved[0] + 1))
+    print(f"writes: {args.writes}, parents with rules: {args.users}, db {async_engine.dialect.name}")
+    print(f"{'history':>9}{'queries/write':>15}{'ms/write':>10}{'moved/write':>13}{'rescan ms':>11}")
+    for n in (int(h) for h in args.history.split(",")):
+        user_ids, baby = await _seed(n, args.users)
+        for i in range(10):  # прогрев
+            await _write(user_ids[0], baby.id, i)
+        moved[0] = 0
+        with count_queries() as counter:
+            t0 = time.perf_counter()
+            for i in range(args.writes):
+                await _write(user_ids[i % len(user_ids)], baby.id, i)
+            elapsed = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        await _rescan(baby.id, args.users * 2)
+        rescan = time.perf_counter() - t0
+        print(
+            f"{n:>9}{counter[0] / args.writes:>15.2f}{elapsed / args.writes * 1000:>10.2f}"
+            f"{moved[0] / args.writes:>13.2f}{rescan * 1000:>11.1f}"
+        )
+    async with AsyncSessionLocal() as session:
+        active = await session.scalar(
+            select(func.count()).select_from(Reminder).join(ReminderRule, ReminderRule.reminder_id == Reminder.id)
+            .where(Reminder.is_active)
+        )
+    print(f"pending rule reminders: {active} (one per rule)")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m bench.reminder_rules")
+    parser.add_argument("--history", default="0,10000,100000")
+    parser.add_argument("--writes", type=int, default=300)
+    parser.add_argument("--users", type=int, default=2, help="родителей с правилами у ребёнка")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,168 @@
+# bench/reminder_scheduler.py
+"""
+Бенчмарк напоминаний: прежний цикл (опрос таблицы раз в --interval секунд)
+против планировщика на heap (app.bot.reminders_worker.ReminderScheduler).
+
+Сценарий «load»: --reminders напоминаний со сроками, случайно разбросанными
+по --duration секундам, плюс --live напоминаний, созданных во время прогона
+через app.services.reminders (срок через 1–5 с после создания). Сценарий
+«idle»: столько же времени без единого срока. Печатает опоздание отправки
+(p50/p95/max) и число SQL-запросов в минуту. Bot API — заглушка в памяти;
+у каждого напоминания свой чат, чтобы не упираться в лимит на чат.
+
+По умолчанию — временная SQLite-БД в файле; можно задать DATABASE_URL.
+
+Запуск из корня репозитория:
+    python -m bench.reminder_scheduler [--reminders 100] [--live 20] [--duration 60] [--interval 30]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_tmp.name}/bench.db")
+
+from sqlalchemy import delete, select  # noqa: E402
+
+from app.bot.reminders_worker import ReminderScheduler  # noqa: E402
+from app.db.database import AsyncSessionLocal, async_engine, count_queries, get_session  # noqa: E402
+from app.db.models import Base, Reminder, User  # noqa: E402
+from app.services import reminders  # noqa: E402
+from app.utils.tz import utcnow  # noqa: E402
+
+
+class FakeBot:
+    def __init__(self) -> None:
+        self.sent: list[tuple[float, str]] = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        self.sent.append((time.time(), text.removeprefix("⏰ Напоминание: ")))
+
+
+async def poll_loop(bot: FakeBot, stop_event: asyncio.Event, interval: float) -> None:
+    """Прежний reminders_worker: SELECT всех наступивших раз в interval секунд."""
+    while not stop_event.is_set():
+        now = utcnow()
+        async with get_session() as session:
+            q = await session.execute(select(Reminder).where(Reminder.is_active, Reminder.next_run <= now))
+            due = q.scalars().all()
+            for r in due:
+                await bot.send_message(chat_id=r.chat_id, text=r.text)
+                r.is_active = False
+            if due:
+                await session.commit()
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _setup() -> int:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        user = User(telegram_id=1, first_name="Bench")
+        session.add(user)
+        await session.commit()
+        return user.id
+
+
+async def _seed(user_id: int, n: int, duration: float) -> dict[str, float]:
+    """Напоминания со сроками в ближайшие duration секунд; текст → срок (unix time)."""
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(Reminder))
+        start, wall = utcnow(), time.time()
+        due: dict[str, float] = {}
+        for i in range(n):
+            offset = random.uniform(1, duration - 1)
+            text = f"seed-{i}"
+            due[text] = wall + offset
+            session.add(
+                Reminder(user_id=user_id, chat_id=1000 + i, text=text, next_run=start + timedelta(seconds=offset))
+            )
+        await session.commit()
+    return due
+
+
+async def _create_live(user_id: int, n: int, duration: float, due: dict[str, float]) -> None:
+    """Напоминания, созданные во время работы планировщика (как из хендлера)."""
+    moments = sorted(random.uniform(0, duration - 6) for _ in range(n))
+    t0 = time.monotonic()
+    for i, at in enumerate(moments):
+        await asyncio.sleep(max(0.0, at - (time.monotonic() - t0)))
+        offset = random.uniform(1, 5)
+        text = f"live-{i}"
+        due[text] = time.time() + offset
+        async with AsyncSessionLocal() as session:
+            await reminders.create(
+                session, user_id=user_id, chat_id=100_000 + i, text=text, next_run=utcnow() + timedelta(seconds=offset),
+            )
+
+
+async def _run(mode: str, user_id: int, args: argparse.Namespace, n: int, live: int) -> dict[str, float]:
+    bot = FakeBot()
+    due = await _seed(user_id, n, args.duration)
+    stop = asyncio.Event()
+    creator = asyncio.create_task(_create_live(user_id, live, args.duration, due))  # его запросы не считаем
+
+    with count_queries() as counter:
+        if mode == "poll":
+            worker = asyncio.create_task(poll_loop(bot, stop, args.interval))
+        else:
+            scheduler = ReminderScheduler(bot, window=args.window)
+            reminders.subscribe(scheduler.notify)
+            worker = asyncio.create_task(scheduler.run(stop))
+        await asyncio.sleep(args.duration)
+        await creator
+        # дожидаемся последних сроков (опрос может опоздать на целый интервал)
+        deadline = time.monotonic() + args.interval + 2
+        while len(bot.sent) < len(due) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        queries = counter[0]
+        stop.set()
+        await worker
+    if mode != "poll":
+        reminders.unsubscribe(scheduler.notify)
+
+    lags = sorted(at - due[text] for at, text in bot.sent)
+    pick = lambda q: lags[min(len(lags) - 1, int(len(lags) * q))] if lags else 0.0  # noqa: E731
+    return {
+        "sent": len(bot.sent),
+        "expected": len(due),
+        "p50": pick(0.5),
+        "p95": pick(0.95),
+        "max": lags[-1] if lags else 0.0,
+        "qpm": queries / args.duration * 60,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    user_id = await _setup()
+    print(
+        f"reminders: {args.reminders} + {args.live} live, duration {args.duration:.0f} s, "
+        f"poll interval {args.interval:.0f} s"
+    )
+    print(f"{'mode':<6}{'scenario':<10}{'sent':>10}{'p50 lag, ms':>13}{'p95 lag, ms':>13}{'max lag, ms':>13}{'queries/min':>13}")
+    for scenario, n, live in (("load", args.reminders, args.live), ("idle", 0, 0)):
+        for mode in ("poll", "heap"):
+            r = await _run(mode, user_id, args, n, live)
+            print(
+                f"{mode:<6}{scenario:<10}{r['sent']:>5}/{r['expected']:<4}{r['p50'] * 1000:>13.0f}"
+                f"{r['p95'] * 1000:>13.0f}{r['max'] * 1000:>13.0f}{r['qpm']:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m bench.reminder_scheduler")
+    parser.add_argument("--reminders", type=int, default=100)
+    parser.add_argument("--live", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--interval", type=float, default=30.0, help="период прежнего опроса, сек")
+    parser.add_argument("--window", type=float, default=900.0, help="окно загрузки планировщика, сек")
+    asyncio.run(main(parser.parse_args()))
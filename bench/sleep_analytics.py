@@ -0,0 +1,103 @@
+# bench/sleep_analytics.py
+"""
+Бенчмарк аналитики сна: несколько лет записей одного ребёнка (ночной сон через
+полночь + дневные сны), загрузка из БД и векторный расчёт по диапазонам 7–365 дней
+и по всей истории.
+
+Печатает время загрузки интервалов и время compute() отдельно, в миллисекундах.
+По умолчанию — временная SQLite-БД в файле; можно задать DATABASE_URL.
+
+Запуск из корня репозитория:
+    python -m bench.sleep_analytics [YEARS]
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_tmp.name}/bench.db")
+
+from sqlalchemy import insert  # noqa: E402
+
+from app.db.database import AsyncSessionLocal, async_engine  # noqa: E402
+from app.db.models import Base, Baby, SleepRecord, User  # noqa: E402
+from app.services import sleep_analytics  # noqa: E402
+from app.services.aggregates import day_range  # noqa: E402
+
+TZ = "Europe/Berlin"
+REPEAT = 20
+
+
+def _records(baby_id: int, first: date, days: int) -> list[dict]:
+    rnd = random.Random(42)
+    rows = []
+    for i in range(days):
+        day = datetime.combine(first + timedelta(days=i), datetime.min.time())
+        # ночной сон 19:00–22:00 UTC → утро следующего дня; 2–3 дневных сна
+        night = day + timedelta(hours=19, minutes=rnd.randint(0, 180))
+        spans = [(night, night + timedelta(hours=rnd.uniform(8, 11)))]
+        for h in rnd.sample((8, 11, 14, 16), rnd.randint(2, 3)):
+            nap = day + timedelta(hours=h, minutes=rnd.randint(0, 50))
+            spans.append((nap, nap + timedelta(minutes=rnd.randint(20, 110))))
+        for a, b in spans:
+            rows.append({
+                "baby_id": baby_id, "sleep_start": a, "sleep_end": b,
+                "duration_minutes": int((b - a).total_seconds() // 60),
+            })
+    return rows
+
+
+async def _setup(first: date, days: int) -> tuple[int, int]:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        user = User(telegram_id=1, first_name="Bench")
+        session.add(user)
+        await session.flush()
+        baby = Baby(user_id=user.id, name="Bench")
+        session.add(baby)
+        await session.flush()
+        rows = _records(baby.id, first, days)
+        for i in range(0, len(rows), 1000):
+            await session.execute(insert(SleepRecord), rows[i:i + 1000])
+        await session.commit()
+        return baby.id, len(rows)
+
+
+def _ms(fn) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+async def main(years: int) -> None:
+    today = date.today()
+    total_days = 365 * years
+    first = today - timedelta(days=total_days - 1)
+    baby_id, n = await _setup(first, total_days)
+    now = datetime.utcnow()
+    print(f"db: {async_engine.url.render_as_string()}, records: {n} ({years} y), tz: {TZ}")
+    print(f"{'range':>8}{'intervals':>11}{'load, ms':>10}{'compute, ms':>13}")
+    for days in (*sleep_analytics.RANGES, total_days):
+        span = day_range(today, days)
+        lo = datetime.combine(span[0], datetime.min.time()) - timedelta(days=1)
+        async with AsyncSessionLocal() as session:
+            t0 = time.perf_counter()
+            starts, ends = await sleep_analytics.load_intervals(session, baby_id, lo, now, now)
+            load = (time.perf_counter() - t0) * 1000
+        compute = _ms(lambda: sleep_analytics.compute(starts, ends, span, TZ, now))
+        print(f"{days:>8}{len(starts):>11}{load:>10.1f}{compute:>13.2f}")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 3))
@@ -0,0 +1,87 @@
+# bench/webhook_parse.py
+"""
+Микро-бенчмарк разбора тела вебхука: старый путь (json + Update.model_validate)
+против нового (fastjson + отсев неиспользуемых типов апдейтов + валидация).
+
+Запуск из корня репозитория:
+    python -m bench.webhook_parse
+"""
+from __future__ import annotations
+
+import json
+import time
+
+from aiogram.types import Update
+
+from app.utils import fastjson
+
+USED = frozenset({"message", "callback_query"})
+
+_USER = {"id": 123456789, "is_bot": False, "first_name": "Анна", "username": "anna", "language_code": "ru"}
+_CHAT = {"id": 123456789, "first_name": "Анна", "username": "anna", "type": "private"}
+
+PAYLOADS = {
+    "message": {
+        "update_id": 900000001,
+        "message": {
+            "message_id": 4242, "from": _USER, "chat": _CHAT, "date": 1760000000,
+            "text": "Начал спать",
+        },
+    },
+    "callback_query": {
+        "update_id": 900000002,
+        "callback_query": {
+            "id": "4382736482736482736", "from": _USER, "chat_instance": "-834729384729384",
+            "data": "formula_ml_120",
+            "message": {
+                "message_id": 4243, "from": {"id": 7000000000, "is_bot": True, "first_name": "Baby Tracker"},
+                "chat": _CHAT, "date": 1760000001, "text": "🍼 Выберите объём смеси:",
+                "reply_markup": {"inline_keyboard": [
+                    [{"text": f"{v} мл", "callback_data": f"formula_ml_{v}"} for v in (30, 60, 90)],
+                    [{"text": f"{v} мл", "callback_data": f"formula_ml_{v}"} for v in (120, 150, 180)],
+                ]},
+            },
+        },
+    },
+    "my_chat_member (unrouted)": {
+        "update_id": 900000003,
+        "my_chat_member": {
+            "chat": _CHAT, "from": _USER, "date": 1760000002,
+            "old_chat_member": {"status": "member", "user": _USER},
+            "new_chat_member": {"status": "kicked", "user": _USER, "until_date": 0},
+        },
+    },
+}
+
+
+def old_path(body: bytes) -> None:
+    Update.model_validate(json.loads(body))
+
+
+def new_path(body: bytes) -> None:
+    data = fastjson.loads(body)
+    if not any(k in USED for k in data if k != "update_id"):
+        return
+    Update.model_validate(data)
+
+
+def _bench(fn, body: bytes, n: int) -> float:
+    fn(body)  # прогрев
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn(body)
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main(n: int = 20_000) -> None:
+    print(f"json backend: {fastjson.BACKEND}, iterations: {n}")
+    print(f"{'payload':<28}{'old, µs':>10}{'new, µs':>10}{'speedup':>10}")
+    for name, payload in PAYLOADS.items():
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        old = _bench(old_path, body, n)
+        new = _bench(new_path, body, n)
+        print(f"{name:<28}{old:>10.2f}{new:>10.2f}{old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+# tests/conftest.py
+import os
+import tempfile
+
+# до импорта app.db.database: своя временная SQLite-БД на прогон
+_tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_tmp.name}/test.db")
+os.environ.setdefault("REMINDER_CHANNEL", "0")
+# графики строятся в самом процессе теста: без пула процессов и прогрева matplotlib
+os.environ.setdefault("CHART_POOL", "inline")
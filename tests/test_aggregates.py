@@ -0,0 +1,95 @@
+# tests/test_aggregates.py
+import asyncio
+from datetime import date, datetime
+
+from sqlalchemy import insert
+
+from app.db.database import AsyncSessionLocal, async_engine, count_queries
+from app.db.models import Base, Baby, FeedingRecord, User
+from app.services import aggregates
+
+
+async def _baby() -> int:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        user = User(telegram_id=int(datetime.utcnow().timestamp() * 1e6), first_name="Test")
+        session.add(user)
+        await session.flush()
+        baby = Baby(user_id=user.id, name="Test")
+        session.add(baby)
+        await session.commit()
+        return baby.id
+
+
+async def _feed(baby_id: int, *rows: tuple[datetime, str, int | None, int | None]) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            insert(FeedingRecord),
+            [
+                {"baby_id": baby_id, "fed_at": at, "feeding_type": kind, "amount_ml": ml, "amount_g": g}
+                for at, kind, ml, g in rows
+            ],
+        )
+        await session.commit()
+
+
+def test_feeding_by_day_in_one_query():
+    """Все метрики дня — одним GROUP BY; типы разнесены условными суммами."""
+
+    async def run() -> None:
+        baby_id = await _baby()
+        await _feed(
+            baby_id,
+            (datetime(2025, 5, 1, 8), "formula", 120, None),
+            (datetime(2025, 5, 1, 11), "water", 30, None),
+            (datetime(2025, 5, 1, 14), "breast", None, None),
+            (datetime(2025, 5, 2, 9), "solid", None, 80),
+            (datetime(2025, 5, 2, 12), "formula", 100, None),
+        )
+        async with AsyncSessionLocal() as session:
+            with count_queries() as counter:
+                days = await aggregates.feeding_by_day(
+                    session, baby_id=baby_id, tz="UTC", start=date(2025, 5, 1), end=date(2025, 5, 2)
+                )
+        assert counter[0] == 1
+        first, second = days[(baby_id, date(2025, 5, 1))], days[(baby_id, date(2025, 5, 2))]
+        assert (first["feed_count"], first["ml"], first["g"]) == (3, 150, 0)
+        assert (first["formula"], first["water"], first["breast"], first["solid"]) == (1, 1, 1, 0)
+        assert (first["formula_ml"], first["water_ml"]) == (120, 30)
+        assert (second["feed_count"], second["ml"], second["g"], second["solid"]) == (2, 100, 80, 1)
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_day_bucket_across_dst():
+    """SQLite: смещение пояса меняется внутри интервала — каждая запись в свои локальные сутки."""
+
+    async def run() -> None:
+        baby_id = await _baby()
+        tz = "Europe/Berlin"  # 30.03.2025 01:00 UTC: +1 → +2; 26.10.2025 01:00 UTC: +2 → +1
+        await _feed(
+            baby_id,
+            (datetime(2025, 3, 29, 22, 30), "breast", None, None),  # 23:30 29.03 (+1)
+            (datetime(2025, 3, 30, 22, 30), "breast", None, None),  # 00:30 31.03 (+2)
+            (datetime(2025, 10, 25, 22, 30), "breast", None, None),  # 00:30 26.10 (+2)
+            (datetime(2025, 10, 26, 22, 30), "breast", None, None),  # 23:30 26.10 (+1)
+        )
+        async with AsyncSessionLocal() as session:
+            spring = await aggregates.feeding_by_day(
+                session, baby_id=baby_id, tz=tz, start=date(2025, 3, 29), end=date(2025, 3, 31)
+            )
+            everything = await aggregates.feeding_by_day(session, baby_id=baby_id, tz=tz)  # интервал по данным
+        assert {day: r["feed_count"] for (_, day), r in spring.items()} == {
+            date(2025, 3, 29): 1,
+            date(2025, 3, 31): 1,
+        }
+        assert {day: r["feed_count"] for (_, day), r in everything.items()} == {
+            date(2025, 3, 29): 1,
+            date(2025, 3, 31): 1,
+            date(2025, 10, 26): 2,
+        }
+        await async_engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,102 @@
+# tests/test_carelog.py
+import asyncio
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from app.db.database import AsyncSessionLocal, async_engine
+from app.db.models import Base, Baby, DailyRollup, FeedingRecord, SleepRecord, User
+from app.services import identity, rollups, sleep_analytics
+from app.services.carelog import CareUnitOfWork
+from app.utils.tz import utcnow
+
+
+async def _setup() -> tuple[int, int]:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        user = User(telegram_id=int(utcnow().timestamp() * 1e6), first_name="Test")
+        session.add(user)
+        await session.flush()
+        baby = Baby(user_id=user.id, name="Test")
+        session.add(baby)
+        await session.commit()
+        return user.id, baby.id
+
+
+async def _rollups(baby_id: int) -> list[DailyRollup]:
+    async with AsyncSessionLocal() as session:
+        return list((await session.execute(select(DailyRollup).where(DailyRollup.baby_id == baby_id))).scalars())
+
+
+def test_rollups_with_cold_identity_cache():
+    """event() с промахом кэша семьи делает SELECT (autoflush) — записи всё равно попадают в итоги."""
+
+    async def run() -> None:
+        user_id, baby_id = await _setup()
+        for ml in (80, 120):
+            identity.families.clear()
+            async with AsyncSessionLocal() as session:
+                async with CareUnitOfWork(session, actor_user_id=user_id) as uow:
+                    uow.add(FeedingRecord(baby_id=baby_id, feeding_type="formula", amount_ml=ml))
+                    await uow.event("feeding", f"смесь {ml} мл", baby_id=baby_id)
+
+        identity.families.clear()
+        async with AsyncSessionLocal() as session:
+            start = utcnow() - timedelta(minutes=45)
+            rec = SleepRecord(baby_id=baby_id, sleep_start=start)
+            session.add(rec)
+            await session.commit()
+            rec.sleep_end = start + timedelta(minutes=45)
+            rec.duration_minutes = 45
+            async with CareUnitOfWork(session, actor_user_id=user_id) as uow:
+                uow.add(rec)
+                await uow.event("sleep_end", "сон 45 мин", baby_id=baby_id)
+
+        rows = await _rollups(baby_id)
+        assert sum(r.feed_count for r in rows) == 2
+        assert sum(r.ml for r in rows) == 200
+        assert sum(r.sleep_count for r in rows) == 1
+        assert sum(r.sleep_minutes for r in rows) == 45
+        await async_engine.dispose()  # пул привязан к циклу событий этого теста
+
+    asyncio.run(run())
+
+
+def test_overnight_sleep_is_split_at_local_midnight():
+    """Итоги и sleep_analytics делят сон 21:00–07:00 одинаково: 180 и 420 минут."""
+    tz = "Europe/Moscow"  # UTC+3
+    start = datetime(2025, 3, 1, 18, 0)  # 21:00 локально
+    days = [date(2025, 3, 1), date(2025, 3, 2)]
+
+    async def run() -> None:
+        user_id, baby_id = await _setup()
+        async with AsyncSessionLocal() as session:
+            rec = SleepRecord(baby_id=baby_id, sleep_start=start)
+            session.add(rec)
+            await session.commit()
+            rec.sleep_end = start + timedelta(hours=10)
+            rec.duration_minutes = 600
+            async with CareUnitOfWork(session, actor_user_id=user_id, tz=tz) as uow:
+                uow.add(rec)
+                await uow.event("sleep_end", "сон 10 ч", baby_id=baby_id)
+
+        expected = {days[0]: (180, 1), days[1]: (420, 0)}
+        assert {r.day: (r.sleep_minutes, r.sleep_count) for r in await _rollups(baby_id)} == expected
+        async with AsyncSessionLocal() as session:
+            await rollups.rebuild(session, baby_id, tz=tz)
+            await session.commit()
+            starts, ends = await sleep_analytics.load_intervals(session, baby_id, start, start + timedelta(days=1))
+        assert {r.day: (r.sleep_minutes, r.sleep_count) for r in await _rollups(baby_id)} == expected
+        stats = sleep_analytics.compute(starts, ends, days, tz, now=start + timedelta(days=2))
+        assert stats.total.tolist() == [180, 420]
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_split_minutes():
+    start = datetime(2025, 3, 1, 23, 30)
+    assert rollups.split_minutes(start, 0, 60, "UTC") == {date(2025, 3, 1): 30, date(2025, 3, 2): 30}
+    assert rollups.split_minutes(start, 60, 20, "UTC") == {date(2025, 3, 1): -10, date(2025, 3, 2): -30}
+    assert rollups.split_minutes(start, 0, 10, "UTC") == {date(2025, 3, 1): 10}
@@ -0,0 +1,76 @@
+# tests/test_chart_cache.py
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendPhoto
+from aiogram.types import BufferedInputFile
+
+from app.bot.handlers import stats
+from app.utils import chart_cache
+from app.utils.chart_cache import ChartCache, chart_key
+
+RENDERED: list[tuple] = []
+
+
+def fake_chart(values: list[int], title: str = "") -> bytes:
+    RENDERED.append((tuple(values), title))
+    return f"png:{values}:{title}".encode()
+
+
+def test_key_depends_on_content_only():
+    assert chart_key(fake_chart, ([1, 2],), {"title": "a"}) == chart_key(fake_chart, ([1, 2],), {"title": "a"})
+    assert chart_key(fake_chart, ([1, 2],), {"title": "a"}) != chart_key(fake_chart, ([1, 3],), {"title": "a"})
+
+
+def test_memory_then_disk_then_render(tmp_path):
+    async def run() -> None:
+        RENDERED.clear()
+        cache = ChartCache(1024, tmp_path, 1024)
+        key, png = await cache.png(fake_chart, [1, 2], title="a")
+        assert (await cache.png(fake_chart, [1, 2], title="a"))[1] == png
+        assert len(RENDERED) == 1 and cache.memory_hits == 1
+
+        cold = ChartCache(1024, tmp_path, 1024)  # новый процесс: память пуста, диск остался
+        assert await cold.fetch(key, fake_chart, ([1, 2],), {"title": "a"}) == png
+        assert len(RENDERED) == 1 and cold.disk_hits == 1
+
+        await cache.png(fake_chart, [1, 3], title="a")
+        assert len(RENDERED) == 2 and cache.misses == 2
+
+    asyncio.run(run())
+
+
+class FakeMessage:
+    def __init__(self) -> None:
+        self.photos: list = []
+        self.reject_file_ids = False
+
+    async def answer_photo(self, photo, caption=None):
+        if isinstance(photo, str) and self.reject_file_ids:
+            raise TelegramBadRequest(SendPhoto(chat_id=1, photo=photo), "wrong file identifier")
+        self.photos.append(photo)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=f"file-{len(self.photos)}")])
+
+
+def test_send_chart_reuses_file_id(monkeypatch, tmp_path):
+    """Повторная отправка того же графика — по file_id, без построения и загрузки байтов."""
+
+    async def run() -> None:
+        RENDERED.clear()
+        monkeypatch.setattr(chart_cache, "cache", ChartCache(1024, tmp_path, 1024))
+        msg = FakeMessage()
+        for _ in range(2):
+            assert await stats._send_chart(msg, fake_chart, filename="c.png", values=[5], title="t")
+        assert isinstance(msg.photos[0], BufferedInputFile)
+        assert msg.photos[1] == "file-1"
+        assert len(RENDERED) == 1
+
+        # file_id больше не принимается — забываем его и загружаем PNG из кэша
+        msg.reject_file_ids = True
+        assert await stats._send_chart(msg, fake_chart, filename="c.png", values=[5], title="t")
+        assert isinstance(msg.photos[2], BufferedInputFile)
+        assert len(RENDERED) == 1
+        assert chart_cache.cache.file_id(chart_key(fake_chart, (), {"values": [5], "title": "t"})) == "file-3"
+
+    asyncio.run(run())
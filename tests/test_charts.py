@@ -0,0 +1,72 @@
+# tests/test_charts.py
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendMediaGroup
+from aiogram.types import BufferedInputFile
+
+from app.bot.handlers import stats
+from app.utils import chart_cache
+from app.utils.chart_cache import ChartCache
+from app.utils.charts import panels_png
+
+RENDERED: list[str] = []
+
+
+def fake_chart(title: str) -> bytes:
+    RENDERED.append(title)
+    return title.encode()
+
+
+def test_panels_png_draws_every_panel():
+    panels = [
+        {
+            "title": "Сон",
+            "x_labels": ["01.03", "02.03"],
+            "series": [{"label": "ночь", "values": [9.5, 10.0], "stack": True}],
+            "ylabel": "ч",
+        },
+        {"title": "Кормление", "x_labels": [], "series": []},  # без данных — подпись, не ошибка
+    ]
+    png = panels_png("Неделя", panels).getvalue()
+    assert png.startswith(b"\x89PNG")
+
+
+class FakeMessage:
+    def __init__(self) -> None:
+        self.groups: list[list] = []
+        self.reject_file_ids = False
+
+    async def answer_media_group(self, media):
+        if self.reject_file_ids and any(isinstance(m.media, str) for m in media):
+            raise TelegramBadRequest(SendMediaGroup(chat_id=1, media=media), "wrong file identifier")
+        self.groups.append([m.media for m in media])
+        n = len(self.groups)
+        return [SimpleNamespace(photo=[SimpleNamespace(file_id=f"g{n}-{i}")]) for i in range(len(media))]
+
+
+def test_album_is_one_media_group_and_reuses_file_ids(monkeypatch, tmp_path):
+    """Графики уходят одним media group; уже отправленные — по file_id, без построения."""
+
+    async def run() -> None:
+        RENDERED.clear()
+        monkeypatch.setattr(chart_cache, "cache", ChartCache(1024, tmp_path, 1024))
+        msg = FakeMessage()
+        first = [(fake_chart, "a.png", {"title": "a"}), (fake_chart, "b.png", {"title": "b"})]
+        assert await stats._send_album(msg, first, caption="c")
+        assert len(msg.groups) == 1 and all(isinstance(m, BufferedInputFile) for m in msg.groups[0])
+
+        second = first + [(fake_chart, "c.png", {"title": "c"})]
+        assert await stats._send_album(msg, second)
+        assert msg.groups[1][:2] == ["g1-0", "g1-1"]
+        assert isinstance(msg.groups[1][2], BufferedInputFile)
+        assert sorted(RENDERED) == ["a", "b", "c"]
+
+        # file_id отвергнуты — тот же альбом повторяется с загрузкой PNG из кэша
+        msg.reject_file_ids = True
+        assert await stats._send_album(msg, second)
+        assert all(isinstance(m, BufferedInputFile) for m in msg.groups[2])
+        assert sorted(RENDERED) == ["a", "b", "c"]
+
+    asyncio.run(run())
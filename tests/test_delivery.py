@@ -0,0 +1,85 @@
+# tests/test_delivery.py
+import asyncio
+import time
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+)
+from aiogram.methods import SendMessage
+
+from app.bot import delivery
+from app.bot.delivery import DROP, ERROR, RETRY, SENT, Sender, TokenBucket
+
+
+class ScriptedBot:
+    """Ответ на отправку в чат: исключение из errors[chat_id] или успех."""
+
+    def __init__(self, errors: dict[int, Exception]) -> None:
+        self.errors = errors
+        self.sent: list[int] = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        if chat_id in self.errors:
+            raise self.errors[chat_id]
+        self.sent.append(chat_id)
+
+
+def _method(chat_id: int) -> SendMessage:
+    return SendMessage(chat_id=chat_id, text="t")
+
+
+def test_results_by_telegram_error():
+    """429 — повтор через retry_after (и чат занят до тех пор), 403/400 — выключить, сеть — backoff."""
+
+    async def run() -> None:
+        bot = ScriptedBot({
+            2: TelegramRetryAfter(_method(2), "Too Many Requests", retry_after=7),
+            3: TelegramForbiddenError(_method(3), "bot was blocked by the user"),
+            4: TelegramBadRequest(_method(4), "chat not found"),
+            5: TelegramNetworkError(_method(5), "timeout"),
+        })
+        sender = Sender(bot, rate=1000, burst=100, chat_interval=0)
+        results = await sender.send_many([(1, "t", 1), (2, "t", 1), (3, "t", 1), (4, "t", 1), (5, "t", 2)])
+        assert [r.status for r in results] == [SENT, RETRY, DROP, DROP, ERROR]
+        assert results[1].delay == 7
+        assert results[2].error == "bot was blocked by the user"
+        base = delivery.DELIVERY_RETRY_BASE * 2
+        assert 0.8 * base <= results[4].delay <= 1.2 * base
+        assert bot.sent == [1]
+
+        # после 429 чат занят: следующая отправка не идёт в Telegram, а просит подождать
+        bot.errors.pop(2)
+        again = await sender.send(2, "t")
+        assert again.status == RETRY and 6 < again.delay <= 7
+        assert bot.sent == [1]
+        stats = sender.stats()
+        assert (stats["sent"], stats["retry_after"], stats["dropped"], stats["errors"]) == (1, 1, 2, 1)
+
+    asyncio.run(run())
+
+
+def test_chat_interval_defers_instead_of_waiting():
+    async def run() -> None:
+        bot = ScriptedBot({})
+        sender = Sender(bot, rate=1000, burst=100, chat_interval=1.0)
+        first, second = await sender.send_many([(1, "a", 1), (1, "b", 1)])
+        assert (first.status, second.status) == (SENT, RETRY)
+        assert 0 < second.delay <= 1.0
+        assert bot.sent == [1]
+
+    asyncio.run(run())
+
+
+def test_token_bucket_rate():
+    async def run() -> None:
+        bucket = TokenBucket(rate=50, burst=5)
+        t0 = time.monotonic()
+        for _ in range(15):
+            await bucket.acquire()
+        # 5 из запаса сразу, остальные 10 — по 1/50 с
+        assert 0.18 <= time.monotonic() - t0 < 0.5
+
+    asyncio.run(run())
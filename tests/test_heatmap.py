@@ -0,0 +1,69 @@
+# tests/test_heatmap.py
+import asyncio
+from datetime import date, datetime
+
+from sqlalchemy import insert
+
+from app.db.database import AsyncSessionLocal, async_engine
+from app.db.models import Base, Baby, FeedingRecord, SleepRecord, User
+from app.services import heatmap
+
+
+async def _baby(sleeps: list[tuple[datetime, datetime]], feeds: list[datetime]) -> int:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        user = User(telegram_id=int(datetime.utcnow().timestamp() * 1e6), first_name="Test")
+        session.add(user)
+        await session.flush()
+        baby = Baby(user_id=user.id, name="Test")
+        session.add(baby)
+        await session.flush()
+        await session.execute(
+            insert(SleepRecord), [{"baby_id": baby.id, "sleep_start": s, "sleep_end": e} for s, e in sleeps]
+        )
+        if feeds:
+            await session.execute(
+                insert(FeedingRecord), [{"baby_id": baby.id, "fed_at": at, "feeding_type": "breast"} for at in feeds]
+            )
+        await session.commit()
+        return baby.id
+
+
+def test_slot_occupancy():
+    """Минуты сна в 15-минутных слотах локального времени, кормления — числом в слоте."""
+
+    async def run() -> None:
+        baby_id = await _baby(
+            [
+                (datetime(2025, 3, 1, 18, 10), datetime(2025, 3, 2, 4, 5)),  # 21:10–07:05 MSK
+                (datetime(2025, 3, 1, 19, 0), datetime(2025, 3, 1, 20, 0)),  # двойной ввод — не удваивается
+            ],
+            [datetime(2025, 3, 1, 10, 7), datetime(2025, 3, 1, 10, 14), datetime(2025, 3, 2, 6, 0)],
+        )
+        async with AsyncSessionLocal() as session:
+            hm = await heatmap.build(session, baby_id, "Europe/Moscow", days=2, today=date(2025, 3, 2))
+        assert hm.sleep.shape == hm.feeds.shape == (2, heatmap.SLOTS)
+        first, second = hm.sleep.tolist()
+        assert first[84] == 5 and first[85:] == [15] * 11 and sum(first[:84]) == 0
+        assert second[:28] == [15] * 28 and second[28] == 5 and sum(second[29:]) == 0
+        assert hm.feeds[0, 52] == 2 and hm.feeds[1, 36] == 1 and hm.feeds.sum() == 3
+        assert hm.to_json()["feeds"] == [[0, 52, 2], [1, 36, 1]]
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_slots_follow_wall_clock_on_dst_day():
+    """30.03.2025 в Берлине 02:00 → 03:00: сон 01:30–03:30 по часам занимает слоты до и после скачка."""
+
+    async def run() -> None:
+        baby_id = await _baby([(datetime(2025, 3, 30, 0, 30), datetime(2025, 3, 30, 1, 30))], [])
+        async with AsyncSessionLocal() as session:
+            hm = await heatmap.build(session, baby_id, "Europe/Berlin", days=1, today=date(2025, 3, 30))
+        row = hm.sleep[0].tolist()
+        assert [i for i, m in enumerate(row) if m] == [6, 7, 12, 13]
+        assert sum(row) == 60
+        await async_engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,17 @@
+# tests/test_importtime.py
+import json
+import subprocess
+import sys
+
+from app.utils.importtime import DEFAULT_FORBID, DEFAULT_MODULE
+
+
+def test_heavy_modules_are_not_imported_at_startup():
+    """matplotlib и numpy грузятся лениво: импорт веб-сервиса в чистом интерпретаторе их не тянет."""
+    probe = (
+        f"import json, sys; import {DEFAULT_MODULE}; "
+        f"print(json.dumps(sorted(m for m in sys.modules if m.split('.')[0] in {DEFAULT_FORBID!r})))"
+    )
+    proc = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=False)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    assert json.loads(proc.stdout.strip().splitlines()[-1]) == []
@@ -0,0 +1,71 @@
+# tests/test_migrations.py
+import asyncio
+
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.migrations import MIGRATIONS, explain, migrate
+from app.db.models import Base
+
+# чего не было в исходной схеме: индексы, колонки и таблицы, которые добавили миграции и модели
+_NEW_INDEXES = (
+    "ix_sleep_records_baby_start",
+    "ix_feeding_records_baby_fed_at",
+    "ix_health_records_baby_created",
+    "ix_care_events_family_occurred",
+    "ix_reminders_active_next_run",
+)
+_NEW_COLUMNS = (("user_settings", "timezone"), ("reminders", "locked_until"), ("reminders", "locked_by"))
+_NEW_TABLES = ("reminder_rules", "daily_rollups", "processed_updates")
+# одиночные индексы исходной схемы, которые миграция 1 заменила составными
+_OLD_INDEXES = (
+    ("ix_sleep_records_baby_id", "sleep_records", "baby_id"),
+    ("ix_feeding_records_baby_id", "feeding_records", "baby_id"),
+    ("ix_health_records_baby_id", "health_records", "baby_id"),
+    ("ix_care_events_family_id", "care_events", "family_id"),
+)
+
+
+async def _baseline(engine) -> None:
+    """Схема, какой её создавала исходная версия бота (без миграций)."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for name in _NEW_INDEXES:
+            await conn.execute(text(f"DROP INDEX {name}"))
+        for table in _NEW_TABLES:
+            await conn.execute(text(f"DROP TABLE {table}"))
+        for table, column in _NEW_COLUMNS:
+            await conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        for name, table, column in _OLD_INDEXES:
+            await conn.execute(text(f"CREATE INDEX {name} ON {table} ({column})"))
+
+
+async def _indexes(engine) -> set[str]:
+    async with engine.connect() as conn:
+        return await conn.run_sync(
+            lambda c: {
+                ix["name"]
+                for table in inspect(c).get_table_names()
+                for ix in inspect(c).get_indexes(table)
+            }
+        )
+
+
+def test_hot_queries_use_indexes(tmp_path, capsys):
+    """Планы горячих запросов идут по своим индексам — и на новой БД, и после миграций исходной."""
+
+    async def run() -> None:
+        fresh = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/fresh.db")
+        assert await migrate(fresh) == []
+        assert await explain(fresh), capsys.readouterr().out
+
+        old = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/old.db")
+        await _baseline(old)
+        assert await migrate(old) == [m.version for m in MIGRATIONS]
+        assert await explain(old), capsys.readouterr().out
+        assert await _indexes(old) == await _indexes(fresh)
+
+        for engine in (fresh, old):
+            await engine.dispose()
+
+    asyncio.run(run())
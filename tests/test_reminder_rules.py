@@ -0,0 +1,98 @@
+# tests/test_reminder_rules.py
+import asyncio
+from datetime import timedelta
+
+from sqlalchemy import select
+
+from app.db.database import AsyncSessionLocal, async_engine
+from app.db.models import Base, Baby, FeedingRecord, Reminder, ReminderRule, SleepRecord, User
+from app.services import reminder_rules
+from app.services.carelog import CareUnitOfWork
+from app.utils.tz import utcnow
+
+
+async def _setup() -> tuple[int, Baby]:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        user = User(telegram_id=int(utcnow().timestamp() * 1e6), first_name="Test")
+        session.add(user)
+        await session.flush()
+        baby = Baby(user_id=user.id, name="Мила")
+        session.add(baby)
+        await session.commit()
+        return user.id, baby
+
+
+async def _toggle(user_id: int, baby: Baby, kind: str) -> bool:
+    async with AsyncSessionLocal() as session:
+        return await reminder_rules.toggle(session, user_id=user_id, baby=baby, chat_id=user_id, kind=kind)
+
+
+async def _reminder(baby_id: int, kind: str) -> Reminder:
+    async with AsyncSessionLocal() as session:
+        return await session.scalar(
+            select(Reminder)
+            .join(ReminderRule, ReminderRule.reminder_id == Reminder.id)
+            .where(ReminderRule.baby_id == baby_id, ReminderRule.kind == kind)
+        )
+
+
+async def _write(user_id: int, record) -> None:
+    async with AsyncSessionLocal() as session:
+        async with CareUnitOfWork(session, actor_user_id=user_id) as uow:
+            uow.add(record)
+            await uow.event("test", baby_id=record.baby_id)
+
+
+def test_feed_write_moves_the_rule_reminder_and_toggle_disables_it():
+    async def run() -> None:
+        user_id, baby = await _setup()
+        assert await _toggle(user_id, baby, "feed")
+        assert not (await _reminder(baby.id, "feed")).is_active  # кормлений ещё не было — ждём первого
+
+        fed_at = utcnow() - timedelta(minutes=10)
+        await _write(user_id, FeedingRecord(baby_id=baby.id, feeding_type="formula", amount_ml=100, fed_at=fed_at))
+        await _write(user_id, FeedingRecord(baby_id=baby.id, feeding_type="water", amount_ml=30))  # не считается
+        reminder = await _reminder(baby.id, "feed")
+        assert reminder.is_active
+        assert reminder.next_run == fed_at + timedelta(minutes=reminder_rules.REMIND_FEED_MINUTES)
+        assert reminder.text.startswith("Мила: прошло")
+
+        assert not await _toggle(user_id, baby, "feed")
+        assert not (await _reminder(baby.id, "feed")).is_active
+        async with AsyncSessionLocal() as session:
+            assert await reminder_rules.enabled(session, user_id, baby.id) == set()
+
+        # выключенное правило записи больше не трогают
+        await _write(user_id, FeedingRecord(baby_id=baby.id, feeding_type="formula", amount_ml=100))
+        assert not (await _reminder(baby.id, "feed")).is_active
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_sleep_rule_follows_the_wake_window():
+    """Засыпание снимает напоминание, пробуждение ставит его через окно бодрствования."""
+
+    async def run() -> None:
+        user_id, baby = await _setup()
+        assert await _toggle(user_id, baby, "sleep")
+
+        async with AsyncSessionLocal() as session:
+            async with CareUnitOfWork(session, actor_user_id=user_id) as uow:
+                rec = uow.add(SleepRecord(baby_id=baby.id, sleep_start=utcnow() - timedelta(minutes=40)))
+                await uow.event("sleep_start", baby_id=baby.id)
+            assert not (await _reminder(baby.id, "sleep")).is_active
+
+            rec.sleep_end = utcnow()
+            rec.duration_minutes = 40
+            async with CareUnitOfWork(session, actor_user_id=user_id) as uow:
+                uow.add(rec)
+                await uow.event("sleep_end", baby_id=baby.id)
+        reminder = await _reminder(baby.id, "sleep")
+        assert reminder.is_active
+        assert reminder.next_run == rec.sleep_end + timedelta(minutes=reminder_rules.REMIND_WAKE_MINUTES)
+        await async_engine.dispose()
+
+    asyncio.run(run())
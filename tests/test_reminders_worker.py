@@ -0,0 +1,196 @@
+# tests/test_reminders_worker.py
+import asyncio
+from datetime import timedelta
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+from sqlalchemy import delete, insert, select
+
+from app.bot.delivery import Sender
+from app.bot.reminders_worker import ReminderScheduler
+from app.db.database import AsyncSessionLocal, async_engine
+from app.db.models import Base, Reminder, User
+from app.services import reminders
+from app.utils.tz import utcnow
+
+
+class FakeBot:
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.sent: list[tuple[int, str]] = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        await asyncio.sleep(self.latency)
+        self.sent.append((chat_id, text))
+
+
+async def _seed(**values) -> int:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(Reminder))
+        user = await session.scalar(select(User).limit(1))
+        if user is None:
+            user = User(telegram_id=1, first_name="Test")
+            session.add(user)
+            await session.flush()
+        row = {"user_id": user.id, "chat_id": 10, "text": "t", "next_run": utcnow() - timedelta(seconds=1)}
+        row.update(values)
+        rid = (await session.execute(insert(Reminder).values(row).returning(Reminder.id))).scalar_one()
+        await session.commit()
+        return rid
+
+
+def _scheduler(bot: FakeBot, worker_id: str, lease: float = 120.0, catch_up: str = "coalesce") -> ReminderScheduler:
+    sender = Sender(bot, rate=1e6, burst=1000, chat_interval=0)
+    return ReminderScheduler(bot, worker_id=worker_id, lease=lease, catch_up=catch_up, sender=sender)
+
+
+def test_lost_claim_is_retried_after_foreign_lease():
+    """Оба воркера ждут один срок; победитель аренды падает — проигравший отправляет после её конца."""
+
+    async def run() -> None:
+        await _seed(next_run=utcnow() + timedelta(seconds=0.5))
+        bots = {"a": FakeBot(latency=3600), "b": FakeBot(latency=3600)}
+        workers = {w: _scheduler(bot, w, lease=1) for w, bot in bots.items()}
+        stop = asyncio.Event()
+        tasks = {w: asyncio.create_task(s.run(stop)) for w, s in workers.items()}
+        await asyncio.sleep(1.0)  # срок наступил, победитель «завис» на отправке
+        async with AsyncSessionLocal() as session:
+            winner = await session.scalar(select(Reminder.locked_by))
+        loser = "b" if winner == "a" else "a"
+        tasks[winner].cancel()  # упал; его аренда истечёт в течение секунды
+        bots[loser].latency = 0
+        for _ in range(40):
+            if bots[loser].sent:
+                break
+            await asyncio.sleep(0.1)
+        stop.set()
+        await tasks[loser]
+        assert len(bots[loser].sent) == 1
+        assert workers[loser].contended >= 1  # до отмены победитель продлевал аренду
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_reschedule_during_send_is_kept():
+    """reschedule(), пока воркер отправляет прежний срок, не затирается итогом партии."""
+
+    async def run() -> None:
+        rid = await _seed(interval_minutes=60)
+        bot = FakeBot(latency=0.5)
+        scheduler = _scheduler(bot, "a")
+        async with AsyncSessionLocal() as session:
+            reminder = await session.get(Reminder, rid)  # загружен до аренды
+            fire = asyncio.create_task(scheduler._fire(utcnow(), [rid]))
+            await asyncio.sleep(0.2)  # аренда взята, отправка идёт
+            moved = utcnow() + timedelta(days=2)
+            await reminders.reschedule(session, reminder, moved)
+        await fire
+        async with AsyncSessionLocal() as session:
+            row = await session.get(Reminder, rid)
+            assert row.next_run == moved
+            assert row.locked_by is None
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+class FlakyBot(FakeBot):
+    """Первая отправка — 429."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = 0
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        self.calls += 1
+        if self.calls == 1:
+            raise TelegramRetryAfter(SendMessage(chat_id=chat_id, text=text), "Too Many Requests", retry_after=0)
+        await super().send_message(chat_id, text)
+
+
+def test_retry_does_not_add_missed_runs():
+    """429 и повтор позже интервала: пропуски считаются один раз и от первой аренды."""
+
+    async def run() -> None:
+        now = utcnow()
+        for catch_up in ("coalesce", "skip"):
+            await _seed(next_run=now - timedelta(seconds=5), interval_minutes=1)
+            bot = FlakyBot()
+            scheduler = _scheduler(bot, "a", catch_up=catch_up)
+            await scheduler._fire(utcnow(), [])  # 429 — повтор
+            await scheduler._fire(utcnow() + timedelta(minutes=3), [])  # повтор позже целого интервала
+            assert [text for _, text in bot.sent] == ["⏰ Напоминание: t"], catch_up
+            assert scheduler.coalesced == 0 and scheduler.skipped == 0
+
+        await _seed(next_run=now - timedelta(minutes=2, seconds=30), interval_minutes=1)
+        bot = FlakyBot()
+        scheduler = _scheduler(bot, "a")
+        await scheduler._fire(utcnow(), [])
+        await scheduler._fire(utcnow() + timedelta(seconds=2), [])
+        assert [text for _, text in bot.sent] == ["⏰ Напоминание: t (пропущено: 2)"]
+        assert scheduler.coalesced == 2
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_slow_send_keeps_the_lease():
+    """Отправка дольше аренды: второй воркер строку не берёт, сообщение уходит один раз."""
+
+    async def run() -> None:
+        await _seed()
+        slow, other = FakeBot(latency=1.5), FakeBot()
+        a, b = _scheduler(slow, "a", lease=0.6), _scheduler(other, "b", lease=0.6)
+        fire = asyncio.create_task(a._fire(utcnow(), []))
+        for _ in range(15):  # всё время отправки b пытается взять наступившее
+            await asyncio.sleep(0.1)
+            await b._fire(utcnow(), [])
+        await fire
+        assert len(slow.sent) + len(other.sent) == 1
+        assert a.renewals >= 1
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_batch_fits_half_the_lease():
+    bot = FakeBot()
+    scheduler = ReminderScheduler(bot, batch=500, lease=120, sender=Sender(bot, rate=30 / 8, burst=3))
+    assert scheduler.batch == 225
+
+
+def test_changes_wake_the_scheduler_without_polling():
+    """Создание, перенос и выключение будят планировщик; без изменений он спит до срока."""
+
+    async def run() -> None:
+        rid = await _seed(next_run=utcnow() + timedelta(days=1))
+        bot = FakeBot()
+        scheduler = _scheduler(bot, "a")
+        reminders.subscribe(scheduler.notify)
+        stop = asyncio.Event()
+        task = asyncio.create_task(scheduler.run(stop))
+        try:
+            await asyncio.sleep(0.3)
+            assert scheduler.loads == 1 and scheduler.wakeups == 0 and not bot.sent
+
+            async with AsyncSessionLocal() as session:
+                reminder = await session.get(Reminder, rid)
+                await reminders.reschedule(session, reminder, utcnow() + timedelta(seconds=0.2))
+                later = await reminders.create(
+                    session, user_id=reminder.user_id, chat_id=20, text="later", next_run=utcnow() + timedelta(seconds=0.4)
+                )
+                await reminders.deactivate(session, later)
+            await asyncio.sleep(0.8)
+            assert bot.sent == [(10, "⏰ Напоминание: t")]
+            assert scheduler.loads == 1  # окно не перечитывалось
+            assert scheduler.notifications == 3
+        finally:
+            stop.set()
+            await task
+            reminders.unsubscribe(scheduler.notify)
+        await async_engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,72 @@
+# tests/test_scheduler.py
+import asyncio
+
+import pytest
+
+from app.web.scheduler import UpdateScheduler
+
+
+def test_cancelled_job_releases_slots_and_waiters():
+    """CancelledError в задаче: место в очереди освобождается, ждущие того же шарда получают ошибку."""
+
+    async def run() -> None:
+        scheduler = UpdateScheduler(max_concurrency=4, max_pending=10)
+
+        async def cancelled() -> None:
+            raise asyncio.CancelledError
+
+        async def ok() -> str:
+            return "ok"
+
+        first = asyncio.ensure_future(scheduler.run("chat", cancelled))
+        second = asyncio.ensure_future(scheduler.run("chat", ok))
+        for fut in (first, second):
+            with pytest.raises(RuntimeError):
+                await asyncio.wait_for(fut, 1)  # до исправления ждущие висели
+        await asyncio.sleep(0)
+        assert scheduler.stats()["pending"] == 0
+        assert scheduler.stats()["shards"] == 0
+        assert not scheduler._tasks
+        assert await scheduler.run("chat", ok) == "ok"
+
+    asyncio.run(run())
+
+
+def test_stop_waits_for_running_jobs():
+    """stop(): уже поставленные задачи дорабатывают, новые не принимаются."""
+
+    async def run() -> None:
+        scheduler = UpdateScheduler(max_concurrency=1, max_pending=10)
+        done = []
+
+        async def slow(n: int) -> None:
+            await asyncio.sleep(0.1)
+            done.append(n)
+
+        await scheduler.dispatch("chat", lambda: slow(1))
+        await scheduler.dispatch("chat", lambda: slow(2))
+        await scheduler.dispatch(None, lambda: slow(3))
+        await scheduler.stop(timeout=5)
+        assert sorted(done) == [1, 2, 3]
+        assert not scheduler._tasks
+        with pytest.raises(RuntimeError):
+            await scheduler.dispatch("chat", lambda: slow(4))
+
+    asyncio.run(run())
+
+
+def test_stop_cancels_after_timeout():
+    async def run() -> None:
+        scheduler = UpdateScheduler()
+
+        async def hang() -> None:
+            await asyncio.sleep(60)
+
+        fut = asyncio.ensure_future(scheduler.run("chat", hang))
+        await asyncio.sleep(0)
+        await scheduler.stop(timeout=0.05)
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(fut, 1)
+        assert scheduler.stats()["pending"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,53 @@
+# tests/test_sleep_analytics.py
+import asyncio
+from datetime import date, datetime
+
+from sqlalchemy import insert
+
+from app.db.database import AsyncSessionLocal, async_engine
+from app.db.models import Base, Baby, SleepRecord, User
+from app.services import sleep_analytics
+
+
+async def _baby_with_sleeps(*sleeps: tuple[datetime, datetime | None]) -> int:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        user = User(telegram_id=int(datetime.utcnow().timestamp() * 1e6), first_name="Test")
+        session.add(user)
+        await session.flush()
+        baby = Baby(user_id=user.id, name="Test")
+        session.add(baby)
+        await session.flush()
+        await session.execute(
+            insert(SleepRecord),
+            [{"baby_id": baby.id, "sleep_start": s, "sleep_end": e} for s, e in sleeps],
+        )
+        await session.commit()
+        return baby.id
+
+
+def test_sleep_stats_splits_at_local_midnight():
+    """Ночной сон делится по полуночи, дневной сон и окна бодрствования — по локальному времени."""
+
+    async def run() -> None:
+        tz = "Europe/Moscow"  # UTC+3, без DST
+        baby_id = await _baby_with_sleeps(
+            (datetime(2025, 3, 1, 10, 0), datetime(2025, 3, 1, 11, 30)),  # 13:00–14:30 — дневной
+            (datetime(2025, 3, 1, 18, 0), datetime(2025, 3, 2, 4, 0)),  # 21:00–07:00
+            (datetime(2025, 3, 2, 3, 30), datetime(2025, 3, 2, 4, 30)),  # двойной ввод — сливается
+        )
+        async with AsyncSessionLocal() as session:
+            stats = await sleep_analytics.sleep_stats(session, baby_id, tz, days=3, today=date(2025, 3, 3))
+        assert stats.days == [date(2025, 3, 1), date(2025, 3, 2), date(2025, 3, 3)]
+        assert stats.total.tolist() == [90 + 180, 450, 0]
+        assert stats.day.tolist() == [90, 0, 0]
+        assert stats.night.tolist() == [180, 450, 0]
+        assert stats.naps.tolist() == [1, 0, 0]
+        assert stats.longest == 630
+        assert stats.longest_start == datetime(2025, 3, 1, 21, 0)
+        assert stats.wake_avg == stats.wake_max == 390  # 14:30–21:00
+        assert stats.tracked_days == 2
+        await async_engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,34 @@
+# tests/test_update_queue.py
+import asyncio
+
+from app.web.update_queue import UpdateQueue
+
+
+def test_metrics_cover_handling():
+    """processed и latency считаются по окончании обработки, не по передаче дальше."""
+
+    async def run() -> None:
+        running = 0
+        peak = 0
+
+        async def handler(item: int) -> None:
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+
+        queue = UpdateQueue(handler, maxsize=10, workers=2)
+        queue.start()
+        for i in range(4):
+            assert await queue.put(i)
+        await asyncio.sleep(0.01)
+        assert queue.stats()["processed"] == 0
+        await queue.stop()
+        stats = queue.stats()
+        assert stats["processed"] == 4
+        assert peak == 2
+        assert stats["latency_max_ms"] >= 100  # последние два ждали первую пару
+        assert stats["latency_avg_ms"] >= stats["wait_avg_ms"] + 50
+
+    asyncio.run(run())
@@ -0,0 +1,57 @@
+# tests/test_webapp_auth.py
+import asyncio
+import json
+import time
+from urllib.parse import urlencode
+
+import pytest
+from fastapi import HTTPException
+
+from app.web import main, webapp_auth
+from app.web.webapp_auth import InitDataError
+
+TOKEN = "123456:TEST"
+
+
+def _init_data(token: str = TOKEN, auth_date: int | str | None = None, **extra: str) -> str:
+    fields = {
+        "auth_date": str(int(time.time()) if auth_date is None else auth_date),
+        "query_id": "AAH",
+        "user": json.dumps({"id": 42, "is_bot": False, "first_name": "Аня"}, ensure_ascii=False),
+        **extra,
+    }
+    return urlencode({**fields, "hash": webapp_auth.sign(fields, token)})
+
+
+def test_valid_init_data():
+    user = webapp_auth.user_from_header(f"tma {_init_data()}", TOKEN)
+    assert (user.id, user.first_name) == (42, "Аня")
+
+
+@pytest.mark.parametrize(
+    "header, error",
+    [
+        (None, "expected"),
+        (f"Bearer {_init_data()}", "expected"),
+        (f"tma {_init_data(token='999:OTHER')}", "bad signature"),  # подписано другим ботом
+        (f"tma {_init_data()}".replace("42", "43"), "bad signature"),  # подменён пользователь
+        (f"tma {_init_data().replace('hash=', 'x=')}", "bad signature"),
+        (f"tma {_init_data(auth_date=int(time.time()) - 2 * 24 * 3600)}", "expired"),
+        (f"tma {_init_data(auth_date='soon')}", "bad auth_date"),
+    ],
+)
+def test_rejected_init_data(header, error):
+    with pytest.raises(InitDataError, match=error):
+        webapp_auth.user_from_header(header, TOKEN)
+
+
+def test_chart_api_answers_401(monkeypatch):
+    """/api/charts с чужой подписью — 401 до любых запросов к данным."""
+    monkeypatch.setattr(main, "TELEGRAM_BOT_TOKEN", TOKEN)
+
+    async def run() -> None:
+        with pytest.raises(HTTPException) as e:
+            await main.charts_data(days=7, authorization=f"tma {_init_data(token='999:OTHER')}")
+        assert e.value.status_code == 401
+
+    asyncio.run(run())
@@ -0,0 +1,31 @@
+# tests/test_webhook.py
+import asyncio
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from app.web import main
+
+
+class FakeRequest:
+    def __init__(self, data: dict) -> None:
+        self.data = data
+
+    async def body(self) -> bytes:
+        return json.dumps(self.data).encode()
+
+
+def test_invalid_update_is_not_remembered_as_duplicate():
+    """Апдейт, не прошедший валидацию, при повторной доставке снова обрабатывается, а не отбрасывается."""
+    bad = {
+        "update_id": 77,
+        "message": {"message_id": "x", "chat": {"id": 1, "type": "private"}, "date": "nope", "text": "hi"},
+    }
+
+    async def run() -> None:
+        for _ in range(2):
+            with pytest.raises(ValidationError):
+                await main.telegram_webhook(FakeRequest(bad), None)
+
+    asyncio.run(run())